@@ -1,10 +1,12 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 import cv2
 import numpy as np
-import base64
 import json
 import asyncio
 import logging
@@ -15,6 +17,21 @@ from contextlib import asynccontextmanager
 
 from emotion_detector import EmotionDetector
 from music_generator import MusicGenerator
+from connection_manager import ConnectionManager
+from event_log import EventLogs
+from frame_ingest import FrameIngest
+from frame_protocol import Frame, ProtocolError, hello_response, parse_message
+from image_batch import BatchTagger
+from streaming import NDJSON_MEDIA_TYPE, SSE_MEDIA_TYPE, STREAM_HEADERS
+from video_analysis import TIMELINE_FORMATS, VideoAnalyzer, VideoTooLarge
+from memory_governor import MemoryGovernor
+from music_sync import MusicStateBroadcaster
+from pipeline import FrameDropped, FramePipeline, PipelineFull
+from rate_controller import RateController
+from result_cache import ResultCache
+from sessions import DetectionSession, SessionRegistry
+from startup import StartupTracker
+from state_backend import SharedMusicState, create_state_backend, worker_id
 from config import settings
 
 # Configure logging
@@ -27,25 +44,109 @@ logging.basicConfig(
     ]
 )
 logger = logging.getLogger(__name__)
+startup = StartupTracker(_import_started)
+startup.record('imports', time.perf_counter() - _import_started)
 
 # Global instances
 emotion_detector = None
 music_generator = None
-active_connections: List[WebSocket] = []
-emotion_history = []
+pipeline = None
+batch_tagger = None
+video_analyzer = None
+worker_reporter = None
+rate_updater = None
+memory_checker = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    global emotion_detector, music_generator
+    # Startup: only cheap parts here so the server listens right away
+    global pipeline, worker_reporter, rate_updater, memory_checker
     logger.info("Starting Emotion Music Generator...")
-    emotion_detector = EmotionDetector()
-    music_generator = MusicGenerator()
-    music_generator.start_playback()
+    startup.begin()
+    with startup.phase('state_backend'):
+        await state_backend.start()
+    pipeline = FramePipeline(run_detection, cache=result_cache)
+    await pipeline.start()
+    await music_broadcaster.start()
+    worker_reporter = asyncio.create_task(report_worker_stats())
+    if rate_controller is not None:
+        rate_updater = asyncio.create_task(control_frame_rates())
+    if memory_governor is not None:
+        memory_checker = asyncio.create_task(check_memory())
+    loader = None
+    if settings.background_startup:
+        loader = asyncio.create_task(load_models())
+    else:
+        await load_models()
     yield
     # Shutdown
     logger.info("Shutting down Emotion Music Generator...")
-    music_generator.stop_playback()
+    if loader is not None:
+        loader.cancel()
+    worker_reporter.cancel()
+    if rate_updater is not None:
+        rate_updater.cancel()
+    if memory_checker is not None:
+        memory_checker.cancel()
+    await music_broadcaster.stop()
+    await pipeline.stop()
+    if video_analyzer is not None:
+        video_analyzer.close()
+    if batch_tagger is not None:
+        batch_tagger.close()
+    if music_generator is not None:
+        music_generator.stop_playback()
+    await state_backend.stop()
+
+async def load_models():
+    """
+    Load the music tracks and the models off the event loop, warm the models up
+    with a dummy inference and only then mark the app ready
+    """
+    global emotion_detector, music_generator, batch_tagger, video_analyzer
+    try:
+        generator, detector = await asyncio.gather(
+            startup.run_phase('music_tracks', MusicGenerator),
+            startup.run_phase('emotion_models', EmotionDetector, False)
+        )
+        music_generator = generator
+        music_generator.start_playback()
+        # Join the music state of workers that are already running
+        if await state_backend.call(state_backend.music_version) == 0:
+            await state_backend.call(shared_music.push)
+        else:
+            await state_backend.call(shared_music.pull)
+
+        await startup.run_phase('warm_up', detector.warm_up)
+        batch_tagger = BatchTagger(detector.detect_emotions_batch, cache=result_cache)
+        # Offline jobs share one inference thread so they queue instead of competing
+        video_analyzer = VideoAnalyzer(detector.detect_emotions_batch, batch_tagger.inference_pool)
+        emotion_detector = detector
+        if memory_governor is not None:
+            # max_memory_growth_mb counts from what the warmed-up models take
+            memory_governor.set_baseline()
+        startup.mark_ready()
+    except Exception as e:
+        startup.mark_failed(str(e))
+        if not settings.background_startup:
+            raise
+
+def require_ready():
+    """Reject requests that need the models while they are still loading"""
+    if not startup.ready:
+        raise HTTPException(status_code=503, detail=f"Server is {startup.status}",
+                            headers={"Retry-After": "5"})
+
+def run_detection(frame: np.ndarray, session: Optional[DetectionSession] = None) -> Dict:
+    """
+    Inference stage of the frame pipeline (runs on the inference executor)
+
+    Frames without a session are independent still images: they are detected
+    statelessly, so their results depend on the image alone and can be cached.
+    """
+    if session is None:
+        return emotion_detector.detect_emotions_batch([frame])[0]
+    return emotion_detector.detect_emotions(frame, session)
 
 # Create FastAPI app
 app = FastAPI(
@@ -108,159 +209,419 @@ app.add_middleware(
 if os.path.exists("../frontend"):
     app.mount("/static", StaticFiles(directory="../frontend"), name="static")
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+state_backend = create_state_backend()
+shared_music = SharedMusicState(state_backend, lambda: music_generator)
+manager = ConnectionManager(state_backend.pubsub)
+sessions = SessionRegistry()
+# Shared by the REST pipeline and the batch endpoint (under separate scopes)
+result_cache = ResultCache() if settings.result_cache else None
+music_broadcaster = MusicStateBroadcaster(manager, shared_music.current, get_version=shared_music.version,
+                                          blocking=state_backend.blocking)
+event_logs = EventLogs(manager)
+# Per-session detection rates within the CPU and latency budgets
+rate_controller = RateController() if settings.adaptive_frame_rate else None
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"Client connected. Total connections: {len(self.active_connections)}")
+def build_memory_governor() -> Optional[MemoryGovernor]:
+    """Track the big memory consumers and register the load-shedding actions in order"""
+    if not settings.memory_governor:
+        return None
+    governor = MemoryGovernor()
+    governor.track('music_tracks', lambda: music_generator.approx_bytes() if music_generator is not None else 0)
+    governor.track('sessions', sessions.memory_bytes)
+    governor.track('pipeline_queues', lambda: pipeline.approx_bytes() if pipeline is not None else 0)
+    governor.track('connections', manager.approx_bytes)
+    governor.track('sse_logs', event_logs.approx_bytes)
+    if result_cache is not None:
+        governor.track('result_cache', result_cache.approx_bytes)
+        governor.on('flush', result_cache.clear)
+    governor.on('flush', sessions.drop_caches)
+    if rate_controller is not None:
+        # Frame rates keep dropping for as long as memory stays at throttle or above
+        governor.on('throttle', lambda: rate_controller.hold_pressure('memory'),
+                    leave=lambda: rate_controller.release_pressure('memory'))
+    # Refusing new sessions is checked where sessions start (admits_session)
+    return governor
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        logger.info(f"Client disconnected. Total connections: {len(self.active_connections)}")
+memory_governor = build_memory_governor()
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
+async def report_worker_stats():
+    """Periodically publish this worker's connection stats to the shared state"""
+    while True:
+        try:
+            ingest = manager.ingest_stats()['totals']
+            await state_backend.call(state_backend.report_worker, worker_id(), {
+                'connections': len(manager.active_connections),
+                'rooms': manager.room_stats(),
+                'sessions': len(sessions),
+                'frames_processed': ingest['processed'],
+                'frames_dropped': ingest['dropped']
+            })
+        except Exception as e:
+            logger.error(f"Worker stats report failed: {e}")
+        await asyncio.sleep(settings.worker_report_interval_s)
+
+async def control_frame_rates():
+    """Periodically re-plan the sessions' detection rates from the measured load"""
+    while True:
+        await asyncio.sleep(settings.rate_control_interval_s)
+        try:
+            await send_rates(rate_controller.update())
+        except Exception as e:
+            logger.error(f"Frame rate control failed: {e}")
 
-manager = ConnectionManager()
+async def check_memory():
+    """Periodically sample memory and shed load when it nears max_memory_mb"""
+    while True:
+        await asyncio.sleep(settings.memory_check_interval_s)
+        try:
+            memory_governor.check()
+            if memory_governor.release_pending:
+                await asyncio.get_running_loop().run_in_executor(None, memory_governor.release)
+        except Exception as e:
+            logger.error(f"Memory check failed: {e}")
+
+def admits_session(session_id: Optional[str]) -> bool:
+    """Existing sessions always continue; new ones are refused under memory pressure"""
+    if memory_governor is None or memory_governor.admits_sessions:
+        return True
+    if session_id is not None and session_id in sessions:
+        return True
+    memory_governor.refuse()
+    return False
+
+async def send_rates(changes):
+    """Tell the clients of sessions whose target rate changed to capture at that rate"""
+    for _, fps, websockets in changes:
+        for websocket in websockets:
+            await manager.send_personal(websocket, {'type': 'rate', 'fps': round(fps, 2)})
+
+async def send_music_snapshot(websocket: WebSocket):
+    """Send the full music state matching the client's room version"""
+    if music_generator is not None:
+        await manager.send_personal(websocket, music_broadcaster.snapshot(manager.room_of(websocket)))
 
 @app.get("/")
 async def root():
     return {"message": "Emotion Music Generator API", "version": "1.0.0"}
 
 @app.post("/api/emotion")
-async def detect_emotion(file: UploadFile = File(...)):
+async def detect_emotion(file: UploadFile = File(...), client_id: Optional[str] = None,
+                         room: Optional[str] = None):
     """
     Detect emotion from uploaded image
     """
+    require_ready()
+    if client_id and not admits_session(client_id):
+        raise HTTPException(status_code=503, detail="Server is low on memory", headers={"Retry-After": "30"})
     try:
         # Read image file
         contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         
-        if frame is None:
-            raise HTTPException(status_code=400, detail="Invalid image")
+        # Decode and detect emotions off the event loop
+        session = sessions.get(client_id) if client_id else None
+        # Anonymous requests are stateless and answered from the result cache for images seen before
+        result = await pipeline.submit(Frame(payload=contents), session, cacheable=session is None)
         
-        # Detect emotions
-        result = emotion_detector.detect_emotions(frame)
+        if result is None:
+            raise HTTPException(status_code=400, detail="Invalid image")
         
         if result['success']:
             # Update music based on emotion
-            await music_generator.update_emotion(
-                result['dominant_emotion'],
-                result['confidence']
-            )
+            async with shared_music.change():
+                await music_generator.update_emotion(
+                    result['dominant_emotion'],
+                    result['confidence']
+                )
             
-            # Store in history
-            emotion_history.append({
+            # Store in the shared history (capped)
+            await state_backend.call(state_backend.append_history, {
                 'timestamp': datetime.now().isoformat(),
                 'emotion': result['dominant_emotion'],
                 'confidence': result['confidence'],
                 'all_emotions': result['emotions']
             })
             
-            # Limit history size
-            if len(emotion_history) > 100:
-                emotion_history.pop(0)
-            
-            # Broadcast to connected clients
-            await manager.broadcast({
+            # Publish to the room's subscribers
+            await manager.publish(room or settings.default_room, {
                 'type': 'emotion_update',
                 'data': result
             })
+            music_broadcaster.mark_dirty(room or settings.default_room)
         
         return result
         
+    except (FrameDropped, PipelineFull):
+        # Backpressure: the same "try again later" as the WebSocket path's 1013
+        raise HTTPException(status_code=503, detail="Server is busy", headers={"Retry-After": "1"})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in emotion detection: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+@app.post("/api/emotion/batch")
+async def detect_emotion_batch(files: List[UploadFile] = File(...)):
     """
-    WebSocket endpoint for real-time emotion detection
+    Tag many still images in one request
+    
+    Accepts any number of image parts and/or zip/tar archives of images and
+    streams back one NDJSON line per image followed by a summary line. Unlike
+    /api/emotion there is no smoothing or rate limiting, and results do not
+    touch the music, history or room broadcasts.
+    """
+    require_ready()
+    return StreamingResponse(batch_tagger.stream(files), media_type=NDJSON_MEDIA_TYPE)
+
+@app.post("/api/emotion/video")
+async def analyze_video(file: UploadFile = File(...), sample_fps: Optional[float] = None,
+                        format: str = "ndjson"):
+    """
+    Analyze a recorded video
+    
+    Streams a timeline of emotion vectors sampled at sample_fps (default from
+    settings) as NDJSON or, with format=sse, as Server-Sent Events, while the
+    video is still being decoded.
     """
-    await manager.connect(websocket)
+    if format not in TIMELINE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(TIMELINE_FORMATS)}")
+    if sample_fps is not None and not 0 < sample_fps <= 60:
+        raise HTTPException(status_code=400, detail="sample_fps must be between 0 and 60")
+    require_ready()
+    
     try:
-        while True:
-            # Receive frame data
-            data = await websocket.receive_text()
-            message = json.loads(data)
+        path = await video_analyzer.spool(file.file)
+    except VideoTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    return StreamingResponse(
+        video_analyzer.stream(path, sample_fps, format),
+        media_type=SSE_MEDIA_TYPE if format == "sse" else NDJSON_MEDIA_TYPE,
+        headers=STREAM_HEADERS
+    )
+
+async def process_frames(websocket: WebSocket, ingest: FrameIngest, session_id: str):
+    """
+    Process the newest frame of a connection whenever its session is ready for it
+    """
+    # Frames sent while the models warm up are coalesced by the ingest queue
+    if not await startup.wait_ready():
+        return
+    while True:
+        frame_msg = await ingest.get()
+        if frame_msg is None:
+            return
+        
+        try:
+            # Wait out the session's rate limiter before decoding; frames arriving
+            # meanwhile replace this one so superseded frames are never decoded
+            session = sessions.get(session_id)
+            if rate_controller is not None:
+                session.detection_interval = rate_controller.interval(session_id)
+            delay = emotion_detector.time_until_next_detection(session)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                frame_msg = ingest.newest(frame_msg)
             
-            if message['type'] == 'frame':
-                # Decode base64 image
-                image_data = base64.b64decode(message['data'].split(',')[1])
-                nparr = np.frombuffer(image_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # Decode and detect in the pipeline's worker pools
+            result = await pipeline.submit(frame_msg, session)
+            
+            if result is not None:
+                ingest.mark_processed()
+                if rate_controller is not None:
+                    rate_controller.observe(None if result.get('cached') else result.get('processing_time'),
+                                            time.time() - frame_msg.received_at)
                 
-                if frame is not None:
-                    # Detect emotions
-                    result = emotion_detector.detect_emotions(frame)
+                if result['success']:
+                    # Send results back with the echoed sequence number, before
+                    # waiting on the shared music state
+                    await manager.send_personal(websocket, {
+                        'type': 'emotion_result',
+                        'data': result,
+                        **frame_msg.echo()
+                    })
                     
-                    if result['success']:
-                        # Update music
+                    # Update music
+                    async with shared_music.change():
                         await music_generator.update_emotion(
                             result['dominant_emotion'],
                             result['confidence']
                         )
-                        
-                        # Send results back
-                        await websocket.send_json({
-                            'type': 'emotion_result',
-                            'data': result
-                        })
-                        
-                        # Broadcast music state
-                        await manager.broadcast({
-                            'type': 'music_update',
-                            'data': music_generator.get_current_state()
-                        })
+                    
+                    # Music state goes out as one coalesced delta per room and tick
+                    room = manager.room_of(websocket)
+                    if room is not None:
+                        music_broadcaster.mark_dirty(room)
+        except (FrameDropped, PipelineFull):
+            ingest.mark_dropped()
+        except Exception as e:
+            logger.error(f"Frame processing error: {e}")
+
+# Control actions that need the music generator
+MUSIC_ACTIONS = ('set_volume', 'set_style', 'reset')
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    """
+    WebSocket endpoint for real-time emotion detection
+    """
+    # Clients that send a stable client_id keep their smoothing state across reconnects
+    client_id = websocket.query_params.get('client_id')
+    if not admits_session(client_id):
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
+    ingest = await manager.connect(websocket, websocket.query_params.get('room'))
+    session_id = client_id or ingest.connection_id
+    processor = asyncio.create_task(process_frames(websocket, ingest, session_id))
+    await send_music_snapshot(websocket)
+    if rate_controller is not None:
+        await send_rates(rate_controller.attach(session_id, websocket))
+    binary_enabled = False
+    try:
+        while True:
+            # Receive frame data (JSON text or negotiated binary frames)
+            raw = await websocket.receive()
+            if raw['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(raw.get('code', 1000))
+
+            try:
+                message = parse_message(raw, binary_enabled)
+            except ProtocolError as e:
+                await manager.send_personal(websocket, {'type': 'error', 'message': str(e)})
+                continue
+
+            if isinstance(message, Frame):
+                # Hand the undecoded frame to the processor; older pending frames are dropped
+                ingest.put(message)
+
+            elif message['type'] == 'hello':
+                # Negotiate binary frame mode and the result encoding
+                response = hello_response(message.get('protocol'), message.get('results'))
+                binary_enabled = response['protocol'] == 'binary'
+                manager.set_encoding(websocket, response['results'])
+                await manager.send_personal(websocket, response)
+                # Clients may cap their own capture rate
+                max_fps = message.get('max_fps')
+                if rate_controller is not None and isinstance(max_fps, (int, float)) and max_fps > 0:
+                    await send_rates(rate_controller.request(session_id, max_fps))
             
             elif message['type'] == 'control':
                 # Handle music control messages
-                if message['action'] == 'set_volume':
-                    music_generator.set_volume(message['value'])
+                if message['action'] in MUSIC_ACTIONS and music_generator is None:
+                    await manager.send_personal(websocket, {'type': 'error', 'message': 'Music is still loading'})
+                elif message['action'] == 'set_volume':
+                    async with shared_music.change():
+                        music_generator.set_volume(message['value'])
+                    music_broadcaster.mark_dirty()
                 elif message['action'] == 'set_style':
-                    music_generator.set_style(message['value'])
+                    # Reloading tracks synthesizes audio; keep it off the event loop
+                    async with shared_music.change():
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, music_generator.set_style, message['value']
+                        )
+                    music_broadcaster.mark_dirty()
                 elif message['action'] == 'reset':
-                    emotion_detector.reset()
-                    music_generator.reset()
+                    sessions.get(session_id).reset()
+                    async with shared_music.change():
+                        music_generator.reset()
+                    music_broadcaster.mark_dirty()
+                elif message['action'] == 'join_room':
+                    room = manager.join(websocket, message.get('value') or settings.default_room)
+                    await manager.send_personal(websocket, {'type': 'room', 'room': room})
+                    await send_music_snapshot(websocket)
+                elif message['action'] == 'get_music_state':
+                    await send_music_snapshot(websocket)
+                elif message['action'] == 'get_stats':
+                    await manager.send_personal(websocket, {
+                        'type': 'ingest_stats',
+                        'data': ingest.stats()
+                    })
                     
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
         manager.disconnect(websocket)
+    finally:
+        processor.cancel()
+        if rate_controller is not None:
+            # The freed share goes to the remaining sessions
+            await send_rates(rate_controller.detach(session_id, websocket))
+        if client_id is None:
+            sessions.release(session_id)
+
+@app.get("/api/events")
+async def event_stream(room: Optional[str] = None, last_event_id: Optional[str] = Header(None)):
+    """
+    Read-only Server-Sent Events feed of a room's emotion and music updates
+    
+    Starts with a full music_update snapshot; EventSource reconnects send
+    Last-Event-ID and resume from the room's event log when possible.
+    """
+    return StreamingResponse(
+        event_logs.stream(room or settings.default_room, last_event_id, music_broadcaster.snapshot),
+        media_type=SSE_MEDIA_TYPE,
+        headers=STREAM_HEADERS
+    )
 
 @app.get("/api/music/control")
 async def get_music_state():
     """Get current music state"""
-    return music_generator.get_current_state()
+    return await state_backend.call(shared_music.current)
 
 @app.post("/api/music/update")
 async def update_music(emotion: str, confidence: float = 1.0):
     """Manually update music emotion"""
+    if music_generator is None:
+        require_ready()
     try:
-        await music_generator.update_emotion(emotion, confidence)
+        async with shared_music.change():
+            await music_generator.update_emotion(emotion, confidence)
+        music_broadcaster.mark_dirty()
         return {"status": "success", "emotion": emotion}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def read_shared_stats() -> Dict:
+    """Stats kept in the state backend (may block on a shared one)"""
+    return {
+        "music_state": shared_music.current(),
+        "history": state_backend.history(20),  # Last 20 entries
+        "total_detections": state_backend.history_count(),
+        "workers": state_backend.worker_stats()
+    }
+
 @app.get("/api/stats")
 async def get_stats():
     """Get emotion detection statistics"""
+    detector = emotion_detector
+    shared = await state_backend.call(read_shared_stats)
     return {
-        "detector_stats": emotion_detector.get_emotion_stats(),
-        "music_state": music_generator.get_current_state(),
-        "history": emotion_history[-20:],  # Last 20 entries
-        "total_detections": len(emotion_history)
+        "startup": startup.stats(),
+        "detector_stats": detector.get_emotion_stats() if detector is not None else None,
+        "music_state": shared["music_state"],
+        "history": shared["history"],
+        "total_detections": shared["total_detections"],
+        "state_backend": state_backend.name,
+        "workers": shared["workers"],
+        "pubsub": state_backend.pubsub.stats(),
+        "ingest": manager.ingest_stats(),
+        "outbound": manager.send_stats(),
+        "rooms": manager.room_stats(),
+        "music_updates": music_broadcaster.stats(),
+        "sse": event_logs.stats(),
+        "pipeline": pipeline.stats() if pipeline is not None else None,
+        "frame_rate": rate_controller.stats() if rate_controller is not None else None,
+        "memory": memory_governor.stats() if memory_governor is not None else None,
+        "emotion_classifier": detector.classifier.stats() if detector is not None else None,
+        "face_detection": detector.face_detector.stats() if detector is not None else None,
+        "face_tracking": detector.tracking_stats.stats() if detector is not None else None,
+        "frame_gate": detector.frame_gate_stats.stats() if detector is not None else None,
+        "batching": detector.batcher.stats() if detector is not None and detector.batcher is not None else None,
+        "sessions": sessions.stats(),
+        "batch": batch_tagger.stats() if batch_tagger is not None else None,
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "video": video_analyzer.stats() if video_analyzer is not None else None
     }
 
 @app.post("/api/calibrate")
@@ -271,14 +632,20 @@ async def calibrate_emotion(emotion: str, file: UploadFile = File(...)):
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Liveness check: healthy as soon as the server is up (see /ready for readiness)"""
     return {
         "status": "healthy",
+        "ready": startup.ready,
         "emotion_detector": emotion_detector is not None,
         "music_generator": music_generator is not None,
         "active_connections": len(manager.active_connections)
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check: 200 once the models are loaded and warmed up, 503 until then"""
+    return JSONResponse(startup.stats(), status_code=200 if startup.ready else 503)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
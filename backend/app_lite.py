@@ -8,7 +8,6 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import cv2
 import numpy as np
-import base64
 import json
 import asyncio
 import logging
@@ -19,6 +18,7 @@ from contextlib import asynccontextmanager
 
 # Use minimal imports for memory efficiency
 from emotion_detector_simple import EmotionDetector
+from frame_protocol import Frame, ProtocolError, decode_frame, hello_response, parse_message
 from config import settings
 
 # Configure minimal logging
@@ -93,18 +93,23 @@ async def websocket_endpoint(websocket: WebSocket):
     if not connected:
         return
     
+    binary_enabled = False
     try:
         while True:
-            # Receive frame data
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            
-            if message['type'] == 'frame':
-                # Decode base64 image
+            # Receive frame data (JSON text or negotiated binary frames)
+            raw = await websocket.receive()
+            if raw['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(raw.get('code', 1000))
+
+            try:
+                message = parse_message(raw, binary_enabled)
+            except ProtocolError as e:
+                await websocket.send_json({'type': 'error', 'message': str(e)})
+                continue
+
+            if isinstance(message, Frame):
                 try:
-                    image_data = base64.b64decode(message['data'].split(',')[1])
-                    nparr = np.frombuffer(image_data, np.uint8)
-                    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                    frame = decode_frame(message)
                     
                     if frame is not None:
                         # Detect emotions
@@ -118,10 +123,16 @@ async def websocket_endpoint(websocket: WebSocket):
                                 'dominant_emotion': result.get('dominant_emotion', 'neutral'),
                                 'confidence': result.get('confidence', 0),
                                 'emotions': result.get('emotions', {})
-                            }
+                            },
+                            **message.echo()
                         })
                 except Exception as e:
                     logger.error(f"Frame processing error: {e}")
+
+            elif message['type'] == 'hello':
+                response = hello_response(message.get('protocol'))
+                binary_enabled = response['protocol'] == 'binary'
+                await websocket.send_json(response)
                     
     except WebSocketDisconnect:
         manager.disconnect(websocket)
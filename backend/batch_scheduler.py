@@ -0,0 +1,186 @@
+"""
+Micro-batching scheduler for the emotion classifier
+Face crops submitted by concurrent detections (one request per frame, any number
+of faces each) are merged into a single classifier batch. A batch is flushed when
+it is full, when every producer is already waiting on it, or when the oldest
+request hits its deadline. Each request gets back exactly the rows for its crops.
+
+Producers are the detections currently in flight: callers wrap face detection
+and their classify() call in producing(), so a batch waits only while another
+frame that can still join it is being worked on. Submissions made outside
+producing() never hold a batch back.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    __slots__ = ('crops', 'future', 'enqueued_at')
+
+    def __init__(self, crops: np.ndarray):
+        self.crops = crops
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatchScheduler:
+    def __init__(self, classify_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: Optional[int] = None,
+                 max_delay_ms: Optional[float] = None,
+                 expected_producers: Optional[int] = None):
+        self.classify_fn = classify_fn
+        self.max_batch_size = max(1, max_batch_size or settings.inference_batch_size)
+        if max_delay_ms is None:
+            max_delay_ms = settings.frame_timeout_ms * settings.batch_deadline_fraction
+        self.max_delay = max(0.0, max_delay_ms) / 1000.0
+        # Fixed producer count (benchmarks); by default the producers in flight are counted
+        self.expected_producers = expected_producers
+        self._producers = 0
+
+        self._pending: List[_Request] = []
+        self._pending_items = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.batches = 0
+        self.items = 0
+        self.requests = 0
+        self.flush_reasons = {'full': 0, 'producers': 0, 'deadline': 0}
+        self.batch_sizes = deque(maxlen=512)
+        self.queue_waits = deque(maxlen=512)
+        self.busy_time = 0.0
+
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, crops: np.ndarray) -> Future:
+        """Queue preprocessed face crops; the future resolves to their predictions"""
+        request = _Request(crops)
+        if len(crops) == 0:
+            request.future.set_result(np.zeros((0, 7), dtype=np.float32))
+            return request.future
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Micro-batch scheduler is closed")
+            self._pending.append(request)
+            self._pending_items += len(crops)
+            self.requests += 1
+            self._cond.notify()
+        return request.future
+
+    def classify(self, crops: np.ndarray) -> np.ndarray:
+        """Blocking helper for callers running on worker threads"""
+        return self.submit(crops).result()
+
+    @contextmanager
+    def producing(self):
+        """Count the caller as a producer that may still submit until the block exits"""
+        with self._cond:
+            self._producers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._producers -= 1
+                # A pending batch may now hold every remaining producer
+                self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=1.0)
+
+    def _flush_reason(self, now: float) -> Optional[str]:
+        if self._pending_items >= self.max_batch_size:
+            return 'full'
+        # Once every producer is waiting nobody else can join the batch
+        if len(self._pending) >= (self.expected_producers or self._producers):
+            return 'producers'
+        if now - self._pending[0].enqueued_at >= self.max_delay:
+            return 'deadline'
+        return None
+
+    def _next_batch(self) -> Optional[List[_Request]]:
+        with self._cond:
+            while True:
+                if self._closed and not self._pending:
+                    return None
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+
+                now = time.perf_counter()
+                reason = self._flush_reason(now) or ('deadline' if self._closed else None)
+                if reason is None:
+                    self._cond.wait(self._pending[0].enqueued_at + self.max_delay - now)
+                    continue
+
+                # Take whole requests up to the batch size (an oversized request goes alone)
+                batch, items = [], 0
+                while self._pending and (not batch or items + len(self._pending[0].crops) <= self.max_batch_size):
+                    request = self._pending.pop(0)
+                    batch.append(request)
+                    items += len(request.crops)
+                self._pending_items -= items
+                self.flush_reasons[reason] += 1
+                return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            started = time.perf_counter()
+            try:
+                crops = np.concatenate([request.crops for request in batch])
+                predictions = np.asarray(self.classify_fn(crops))
+            except Exception as e:
+                logger.error(f"Batched classification failed: {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in batch:
+                count = len(request.crops)
+                request.future.set_result(predictions[offset:offset + count])
+                offset += count
+                self.queue_waits.append(started - request.enqueued_at)
+
+            self.busy_time += time.perf_counter() - started
+            self.batches += 1
+            self.items += len(crops)
+            self.batch_sizes.append(len(crops))
+
+    def stats(self) -> Dict:
+        waits = sorted(self.queue_waits)
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_delay_ms': self.max_delay * 1000,
+            'producers_in_flight': self._producers,
+            'batches': self.batches,
+            'requests': self.requests,
+            'items': self.items,
+            'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+            'flush_reasons': dict(self.flush_reasons),
+            'avg_batch_ms': 1000 * self.busy_time / self.batches if self.batches else 0.0,
+            'queue_wait_ms': {
+                'p50': 1000 * waits[len(waits) // 2] if waits else 0.0,
+                'p95': 1000 * waits[int(len(waits) * 0.95)] if waits else 0.0
+            }
+        }
@@ -7,14 +7,62 @@ class Settings(BaseSettings):
     debug: bool = True
     host: str = "0.0.0.0"
     port: int = 8000
+    # Load and warm up models after the server starts listening (/ready reports when done)
+    background_startup: bool = True
     
     # Emotion detection settings
     emotion_detection_model: str = "fer"
     confidence_threshold: float = 0.5
     emotion_smoothing_frames: int = 5
+    emotion_smoothing: str = "mean"  # mean, ema, median, kalman or none
+    emotion_ema_alpha: float = 0.4
+    emotion_kalman_process_var: float = 0.01
+    emotion_kalman_measurement_var: float = 0.05
     max_faces: int = 5
+    # Each face is smoothed on its own; the scene emotion combines them
+    face_aggregate: str = "mean"  # mean, area, confidence, largest or most_confident
+    face_history_timeout_s: float = 2.0  # free a face's history once it has been gone this long
+    
+    # Emotion classifier backend: fer (Keras/TensorFlow), onnx (ONNX Runtime), opencv (cv2.dnn),
+    # int8 (quantized TFLite model) or lite (HOG + MLP, numpy/OpenCV only; always used by app_lite)
+    emotion_backend: str = "fer"
+    emotion_model: str = "emotion_model.onnx"  # exported model for onnx/opencv (opencv also reads .pb)
+    emotion_int8_model: str = "emotion_model.int8.tflite"  # scripts/quantize_emotion_model.py
+    emotion_lite_model: str = "emotion_lite.npz"  # scripts/train_lite_emotion_model.py
+    emotion_threads: int = 2
+    emotion_warmup_runs: int = 2
+    
+    # Face detection backend: haar, dnn, mtcnn or cascade (cheap detector, MTCNN when unsure)
+    face_detector: str = "cascade"
+    face_cascade_cheap: str = "dnn"  # dnn (falls back to haar without model files) or haar
+    face_cascade_confident: float = 0.8
+    face_min_confidence: float = 0.5
+    min_face_size: int = 40
+    face_dnn_model: str = "res10_300x300_ssd_iter_140000.caffemodel"
+    face_dnn_config: str = "deploy.prototxt"
+    
+    # Inter-frame face tracking (full detection every N frames or when tracking is unsure)
+    face_tracking: bool = True
+    tracker_redetect_interval: int = 5
+    tracker_min_confidence: float = 0.6
+    tracker_iou_threshold: float = 0.3
+    tracker_max_width: int = 320
     detection_fps: int = 15
     
+    # Frame-change gate (reuse the last result while the scene stays static)
+    frame_gate: bool = True
+    frame_gate_threshold: float = 3.0  # mean absolute difference in gray levels
+    frame_gate_max_staleness_s: float = 2.0
+    frame_gate_width: int = 160
+    
+    # Content-addressed result cache for still images (REST without client_id, batch)
+    result_cache: bool = True
+    result_cache_entries: int = 4096
+    result_cache_max_mb: float = 16
+    result_cache_ttl_s: float = 600
+    result_cache_hash: str = "exact"  # exact or perceptual
+    result_cache_max_distance: int = 4  # perceptual only: differing bits out of 64
+    
     # Music settings
     music_fade_duration: float = 2.0  # seconds
     music_volume_range: tuple = (0.3, 1.0)
@@ -78,11 +126,73 @@ class Settings(BaseSettings):
     }
     
     # Performance settings
-    max_memory_mb: int = 500
+    max_memory_mb: int = 1024  # process RSS, enforced by memory_governor.py (the full app idles near 900)
     max_cpu_percent: int = 40
     frame_timeout_ms: int = 50
     music_transition_latency_ms: int = 100
     
+    # Memory governor: shed load as RSS nears max_memory_mb (fractions of it)
+    memory_governor: bool = True
+    max_memory_growth_mb: int = 0  # also shed as RSS growth above the warmed-up baseline nears this; 0: off
+    memory_check_interval_s: float = 2.0
+    memory_flush_fraction: float = 0.85  # flush caches
+    memory_throttle_fraction: float = 0.9  # lower frame rates
+    memory_refuse_fraction: float = 0.95  # refuse new sessions
+    
+    # Adaptive per-session detection rate within the budgets above (detection_fps is the maximum)
+    adaptive_frame_rate: bool = True
+    min_detection_fps: float = 2.0
+    rate_control_interval_s: float = 1.0
+    rate_decrease_factor: float = 0.7
+    rate_increase_fps: float = 1.0  # per session and interval
+    
+    # Frame pipeline settings
+    decode_workers: int = 2
+    inference_workers: int = 1
+    decode_queue_size: int = 32
+    inference_queue_size: int = 8
+    pipeline_backpressure: str = "drop_oldest"  # block, drop_oldest or reject
+    
+    # Micro-batching of face crops across connections
+    micro_batching: bool = True
+    inference_batch_size: int = 16
+    batch_deadline_fraction: float = 0.2  # of frame_timeout_ms
+    
+    # Offline batch tagging (/api/emotion/batch)
+    batch_chunk_size: int = 32
+    batch_decode_workers: int = 4
+    batch_max_images: int = 10000
+    batch_max_image_bytes: int = 20 * 1024 * 1024
+    
+    # Video file analysis (/api/emotion/video)
+    video_sample_fps: float = 2.0
+    video_max_samples: int = 50000
+    video_max_upload_mb: int = 500
+    
+    # Per-client detection sessions
+    max_sessions: int = 1000
+    session_idle_timeout_s: float = 300.0
+    max_session_memory_mb: float = 32.0
+    
+    # Outbound WebSocket fan-out
+    client_send_queue_size: int = 64
+    client_max_lag_ms: int = 2000
+    default_room: str = "lobby"
+    music_update_tick_ms: int = 100
+    
+    # Read-only SSE viewers (/api/events)
+    sse_log_size: int = 256
+    sse_log_linger_s: float = 30.0
+    sse_heartbeat_s: float = 15.0
+    sse_retry_ms: int = 3000
+    
+    # State shared between uvicorn workers
+    state_backend: str = "memory"  # memory (single worker) or sqlite
+    state_db_path: str = "emotion_state.db"
+    state_poll_ms: int = 20
+    state_message_retention_s: float = 30.0
+    worker_report_interval_s: float = 1.0
+    
     # Paths
     models_dir: str = "models"
     music_assets_dir: str = "../frontend/assets/music"
@@ -0,0 +1,337 @@
+"""
+WebSocket connection management and broadcast fan-out
+Every connection gets a bounded outbound queue drained by its own writer task.
+Messages are serialized once and the same payload is queued for each recipient,
+so one slow or dead client never delays the others. Clients that fall too far
+behind are disconnected.
+
+Each connection belongs to one room. Room messages are published through a
+PubSub topic per room, so only that room's subscribers receive them.
+
+Connections that negotiated compact binary results receive emotion messages as
+packed binary instead of JSON. Such messages are encoded once per encoding and
+published on per-encoding topics.
+
+Broadcasts go through the PubSub as well, so with a shared PubSub they reach the
+clients of every worker process.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set, Union
+
+from fastapi import WebSocket
+
+from config import settings
+from frame_ingest import FrameIngest
+from frame_protocol import RESULT_ENCODINGS, RESULT_MESSAGES, pack_result
+from pubsub import BROADCAST_TOPIC, InProcessPubSub, PubSub, encoded_topic, room_topic
+
+logger = logging.getLogger(__name__)
+
+# Close code for clients evicted as slow consumers ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def serialize(message: Dict) -> str:
+    """Serialize an outbound message once for every recipient"""
+    return json.dumps(message, separators=(',', ':'), ensure_ascii=False)
+
+
+def encode(message: Dict, encoding: str = 'json') -> Union[str, bytes]:
+    """Serialize a message for clients using the given result encoding"""
+    if encoding == 'binary' and message.get('type') in RESULT_MESSAGES:
+        return pack_result(message)
+    return serialize(message)
+
+
+class ClientChannel:
+    def __init__(self, websocket: WebSocket, ingest: FrameIngest,
+                 max_queue: Optional[int] = None, max_lag_ms: Optional[float] = None):
+        self.websocket = websocket
+        self.ingest = ingest
+        self.connection_id = ingest.connection_id
+        self.room: Optional[str] = None
+        self.encoding = 'json'
+        self.max_queue = max_queue or settings.client_send_queue_size
+        self.max_lag = (max_lag_ms or settings.client_max_lag_ms) / 1000.0
+        self._queue = deque()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.close_reason: Optional[str] = None
+
+        self.sent = 0
+        self.bytes_sent = 0
+        self.max_depth = 0
+        self.send_time = 0.0
+        self.max_send_ms = 0.0
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, payload: Union[str, bytes]) -> bool:
+        """Queue a serialized message; returns False if the client was evicted"""
+        if self.closed:
+            return False
+
+        if len(self._queue) >= self.max_queue:
+            self.evict("send queue full")
+            return False
+        if self._queue and time.perf_counter() - self._queue[0][1] > self.max_lag:
+            self.evict("lagging behind")
+            return False
+
+        self._queue.append((payload, time.perf_counter()))
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._ready.set()
+        return True
+
+    def approx_bytes(self) -> int:
+        """Queued outbound payloads plus the frame waiting in the ingest"""
+        return sum(len(payload) for payload, _ in self._queue) + self.ingest.approx_bytes()
+
+    def evict(self, reason: str):
+        """Disconnect a slow consumer without waiting on it"""
+        if self.closed:
+            return
+        logger.warning(f"Evicting client {self.connection_id}: {reason}")
+        self.close(reason)
+        asyncio.create_task(self._close_socket(reason))
+
+    def close(self, reason: Optional[str] = None):
+        self.closed = True
+        self.close_reason = self.close_reason or reason
+        self._queue.clear()
+        self._ready.set()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    async def _close_socket(self, reason: str):
+        try:
+            await self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason=reason)
+        except Exception:
+            pass
+
+    async def _write_loop(self):
+        while not self.closed:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            payload, _ = self._queue.popleft()
+            started = time.perf_counter()
+            try:
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+            except Exception as e:
+                logger.info(f"Send to {self.connection_id} failed: {e}")
+                self.close("send failed")
+                return
+
+            elapsed = time.perf_counter() - started
+            self.sent += 1
+            self.bytes_sent += len(payload)
+            self.send_time += elapsed
+            self.max_send_ms = max(self.max_send_ms, 1000 * elapsed)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def lag_ms(self) -> float:
+        if not self._queue:
+            return 0.0
+        return 1000 * (time.perf_counter() - self._queue[0][1])
+
+    def stats(self) -> Dict:
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_depth,
+            'lag_ms': self.lag_ms,
+            'sent': self.sent,
+            'bytes_sent': self.bytes_sent,
+            'avg_send_ms': 1000 * self.send_time / self.sent if self.sent else 0.0,
+            'max_send_ms': self.max_send_ms
+        }
+
+
+class ConnectionManager:
+    def __init__(self, pubsub: Optional[PubSub] = None):
+        self.active_connections: List[WebSocket] = []
+        self.channels: Dict[WebSocket, ClientChannel] = {}
+        self.rooms: Dict[str, Set[ClientChannel]] = {}
+        self.pubsub = pubsub or InProcessPubSub()
+        self._subscriptions: Dict[str, List] = {}
+        self.ingest_totals = {'connections': 0, 'received': 0, 'dropped': 0, 'processed': 0}
+        self.evicted = 0
+
+    async def connect(self, websocket: WebSocket, room: Optional[str] = None) -> FrameIngest:
+        await websocket.accept()
+        ingest = FrameIngest()
+        channel = ClientChannel(websocket, ingest)
+        channel.start()
+        self.active_connections.append(websocket)
+        if not self.channels:
+            self._subscribe(BROADCAST_TOPIC, self._deliver_all)
+        self.channels[websocket] = channel
+        self.join(websocket, room or settings.default_room)
+        logger.info(f"Client connected. Total connections: {len(self.active_connections)}")
+        return ingest
+
+    def join(self, websocket: WebSocket, room: str) -> Optional[str]:
+        """Move a connection into a room, subscribing this worker to it if needed"""
+        channel = self.channels.get(websocket)
+        if channel is None:
+            return None
+        return self.add_member(channel, room)
+
+    def add_member(self, member, room: str) -> str:
+        """
+        Put a room member into a room
+
+        Members are ClientChannels or anything else with room, encoding and
+        enqueue(payload), e.g. the SSE event logs.
+        """
+        room = str(room)[:64] or settings.default_room
+        if member.room == room:
+            return room
+
+        self._leave(member)
+        members = self.rooms.setdefault(room, set())
+        if not members:
+            self._subscribe(room_topic(room), lambda payload, encoding, room=room: self.deliver(room, payload, encoding))
+        members.add(member)
+        member.room = room
+        return room
+
+    def remove_member(self, member):
+        self._leave(member)
+
+    def _leave(self, member):
+        room = member.room
+        if room is None:
+            return
+        member.room = None
+        members = self.rooms.get(room)
+        if members is None:
+            return
+        members.discard(member)
+        if not members:
+            del self.rooms[room]
+            self._unsubscribe(room_topic(room))
+
+    def _subscribe(self, topic: str, deliver):
+        """Subscribe to a topic and its per-encoding variants"""
+        subscriptions = []
+        for encoding in (None,) + RESULT_ENCODINGS:
+            callback = lambda payload, encoding=encoding: deliver(payload, encoding)
+            self.pubsub.subscribe(encoded_topic(topic, encoding), callback)
+            subscriptions.append((encoded_topic(topic, encoding), callback))
+        self._subscriptions[topic] = subscriptions
+
+    def _unsubscribe(self, topic: str):
+        for variant, callback in self._subscriptions.pop(topic, ()):
+            self.pubsub.unsubscribe(variant, callback)
+
+    def room_of(self, websocket: WebSocket) -> Optional[str]:
+        channel = self.channels.get(websocket)
+        return channel.room if channel is not None else None
+
+    def set_encoding(self, websocket: WebSocket, encoding: str):
+        """Switch the result encoding negotiated by a connection"""
+        channel = self.channels.get(websocket)
+        if channel is not None:
+            channel.encoding = encoding if encoding in RESULT_ENCODINGS else 'json'
+
+    def deliver(self, room: str, payload: Union[str, bytes], encoding: Optional[str] = None):
+        """Queue a payload for this worker's clients in a room (bypasses the PubSub)"""
+        for channel in list(self.rooms.get(room, ())):
+            if encoding is None or channel.encoding == encoding:
+                channel.enqueue(payload)
+
+    def _deliver_all(self, payload: Union[str, bytes], encoding: Optional[str] = None):
+        for channel in list(self.channels.values()):
+            if encoding is None or channel.encoding == encoding:
+                channel.enqueue(payload)
+
+    def disconnect(self, websocket: WebSocket):
+        channel = self.channels.pop(websocket, None)
+        if channel is None:
+            return
+        self.active_connections.remove(websocket)
+
+        if channel.close_reason not in (None, "send failed"):
+            self.evicted += 1
+        self._leave(channel)
+        if not self.channels:
+            self._unsubscribe(BROADCAST_TOPIC)
+        channel.close()
+        ingest = channel.ingest
+        ingest.close()
+        self.ingest_totals['connections'] += 1
+        for key in ('received', 'dropped', 'processed'):
+            self.ingest_totals[key] += getattr(ingest, key)
+        logger.info(f"Ingest stats for {ingest.connection_id}: {ingest.stats()}")
+        logger.info(f"Client disconnected. Total connections: {len(self.active_connections)}")
+
+    async def send_personal(self, websocket: WebSocket, message: Dict) -> bool:
+        """Queue a message for one client behind anything already pending for it"""
+        channel = self.channels.get(websocket)
+        if channel is None:
+            return False
+        return channel.enqueue(encode(message, channel.encoding))
+
+    async def broadcast(self, message: Dict):
+        """Send to every connection regardless of room"""
+        self._publish(BROADCAST_TOPIC, message)
+
+    async def publish(self, room: str, message: Dict):
+        """Send to the subscribers of one room"""
+        self._publish(room_topic(room), message)
+
+    def _publish(self, topic: str, message: Dict):
+        """Publish a message, encoding it once per result encoding where it has a compact form"""
+        if message.get('type') in RESULT_MESSAGES:
+            for encoding in RESULT_ENCODINGS:
+                self.pubsub.publish(encoded_topic(topic, encoding), encode(message, encoding))
+        else:
+            self.pubsub.publish(topic, serialize(message))
+
+    def publish_payload(self, room: str, payload: Union[str, bytes], encoding: Optional[str] = None):
+        """Publish an already-serialized message to one room (or its clients of one encoding)"""
+        self.pubsub.publish(room_topic(room, encoding), payload)
+
+    def room_stats(self) -> Dict:
+        return {room: len(members) for room, members in self.rooms.items()}
+
+    def ingest_stats(self) -> Dict:
+        """Per-connection and lifetime frame ingest counters"""
+        totals = dict(self.ingest_totals)
+        for channel in self.channels.values():
+            for key in ('received', 'dropped', 'processed'):
+                totals[key] += getattr(channel.ingest, key)
+        return {
+            'connections': [channel.ingest.stats() for channel in self.channels.values()],
+            'totals': totals
+        }
+
+    def approx_bytes(self) -> int:
+        """Frames and messages queued for this worker's connections"""
+        return sum(channel.approx_bytes() for channel in self.channels.values())
+
+    def send_stats(self) -> Dict:
+        """Per-connection outbound queue depth and send latency"""
+        return {
+            'connections': {
+                channel.connection_id: channel.stats() for channel in self.channels.values()
+            },
+            'evicted': self.evicted
+        }
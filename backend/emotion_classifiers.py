@@ -0,0 +1,373 @@
+"""
+Pluggable emotion classifier backends
+Backends share one interface: classify(crops) takes preprocessed grayscale face
+crops (N x H x W float32 in [-1, 1], see preprocess_faces) and returns N x 7
+probabilities in EMOTION_LABELS order. Available backends:
+
+    fer     FER's Keras model through TensorFlow
+    onnx    the same model exported to ONNX, run by ONNX Runtime
+    opencv  the exported model (.onnx, or a frozen TensorFlow .pb) run by cv2.dnn
+    int8    a post-training INT8 quantized TFLite model run by tflite_runtime
+    lite    HOG features into a small MLP, numpy and OpenCV only (app_lite.py)
+
+The onnx, opencv, int8 and lite backends never import TensorFlow; export the
+model once with scripts/export_emotion_model.py (scripts/quantize_emotion_model.py
+for int8, scripts/train_lite_emotion_model.py for lite). Every backend limits
+its intra-op threads to emotion_threads and runs a few warm-up inferences when
+it is created, so the first real frame doesn't pay for graph initialization.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import settings
+from emotion_vectors import EMOTION_LABELS
+
+logger = logging.getLogger(__name__)
+
+EMOTION_BACKENDS = ('fer', 'onnx', 'opencv', 'int8', 'lite')
+# Border FER adds around the frame before cutting out faces
+FACE_PADDING = 40
+FACE_OFFSETS = (10, 10)
+DEFAULT_INPUT_SIZE = (64, 64)
+
+
+def pad(gray: np.ndarray) -> np.ndarray:
+    """Pad a grayscale frame with the mean of its bottom rows (as FER does)"""
+    rows = gray.shape[0]
+    mean = cv2.mean(gray[rows - 2:rows])[0]
+    return cv2.copyMakeBorder(gray, FACE_PADDING, FACE_PADDING, FACE_PADDING, FACE_PADDING,
+                              cv2.BORDER_CONSTANT, value=[mean, mean, mean])
+
+
+def tosquare(box: List[int]) -> Tuple[int, int, int, int]:
+    """Grow the shorter side of an [x, y, w, h] box so it becomes square (as FER does)"""
+    x, y, w, h = box
+    if h > w:
+        x -= (h - w) // 2
+        w = h
+    elif w > h:
+        y -= (w - h) // 2
+        h = w
+    return x, y, w, h
+
+
+def preprocess_faces(frame: np.ndarray, boxes: List[List[int]],
+                     input_size: Tuple[int, int]) -> Tuple[np.ndarray, List[List[int]]]:
+    """Cut out, resize and normalize face crops the way FER does before classification"""
+    gray = pad(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    x_off, y_off = FACE_OFFSETS
+
+    crops, kept = [], []
+    for box in boxes:
+        x, y, w, h = tosquare(box)
+        x1 = max(0, x - x_off + FACE_PADDING)
+        y1 = max(0, y - y_off + FACE_PADDING)
+        x2 = x + w + x_off + FACE_PADDING
+        y2 = y + h + y_off + FACE_PADDING
+        face = gray[y1:y2, x1:x2]
+        if face.size == 0:
+            continue
+        face = cv2.resize(face, input_size).astype(np.float32)
+        crops.append((face / 255.0 - 0.5) * 2.0)
+        kept.append(box)
+
+    if not crops:
+        return np.zeros((0,) + tuple(input_size), dtype=np.float32), kept
+    return np.stack(crops), kept
+
+
+class EmotionClassifier:
+    name = "abstract"
+    # Backends whose runtime objects can't be used from several threads at once
+    thread_safe = True
+
+    def __init__(self, threads: Optional[int] = None):
+        # More threads than cores makes the runtimes' spinning thread pools fight over them
+        self.threads = max(1, min(threads or settings.emotion_threads, os.cpu_count() or 1))
+        self.input_size = DEFAULT_INPUT_SIZE
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.crops = 0
+        self.total_time = 0.0
+        self.latencies = deque(maxlen=1000)
+        self.warmup_ms = 0.0
+
+    def _classify(self, crops: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def classify(self, crops: np.ndarray) -> np.ndarray:
+        """N x H x W preprocessed crops -> N x 7 float32 probabilities"""
+        if not len(crops):
+            return np.zeros((0, 7), dtype=np.float32)
+        started = time.perf_counter()
+        if self.thread_safe:
+            predictions = np.asarray(self._classify(crops), dtype=np.float32)
+        else:
+            with self._lock:
+                predictions = np.asarray(self._classify(crops), dtype=np.float32)
+        elapsed = time.perf_counter() - started
+
+        self.calls += 1
+        self.crops += len(crops)
+        self.total_time += elapsed
+        self.latencies.append(elapsed)
+        return predictions
+
+    def warm_up(self, runs: Optional[int] = None):
+        """Run a few dummy inferences so lazy graph setup happens now, not on the first frame"""
+        runs = runs if runs is not None else settings.emotion_warmup_runs
+        started = time.perf_counter()
+        dummy = np.zeros((1,) + tuple(self.input_size), dtype=np.float32)
+        with self._lock:
+            for _ in range(runs):
+                self._classify(dummy)
+        self.warmup_ms = 1000 * (time.perf_counter() - started)
+        if runs:
+            logger.info(f"Emotion classifier {self.name} warmed up in {self.warmup_ms:.0f} ms")
+
+    def stats(self) -> Dict:
+        latencies = sorted(self.latencies)
+        return {
+            'backend': self.name,
+            'threads': self.threads,
+            'warmup_ms': self.warmup_ms,
+            'calls': self.calls,
+            'crops': self.crops,
+            'avg_ms': 1000 * self.total_time / self.calls if self.calls else 0.0,
+            'p95_ms': 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0
+        }
+
+
+class FerClassifier(EmotionClassifier):
+    """FER's Keras model (imports TensorFlow)"""
+
+    name = "fer"
+
+    def __init__(self, threads: Optional[int] = None):
+        super().__init__(threads)
+        import tensorflow as tf
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(self.threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except RuntimeError:
+            # TensorFlow was already initialized by someone else
+            logger.warning("TensorFlow already initialized; emotion_threads not applied")
+        from fer import FER
+        self.fer = FER()
+        self.input_size = tuple(getattr(self.fer, '_FER__emotion_target_size', DEFAULT_INPUT_SIZE))
+
+    def _classify(self, crops: np.ndarray) -> np.ndarray:
+        return np.asarray(self.fer._classify_emotions(crops))
+
+
+def _model_path(path: Optional[str], name: Optional[str] = None,
+                script: str = "scripts/export_emotion_model.py") -> str:
+    path = path or os.path.join(settings.models_dir, name or settings.emotion_model)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Emotion model not found at {path}; run {script}")
+    return path
+
+
+class OnnxClassifier(EmotionClassifier):
+    """Exported model on ONNX Runtime (CPU)"""
+
+    name = "onnx"
+
+    def __init__(self, model_path: Optional[str] = None, threads: Optional[int] = None):
+        super().__init__(threads)
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        self.session = ort.InferenceSession(_model_path(model_path), options,
+                                            providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_size = tuple(model_input.shape[2:4]) if all(
+            isinstance(dim, int) for dim in model_input.shape[2:4]) else DEFAULT_INPUT_SIZE
+
+    def _classify(self, crops: np.ndarray) -> np.ndarray:
+        # The exported model takes N x 1 x H x W
+        return self.session.run(None, {self.input_name: crops[:, np.newaxis]})[0]
+
+
+class OpenCVClassifier(EmotionClassifier):
+    """
+    Exported model on cv2.dnn (.onnx or frozen TensorFlow .pb)
+
+    cv2.setNumThreads is process wide, so emotion_threads also applies to
+    the OpenCV DNN face detector.
+    """
+
+    name = "opencv"
+    thread_safe = False
+
+    def __init__(self, model_path: Optional[str] = None, threads: Optional[int] = None):
+        super().__init__(threads)
+        self.net = cv2.dnn.readNet(_model_path(model_path))
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        cv2.setNumThreads(self.threads)
+
+    def _classify(self, crops: np.ndarray) -> np.ndarray:
+        self.net.setInput(np.ascontiguousarray(crops[:, np.newaxis]))
+        return self.net.forward()
+
+
+class TFLiteClassifier(EmotionClassifier):
+    """
+    INT8 quantized model (scripts/quantize_emotion_model.py) on tflite_runtime
+
+    TFLite interpreters have a fixed batch size, so there is one per
+    power-of-two batch size and smaller batches are zero-padded up to it.
+    """
+
+    name = "int8"
+    thread_safe = False
+
+    def __init__(self, model_path: Optional[str] = None, threads: Optional[int] = None):
+        super().__init__(threads)
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            logger.warning("tflite_runtime is not installed; using TensorFlow's TFLite interpreter")
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self._interpreter_class = Interpreter
+        self.model_path = _model_path(model_path, settings.emotion_int8_model, "scripts/quantize_emotion_model.py")
+        self.interpreters = {}
+        details = self._interpreter(1).get_input_details()[0]
+        self.input_size = tuple(int(dim) for dim in details['shape'][1:3])
+
+    def _interpreter(self, batch: int):
+        interpreter = self.interpreters.get(batch)
+        if interpreter is None:
+            interpreter = self._interpreter_class(model_path=self.model_path, num_threads=self.threads)
+            shape = interpreter.get_input_details()[0]['shape']
+            interpreter.resize_tensor_input(interpreter.get_input_details()[0]['index'],
+                                            (batch,) + tuple(int(dim) for dim in shape[1:]))
+            interpreter.allocate_tensors()
+            self.interpreters[batch] = interpreter
+        return interpreter
+
+    def _classify(self, crops: np.ndarray) -> np.ndarray:
+        count = len(crops)
+        interpreter = self._interpreter(1 << (count - 1).bit_length())
+        model_input = interpreter.get_input_details()[0]
+        model_output = interpreter.get_output_details()[0]
+        batch = np.zeros(model_input['shape'], dtype=np.float32)
+        batch[:count, ..., 0] = crops
+
+        # Models exported with integer input/output need explicit (de)quantization
+        if model_input['dtype'] != np.float32:
+            scale, zero_point = model_input['quantization']
+            info = np.iinfo(model_input['dtype'])
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(model_input['dtype'])
+        interpreter.set_tensor(model_input['index'], batch)
+        interpreter.invoke()
+        output = interpreter.get_tensor(model_output['index'])[:count]
+        if model_output['dtype'] != np.float32:
+            scale, zero_point = model_output['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+def hog_descriptor(params) -> cv2.HOGDescriptor:
+    """HOG over the whole crop; params are (window, block, stride, cell, bins) in pixels"""
+    window, block, stride, cell, bins = (int(v) for v in params)
+    return cv2.HOGDescriptor((window, window), (block, block), (stride, stride), (cell, cell), bins)
+
+
+def hog_features(crops: np.ndarray, hog: cv2.HOGDescriptor) -> np.ndarray:
+    """N x H x W preprocessed crops in [-1, 1] -> N x F float32 HOG features"""
+    pixels = np.clip((crops / 2.0 + 0.5) * 255.0, 0, 255).astype(np.uint8)
+    features = np.empty((len(pixels), hog.getDescriptorSize()), dtype=np.float32)
+    for i, crop in enumerate(pixels):
+        features[i] = hog.compute(crop).ravel()
+    return features
+
+
+def mlp_forward(features: np.ndarray, weights: List[Tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+    """Dense layers with ReLU in between and a softmax on top"""
+    activations = features
+    for i, (weight, bias) in enumerate(weights):
+        activations = activations @ weight + bias
+        if i < len(weights) - 1:
+            np.maximum(activations, 0.0, out=activations)
+    activations -= activations.max(axis=1, keepdims=True)
+    np.exp(activations, out=activations)
+    return activations / activations.sum(axis=1, keepdims=True)
+
+
+class LiteClassifier(EmotionClassifier):
+    """
+    HOG features into a small MLP (scripts/train_lite_emotion_model.py)
+
+    The .npz holds the HOG parameters, the feature standardization (mean,
+    scale) and the dense layers (w0, b0, w1, b1, ...; float16 on disk), so
+    this backend needs nothing beyond numpy and OpenCV and a few hundred KB.
+    """
+
+    name = "lite"
+
+    def __init__(self, model_path: Optional[str] = None, threads: Optional[int] = None):
+        super().__init__(threads)
+        self.model_path = _model_path(model_path, settings.emotion_lite_model, "scripts/train_lite_emotion_model.py")
+        with np.load(self.model_path) as model:
+            labels = tuple(str(label) for label in model['labels'])
+            if labels != EMOTION_LABELS:
+                raise ValueError(f"{self.model_path} predicts {labels}, expected {EMOTION_LABELS}")
+            self.input_size = tuple(int(v) for v in model['input_size'])
+            self.hog = hog_descriptor(model['hog'])
+            self.mean = model['mean'].astype(np.float32)
+            self.scale = model['scale'].astype(np.float32)
+            layers = sum(1 for key in model.files if key.startswith('w'))
+            self.weights = [(model[f'w{i}'].astype(np.float32), model[f'b{i}'].astype(np.float32))
+                            for i in range(layers)]
+        if self.mean.shape[0] != self.hog.getDescriptorSize():
+            raise ValueError(f"{self.model_path} expects {self.mean.shape[0]} features, "
+                             f"its HOG parameters give {self.hog.getDescriptorSize()}")
+
+    @property
+    def nbytes(self) -> int:
+        return self.mean.nbytes + self.scale.nbytes + sum(w.nbytes + b.nbytes for w, b in self.weights)
+
+    def _classify(self, crops: np.ndarray) -> np.ndarray:
+        features = (hog_features(crops, self.hog) - self.mean) / self.scale
+        return mlp_forward(features, self.weights)
+
+
+def create_emotion_classifier(name: Optional[str] = None, warm_up: bool = True) -> EmotionClassifier:
+    """Build (and warm up) the emotion classifier selected by settings.emotion_backend"""
+    name = name or settings.emotion_backend
+    if name not in EMOTION_BACKENDS:
+        logger.warning(f"Unknown emotion backend {name!r}, using fer")
+        name = 'fer'
+
+    if name == 'onnx':
+        try:
+            classifier = OnnxClassifier()
+        except ImportError:
+            logger.warning("onnxruntime is not installed; running the ONNX model on cv2.dnn")
+            classifier = OpenCVClassifier()
+    elif name == 'opencv':
+        classifier = OpenCVClassifier()
+    elif name == 'int8':
+        classifier = TFLiteClassifier()
+    elif name == 'lite':
+        classifier = LiteClassifier()
+    else:
+        classifier = FerClassifier()
+
+    if warm_up:
+        classifier.warm_up()
+    return classifier
@@ -1,138 +1,298 @@
 import cv2
 import numpy as np
-from fer import FER
 from typing import Dict, List, Optional, Tuple
 import logging
-from collections import deque
 import time
+from contextlib import nullcontext
 from config import settings
+from batch_scheduler import MicroBatchScheduler
+from emotion_classifiers import create_emotion_classifier, preprocess_faces
+from face_detectors import create_face_detector
+from emotion_vectors import DEFAULT_VECTOR, EMOTION_LABELS, NUM_EMOTIONS, to_dict
+from face_histories import aggregate, face_vector
+from face_tracker import FaceTracker, TrackingStats
+from frame_gate import FrameGate, FrameGateStats
+from sessions import DetectionSession
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class EmotionDetector:
-    def __init__(self):
-        self.detector = FER(mtcnn=True)
-        self.emotion_history = deque(maxlen=settings.emotion_smoothing_frames)
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.last_detection_time = 0
-        self.detection_interval = 1.0 / settings.detection_fps
-        
-    def detect_emotions(self, frame: np.ndarray) -> Dict:
+    EMOTION_LABELS = list(EMOTION_LABELS)
+    
+    def __init__(self, warm_up: bool = True):
+        # Emotion classifier backend (only the fer backend imports TensorFlow);
+        # faces come from the configured face detector backend
+        self.classifier = create_emotion_classifier(warm_up=False)
+        # The FER instance itself when the fer backend is in use
+        self.detector = getattr(self.classifier, 'fer', None)
+        self.face_detector = create_face_detector()
+        self.tracking_stats = TrackingStats()
+        self.frame_gate_stats = FrameGateStats()
+        self.emotion_target_size = tuple(self.classifier.input_size)
+        self.batcher = MicroBatchScheduler(self._classify_batch) if settings.micro_batching else None
+        # Smoothing and rate-limit state for callers that don't pass a session
+        self.default_session = DetectionSession('default')
+        if warm_up:
+            self.warm_up()
+    
+    def warm_up(self):
+        """Run the face detector and classifier once on a dummy frame so lazy setup happens now"""
+        self.classifier.warm_up()
+        # had_faces makes the cascade detector escalate, so MTCNN warms up too
+        self.face_detector.detect(np.zeros((240, 320, 3), dtype=np.uint8), had_faces=True)
+        self.face_detector.reset_stats()
+    
+    @property
+    def emotion_history(self):
+        return self.default_session.emotion_history
+    
+    @property
+    def last_detection_time(self) -> float:
+        return self.default_session.last_detection_time
+    
+    @last_detection_time.setter
+    def last_detection_time(self, value: float):
+        self.default_session.last_detection_time = value
+    
+    @property
+    def detection_interval(self) -> float:
+        return self.default_session.detection_interval
+        
+    def detect_emotions(self, frame: np.ndarray, session: Optional[DetectionSession] = None) -> Dict:
         """
         Detect emotions from a video frame
         
         Args:
             frame: numpy array representing the image frame
+            session: per-client smoothing and rate-limit state (defaults to a shared one)
             
         Returns:
             Dictionary with emotion data and metadata
         """
+        session = session or self.default_session
         current_time = time.time()
         
         # Rate limiting for performance
-        if current_time - self.last_detection_time < self.detection_interval:
-            return self._get_last_result()
+        if current_time - session.last_detection_time < session.detection_interval:
+            return self._get_last_result(session)
             
-        self.last_detection_time = current_time
+        session.last_detection_time = current_time
         
         try:
-            # Detect emotions
-            result = self.detector.detect_emotions(frame)
-            
-            if not result:
-                return self._create_empty_result()
+            # Static scene: reuse the last result instead of running inference
+            gate = self._frame_gate(session)
+            if gate is not None:
+                cached = gate.check(frame, current_time)
+                if cached is not None:
+                    return cached
             
-            # Process multiple faces and get dominant emotion
-            emotions_data = self._process_faces(result)
-            
-            # Add to history for smoothing
-            self.emotion_history.append(emotions_data['emotions'])
-            
-            # Apply smoothing
-            smoothed_emotions = self._smooth_emotions()
-            
-            # Get dominant emotion
-            dominant_emotion = max(smoothed_emotions.items(), key=lambda x: x[1])[0]
-            
-            return {
-                'success': True,
-                'emotions': smoothed_emotions,
-                'dominant_emotion': dominant_emotion,
-                'confidence': smoothed_emotions[dominant_emotion],
-                'num_faces': len(result),
-                'faces': emotions_data['faces'],
-                'timestamp': current_time,
-                'processing_time': time.time() - current_time
-            }
+            session.detections += 1
+            result = self._detect_and_smooth(frame, session, current_time)
+            if gate is not None:
+                gate.store(result, current_time)
+            return result
             
         except Exception as e:
             logger.error(f"Error detecting emotions: {e}")
             return self._create_empty_result(error=str(e))
     
-    def _process_faces(self, faces: List[Dict]) -> Dict:
-        """Process multiple faces and aggregate emotions"""
-        all_emotions = {
-            'angry': [],
-            'disgust': [],
-            'fear': [],
-            'happy': [],
-            'sad': [],
-            'surprise': [],
-            'neutral': []
+    def _frame_gate(self, session: DetectionSession) -> Optional[FrameGate]:
+        if not settings.frame_gate:
+            return None
+        if session.frame_gate is None:
+            session.frame_gate = FrameGate(self.frame_gate_stats)
+        return session.frame_gate
+    
+    def _detect_and_smooth(self, frame: np.ndarray, session: DetectionSession, current_time: float) -> Dict:
+        """Run full detection on a frame and fold it into the session's smoothing history"""
+        # Detect faces, then classify their crops (batched across frames)
+        with self._producing():
+            result = self._detect_faces_and_emotions(frame, had_faces=session.last_face_count > 0,
+                                                     session=session)
+        session.last_face_count = len(result)
+        
+        if not result:
+            session.face_histories.expire(current_time)
+            return self._create_empty_result()
+        
+        # Smooth every face on its own, then combine them into the scene emotion
+        emotions_data = self._process_faces(result, session, current_time)
+        
+        history = session.emotion_history
+        history.append(emotions_data['emotions'])
+        dominant_emotion, confidence = history.dominant()
+        
+        return {
+            'success': True,
+            'emotions': to_dict(history.smoothed()),
+            'dominant_emotion': dominant_emotion,
+            'confidence': confidence,
+            'num_faces': len(result),
+            'faces': emotions_data['faces'],
+            'smoothed': True,
+            'timestamp': current_time,
+            'processing_time': time.time() - current_time
         }
+    
+    def _detect_faces_and_emotions(self, frame: np.ndarray, had_faces: bool = False,
+                                   session: Optional[DetectionSession] = None) -> List[Dict]:
+        """Find (or track) faces and classify them; same output format as FER.detect_emotions"""
+        detect = lambda: self.face_detector.find_faces(frame, had_faces)[:settings.max_faces]
+        track_ids = None
+        if settings.face_tracking and session is not None:
+            if session.tracker is None:
+                session.tracker = FaceTracker(self.tracking_stats)
+            tracked = session.tracker.update(frame, detect)
+            boxes = [box for _, box in tracked]
+            track_ids = {id(box): track_id for track_id, box in tracked}
+        else:
+            boxes = detect()
+        if not boxes:
+            return []
         
-        face_data = []
+        crops, kept = self._face_crops(frame, boxes)
+        if not kept:
+            return []
         
-        for face in faces[:settings.max_faces]:
-            emotions = face['emotions']
-            box = face['box']
-            
-            # Filter by confidence threshold
-            for emotion, score in emotions.items():
-                if score >= settings.confidence_threshold:
-                    all_emotions[emotion].append(score)
-            
-            face_data.append({
+        faces = self._faces_from_predictions(kept, self._classify(crops))
+        if track_ids is not None:
+            for face in faces:
+                face['track_id'] = track_ids[id(face['box'])]
+        return faces
+    
+    def _faces_from_predictions(self, boxes: List[List[int]], predictions: np.ndarray) -> List[Dict]:
+        """
+        Pair face boxes with their emotion scores in FER's output format
+        
+        Each face also carries its rounded scores as a float32 vector under
+        'scores' for _process_faces; that key is not part of API responses.
+        """
+        rounded = np.round(np.asarray(predictions, dtype=np.float64), 2)
+        return [
+            {
                 'box': box,
-                'emotions': emotions
-            })
+                'emotions': dict(zip(EMOTION_LABELS, scores.tolist())),
+                'scores': scores.astype(np.float32)
+            }
+            for box, scores in zip(boxes, rounded)
+        ]
+    
+    def detect_emotions_batch(self, frames: List[Optional[np.ndarray]]) -> List[Dict]:
+        """
+        Detect emotions in independent still images
         
-        # Average emotions across all faces
-        averaged_emotions = {}
-        for emotion, scores in all_emotions.items():
-            if scores:
-                averaged_emotions[emotion] = np.mean(scores)
-            else:
-                averaged_emotions[emotion] = 0.0
+        No rate limiting or smoothing: every result reflects its own image only.
+        Face crops from all images are classified together in batches of
+        inference_batch_size, through the micro-batcher when it is enabled.
+        Frames that failed to decode may be passed as None.
+        """
+        started = time.time()
+        crops, boxes = [], []
+        for frame in frames:
+            kept = []
+            if frame is not None:
+                found = self.face_detector.find_faces(frame)
+                if found:
+                    frame_crops, kept = self._face_crops(frame, found[:settings.max_faces])
+                    crops.append(frame_crops)
+            boxes.append(kept)
         
-        # Normalize scores
-        total = sum(averaged_emotions.values())
-        if total > 0:
-            averaged_emotions = {k: v/total for k, v in averaged_emotions.items()}
+        predictions = []
+        if crops:
+            crops = np.concatenate(crops)
+            step = settings.inference_batch_size
+            chunks = [crops[i:i + step] for i in range(0, len(crops), step)]
+            if self.batcher is not None:
+                # Full chunks flush at once; the last one may share a batch with live frames
+                futures = [self.batcher.submit(chunk) for chunk in chunks]
+                predictions = np.concatenate([future.result() for future in futures])
+            else:
+                predictions = np.concatenate([self._classify_batch(chunk) for chunk in chunks])
         
-        return {
-            'emotions': averaged_emotions,
-            'faces': face_data
-        }
+        results = []
+        offset = 0
+        for frame, kept in zip(frames, boxes):
+            if frame is None:
+                results.append(self._create_empty_result(error="Invalid image"))
+                continue
+            faces = self._faces_from_predictions(kept, predictions[offset:offset + len(kept)])
+            offset += len(kept)
+            if not faces:
+                results.append(self._create_empty_result())
+                continue
+            
+            processed = self._process_faces(faces)
+            vector = processed['emotions']
+            dominant = int(np.argmax(vector))
+            results.append({
+                'success': True,
+                'emotions': to_dict(vector),
+                'dominant_emotion': EMOTION_LABELS[dominant],
+                'confidence': float(vector[dominant]),
+                'num_faces': len(faces),
+                'faces': processed['faces'],
+                'timestamp': started,
+                'processing_time': (time.time() - started) / len(frames)
+            })
+        return results
+    
+    def _face_crops(self, frame: np.ndarray, boxes: List[List[int]]) -> Tuple[np.ndarray, List[List[int]]]:
+        """Cut out and normalize face crops the way FER does before classification"""
+        return preprocess_faces(frame, boxes, self.emotion_target_size)
     
-    def _smooth_emotions(self) -> Dict[str, float]:
-        """Apply temporal smoothing to emotion scores"""
-        if not self.emotion_history:
-            return self._get_default_emotions()
+    def _producing(self):
+        """Hold micro-batches open for this detection until it has submitted its crops"""
+        return self.batcher.producing() if self.batcher is not None else nullcontext()
+    
+    def _classify(self, crops: np.ndarray) -> np.ndarray:
+        """Classify one frame's crops, batched with other frames when micro-batching is on"""
+        if self.batcher is not None:
+            return self.batcher.classify(crops)
+        return self._classify_batch(crops)
+    
+    def _classify_batch(self, crops: np.ndarray) -> np.ndarray:
+        """Run a batch of preprocessed face crops through the emotion classifier"""
+        return self.classifier.classify(crops)
+    
+    def _process_faces(self, faces: List[Dict], session: Optional[DetectionSession] = None,
+                       current_time: Optional[float] = None) -> Dict:
+        """
+        Process multiple faces and aggregate emotions
         
-        smoothed = {emotion: 0.0 for emotion in self._get_default_emotions()}
+        With a session, every face is folded into its own smoothing history
+        (keyed by track_id, see face_histories.py) and reports its smoothed
+        scores; without one (still images) the raw scores are used. The faces
+        are combined into one normalized float32 vector as set by face_aggregate.
+        Returns that vector plus the per-face output.
+        """
+        faces = faces[:settings.max_faces]
+        if not faces:
+            return {'emotions': np.zeros(NUM_EMOTIONS, dtype=np.float32), 'faces': []}
         
-        for emotions in self.emotion_history:
-            for emotion, score in emotions.items():
-                smoothed[emotion] += score
+        if session is not None:
+            vectors = session.face_histories.update(faces, current_time)
+        else:
+            vectors = np.stack([face_vector(face) for face in faces])
         
-        # Average over history
-        num_frames = len(self.emotion_history)
-        for emotion in smoothed:
-            smoothed[emotion] /= num_frames
+        face_data = []
+        for face, vector in zip(faces, vectors):
+            face_entry = {
+                'box': face['box'],
+                'emotions': to_dict(vector) if session is not None else face['emotions']
+            }
+            if 'track_id' in face:
+                face_entry['track_id'] = face['track_id']
+            face_data.append(face_entry)
         
-        return smoothed
+        return {
+            'emotions': aggregate(vectors, [face['box'] for face in faces]),
+            'faces': face_data
+        }
+    
+    def _smooth_emotions(self, session: Optional[DetectionSession] = None) -> Dict[str, float]:
+        """Smoothed emotion scores of a session (cached by its history until new data arrives)"""
+        return to_dict((session or self.default_session).emotion_history.smoothed())
     
     def _create_empty_result(self, error: Optional[str] = None) -> Dict:
         """Create empty result when no faces detected"""
@@ -149,44 +309,44 @@ class EmotionDetector:
     
     def _get_default_emotions(self) -> Dict[str, float]:
         """Get default emotion scores"""
-        return {
-            'angry': 0.0,
-            'disgust': 0.0,
-            'fear': 0.0,
-            'happy': 0.0,
-            'sad': 0.0,
-            'surprise': 0.0,
-            'neutral': 1.0
-        }
+        return to_dict(DEFAULT_VECTOR)
     
-    def _get_last_result(self) -> Dict:
+    def _get_last_result(self, session: Optional[DetectionSession] = None) -> Dict:
         """Get the last detection result for rate limiting"""
-        if self.emotion_history:
-            smoothed = self._smooth_emotions()
-            dominant = max(smoothed.items(), key=lambda x: x[1])[0]
+        history = (session or self.default_session).emotion_history
+        if history:
+            dominant, confidence = history.dominant()
             return {
                 'success': True,
-                'emotions': smoothed,
+                'emotions': to_dict(history.smoothed()),
                 'dominant_emotion': dominant,
-                'confidence': smoothed[dominant],
+                'confidence': confidence,
                 'cached': True,
                 'timestamp': time.time()
             }
         return self._create_empty_result()
     
-    def reset(self):
+    def time_until_next_detection(self, session: Optional[DetectionSession] = None) -> float:
+        """Seconds until the rate limiter lets the next detection run"""
+        session = session or self.default_session
+        return max(0.0, session.last_detection_time + session.detection_interval - time.time())
+    
+    def reset(self, session: Optional[DetectionSession] = None):
         """Reset emotion history"""
-        self.emotion_history.clear()
-        self.last_detection_time = 0
+        (session or self.default_session).reset()
     
-    def get_emotion_stats(self) -> Dict:
+    def get_emotion_stats(self, session: Optional[DetectionSession] = None) -> Dict:
         """Get statistics about emotion detection"""
-        if not self.emotion_history:
+        session = session or self.default_session
+        if not session.emotion_history:
             return {'history_length': 0, 'emotions': self._get_default_emotions()}
         
         return {
-            'history_length': len(self.emotion_history),
-            'current_emotions': self._smooth_emotions(),
+            'history_length': len(session.emotion_history),
+            'current_emotions': self._smooth_emotions(session),
             'detection_fps': settings.detection_fps,
-            'smoothing_frames': settings.emotion_smoothing_frames
+            'smoothing_frames': settings.emotion_smoothing_frames,
+            'smoothing': settings.emotion_smoothing,
+            'face_aggregate': settings.face_aggregate,
+            'faces': session.face_histories.stats()
         }
\ No newline at end of file
@@ -1,27 +1,53 @@
 """
 Simplified emotion detector for deployment
-Uses OpenCV for face detection and returns mock emotions
+Uses OpenCV for face detection and the lite classifier (HOG features into a
+small MLP, see emotion_classifiers.LiteClassifier) for emotions. Without the
+model (models/emotion_lite.npz, see scripts/train_lite_emotion_model.py) faces
+get demo scores derived from their position instead, and results are marked
+'demo' so clients can tell.
 This avoids heavy dependencies like TensorFlow and FER
 """
 
 import cv2
 import numpy as np
+import logging
 import time
-import random
 from typing import Dict, List, Optional
-from collections import deque
+
+from config import settings
+from emotion_classifiers import LiteClassifier, preprocess_faces
+from emotion_vectors import DEFAULT_VECTOR, EMOTION_INDEX, EmotionHistory, to_dict
+from face_histories import aggregate
+
+logger = logging.getLogger(__name__)
+
+# Base scores of the demo emotions, in EMOTION_LABELS order
+DEMO_BASE = np.array([0.05, 0.05, 0.05, 0.15, 0.10, 0.10, 0.50], dtype=np.float32)
+SURPRISE, HAPPY, NEUTRAL = EMOTION_INDEX['surprise'], EMOTION_INDEX['happy'], EMOTION_INDEX['neutral']
 
 class EmotionDetector:
-    def __init__(self):
+    def __init__(self, model_path: Optional[str] = None):
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.emotion_history = deque(maxlen=5)
+        self.classifier = self._load_classifier(model_path)
+        self.emotion_history = EmotionHistory(maxlen=5)
+        self.rng = np.random.default_rng()
         self.last_detection_time = 0
         self.detection_interval = 0.067  # ~15 FPS
+    
+    def _load_classifier(self, model_path: Optional[str]) -> Optional[LiteClassifier]:
+        try:
+            classifier = LiteClassifier(model_path, threads=1)
+        except FileNotFoundError as e:
+            # Faces are still found; they get demo emotions, marked as such
+            logger.warning(f"{e}; reporting demo emotions, not the faces' expressions")
+            return None
+        classifier.warm_up()
+        return classifier
         
     def detect_emotions(self, frame: np.ndarray) -> Dict:
         """
-        Detect faces and return mock emotions for demo
-        In production, this would use a real emotion detection model
+        Detect faces and classify their emotions
+        Faces are combined into one score vector as set by face_aggregate
         """
         current_time = time.time()
         
@@ -41,92 +67,78 @@ class EmotionDetector:
             if len(faces) == 0:
                 return self._create_empty_result()
             
-            # For demo: generate realistic emotion scores based on face position
-            # In a real app, this would use a trained model
-            face_x, face_y, face_w, face_h = faces[0]
-            
-            # Create emotion scores based on face position (demo logic)
-            emotions = self._generate_demo_emotions(face_x, face_y, face_w, face_h, frame.shape)
+            # Largest faces first
+            boxes = sorted((face.tolist() for face in faces), key=lambda box: box[2] * box[3],
+                           reverse=True)[:settings.max_faces]
+            scores = self._classify_faces(frame, boxes)
             
             # Add to history
-            self.emotion_history.append(emotions)
+            self.emotion_history.append(aggregate(scores, boxes))
             
-            # Apply smoothing
-            smoothed_emotions = self._smooth_emotions()
+            # Smoothed scores are updated incrementally by the history
+            dominant_emotion, confidence = self.emotion_history.dominant()
             
-            # Get dominant emotion
-            dominant_emotion = max(smoothed_emotions.items(), key=lambda x: x[1])[0]
-            
-            return {
+            result = {
                 'success': True,
-                'emotions': smoothed_emotions,
+                'emotions': self._smooth_emotions(),
                 'dominant_emotion': dominant_emotion,
-                'confidence': smoothed_emotions[dominant_emotion],
+                'confidence': confidence,
                 'num_faces': len(faces),
-                'faces': [{'box': face.tolist()} for face in faces],
+                'faces': [{'box': box, 'emotions': to_dict(vector)} for box, vector in zip(boxes, scores)],
                 'timestamp': current_time,
                 'processing_time': time.time() - current_time
             }
+            if self.classifier is None:
+                result['demo'] = True
+            return result
             
         except Exception as e:
             return self._create_empty_result(error=str(e))
     
-    def _generate_demo_emotions(self, x, y, w, h, shape):
+    def _classify_faces(self, frame: np.ndarray, boxes: List[List[int]]) -> np.ndarray:
+        """Emotion scores of each face box (N x 7, demo scores without a model)"""
+        if self.classifier is None:
+            return np.stack([self._generate_demo_emotions(*box, frame.shape) for box in boxes])
+        crops, kept = preprocess_faces(frame, boxes, self.classifier.input_size)
+        scores = np.tile(DEFAULT_VECTOR, (len(boxes), 1))
+        if kept:
+            predictions = self.classifier.classify(crops)
+            for box, vector in zip(kept, predictions):
+                scores[boxes.index(box)] = vector
+        return scores
+    
+    def _generate_demo_emotions(self, x, y, w, h, shape) -> np.ndarray:
         """Generate realistic-looking emotion scores for demo"""
         # Base emotions
-        emotions = {
-            'angry': 0.05,
-            'disgust': 0.05,
-            'fear': 0.05,
-            'happy': 0.15,
-            'sad': 0.10,
-            'surprise': 0.10,
-            'neutral': 0.50
-        }
+        emotions = DEMO_BASE.copy()
         
         # Modify based on face position (simulating different expressions)
-        center_x = x + w/2
         center_y = y + h/2
         
         # If face is in upper part, more likely surprised
         if center_y < shape[0] * 0.4:
-            emotions['surprise'] += 0.3
-            emotions['neutral'] -= 0.3
+            emotions[SURPRISE] += 0.3
+            emotions[NEUTRAL] -= 0.3
         
         # If face is tilted (wider than tall), more likely happy
         if w > h * 1.2:
-            emotions['happy'] += 0.4
-            emotions['neutral'] -= 0.4
+            emotions[HAPPY] += 0.4
+            emotions[NEUTRAL] -= 0.4
         
         # Add some randomness
-        for emotion in emotions:
-            emotions[emotion] += random.uniform(-0.1, 0.1)
-            emotions[emotion] = max(0, min(1, emotions[emotion]))
+        emotions += self.rng.uniform(-0.1, 0.1, emotions.shape).astype(np.float32)
+        np.clip(emotions, 0, 1, out=emotions)
         
         # Normalize
-        total = sum(emotions.values())
+        total = emotions.sum()
         if total > 0:
-            emotions = {k: v/total for k, v in emotions.items()}
+            emotions /= total
         
         return emotions
     
     def _smooth_emotions(self) -> Dict[str, float]:
-        """Apply temporal smoothing"""
-        if not self.emotion_history:
-            return self._get_default_emotions()
-        
-        smoothed = {emotion: 0.0 for emotion in self._get_default_emotions()}
-        
-        for emotions in self.emotion_history:
-            for emotion, score in emotions.items():
-                smoothed[emotion] += score
-        
-        # Average
-        num_frames = len(self.emotion_history)
-        for emotion in smoothed:
-            smoothed[emotion] /= num_frames
-        
-        return smoothed
+        """Smoothed scores (cached by the history until new data arrives)"""
+        return to_dict(self.emotion_history.smoothed())
     
     def _create_empty_result(self, error: Optional[str] = None) -> Dict:
         """Create empty result when no faces detected"""
@@ -143,31 +155,29 @@ class EmotionDetector:
     
     def _get_default_emotions(self) -> Dict[str, float]:
         """Get default emotion scores"""
-        return {
-            'angry': 0.0,
-            'disgust': 0.0,
-            'fear': 0.0,
-            'happy': 0.0,
-            'sad': 0.0,
-            'surprise': 0.0,
-            'neutral': 1.0
-        }
+        return to_dict(DEFAULT_VECTOR)
     
     def _get_last_result(self) -> Dict:
         """Get the last detection result"""
         if self.emotion_history:
-            smoothed = self._smooth_emotions()
-            dominant = max(smoothed.items(), key=lambda x: x[1])[0]
-            return {
+            dominant, confidence = self.emotion_history.dominant()
+            result = {
                 'success': True,
-                'emotions': smoothed,
+                'emotions': self._smooth_emotions(),
                 'dominant_emotion': dominant,
-                'confidence': smoothed[dominant],
+                'confidence': confidence,
                 'cached': True,
                 'timestamp': time.time()
             }
+            if self.classifier is None:
+                result['demo'] = True
+            return result
         return self._create_empty_result()
     
+    def time_until_next_detection(self) -> float:
+        """Seconds until the rate limiter lets the next detection run"""
+        return max(0.0, self.last_detection_time + self.detection_interval - time.time())
+    
     def reset(self):
         """Reset emotion history"""
         self.emotion_history.clear()
@@ -177,5 +187,6 @@ class EmotionDetector:
         """Get statistics"""
         return {
             'history_length': len(self.emotion_history),
-            'current_emotions': self._smooth_emotions() if self.emotion_history else self._get_default_emotions()
+            'current_emotions': self._smooth_emotions(),
+            'classifier': self.classifier.stats() if self.classifier is not None else None
         }
\ No newline at end of file
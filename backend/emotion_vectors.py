@@ -0,0 +1,206 @@
+"""
+Fixed-order emotion vectors, history ring buffer and smoothing filters
+Emotion scores travel through the detectors as float32 vectors in
+EMOTION_LABELS order; dicts are only built for API responses. Each session keeps
+its recent vectors in a preallocated N x 7 ring buffer, and a pluggable smoother
+updates its output incrementally on every append. The smoothed vector and its
+dominant emotion are cached until the next append, so rate-limited and cached
+results cost no recomputation.
+
+Smoothers (emotion_smoothing): mean (moving average over the window), ema
+(exponential moving average), median (per-emotion median over the window),
+kalman (per-emotion random-walk Kalman filter) and none (the latest vector, for
+histories of vectors that are already smoothed).
+"""
+
+import logging
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+EMOTION_LABELS = ('angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral')
+NUM_EMOTIONS = len(EMOTION_LABELS)
+EMOTION_INDEX = {label: i for i, label in enumerate(EMOTION_LABELS)}
+
+DEFAULT_VECTOR = np.zeros(NUM_EMOTIONS, dtype=np.float32)
+DEFAULT_VECTOR[EMOTION_INDEX['neutral']] = 1.0
+DEFAULT_VECTOR.setflags(write=False)
+
+
+def to_vector(emotions: Dict[str, float]) -> np.ndarray:
+    """Emotion dict to a float32 vector (missing emotions score 0)"""
+    return np.array([emotions.get(label, 0.0) for label in EMOTION_LABELS], dtype=np.float32)
+
+
+def to_dict(vector: np.ndarray) -> Dict[str, float]:
+    """Emotion vector to a dict of plain Python floats (for API responses)"""
+    return dict(zip(EMOTION_LABELS, vector.tolist()))
+
+
+def _normalized(vector: np.ndarray) -> np.ndarray:
+    vector = np.maximum(vector, 0.0)
+    total = vector.sum()
+    return vector / total if total > 0 else vector
+
+
+class Smoother:
+    """Incremental filter over an EmotionHistory"""
+
+    name = ''
+
+    def reset(self):
+        pass
+
+    def update(self, history: 'EmotionHistory', vector: np.ndarray,
+               evicted: Optional[np.ndarray]) -> np.ndarray:
+        """Fold in a newly appended vector (evicted: the one it overwrote, if any)"""
+        raise NotImplementedError
+
+
+class MovingAverage(Smoother):
+    name = 'mean'
+
+    def __init__(self):
+        self.total = np.zeros(NUM_EMOTIONS, dtype=np.float64)
+
+    def reset(self):
+        self.total[:] = 0.0
+
+    def update(self, history, vector, evicted):
+        if history.head == 0:
+            # Once per lap of the ring, resum exactly so rounding errors can't build up
+            self.total = history.window().sum(axis=0, dtype=np.float64)
+        else:
+            self.total += vector
+            if evicted is not None:
+                self.total -= evicted
+        return (self.total / len(history)).astype(np.float32)
+
+
+class ExponentialMovingAverage(Smoother):
+    name = 'ema'
+
+    def __init__(self, alpha: Optional[float] = None):
+        self.alpha = alpha if alpha is not None else settings.emotion_ema_alpha
+        self.value: Optional[np.ndarray] = None
+
+    def reset(self):
+        self.value = None
+
+    def update(self, history, vector, evicted):
+        if self.value is None:
+            self.value = vector.copy()
+        else:
+            self.value += self.alpha * (vector - self.value)
+        return self.value.copy()
+
+
+class MedianFilter(Smoother):
+    """Robust to single-frame misclassifications; O(N) per update over the window"""
+
+    name = 'median'
+
+    def update(self, history, vector, evicted):
+        return _normalized(np.median(history.window(), axis=0)).astype(np.float32)
+
+
+class KalmanFilter(Smoother):
+    """Independent random-walk Kalman filter per emotion"""
+
+    name = 'kalman'
+
+    def __init__(self, process_var: Optional[float] = None, measurement_var: Optional[float] = None):
+        self.process_var = process_var if process_var is not None else settings.emotion_kalman_process_var
+        self.measurement_var = (measurement_var if measurement_var is not None
+                                else settings.emotion_kalman_measurement_var)
+        self.value: Optional[np.ndarray] = None
+        self.variance: Optional[np.ndarray] = None
+
+    def reset(self):
+        self.value = None
+        self.variance = None
+
+    def update(self, history, vector, evicted):
+        if self.value is None:
+            self.value = vector.copy()
+            self.variance = np.full(NUM_EMOTIONS, self.measurement_var, dtype=np.float32)
+        else:
+            self.variance += self.process_var
+            gain = self.variance / (self.variance + self.measurement_var)
+            self.value += gain * (vector - self.value)
+            self.variance *= 1.0 - gain
+        return _normalized(self.value).astype(np.float32)
+
+
+class Latest(Smoother):
+    name = 'none'
+
+    def update(self, history, vector, evicted):
+        return vector.copy()
+
+
+SMOOTHERS = {cls.name: cls for cls in (MovingAverage, ExponentialMovingAverage, MedianFilter, KalmanFilter,
+                                       Latest)}
+
+
+def create_smoother(name: Optional[str] = None) -> Smoother:
+    name = name or settings.emotion_smoothing
+    if name not in SMOOTHERS:
+        raise ValueError(f"Unknown emotion smoothing: {name}")
+    return SMOOTHERS[name]()
+
+
+class EmotionHistory:
+    """Preallocated ring buffer of the last maxlen emotion vectors"""
+
+    def __init__(self, maxlen: int, smoother: Optional[Smoother] = None):
+        self.maxlen = maxlen
+        self.smoother = smoother or create_smoother()
+        self._buffer = np.zeros((maxlen, NUM_EMOTIONS), dtype=np.float32)
+        self.head = 0
+        self._count = 0
+        self._smoothed: Optional[np.ndarray] = None
+        self._dominant = 0
+
+    def append(self, emotions: Union[np.ndarray, Dict[str, float]]):
+        vector = to_vector(emotions) if isinstance(emotions, dict) else np.asarray(emotions, dtype=np.float32)
+        evicted = self._buffer[self.head].copy() if self._count == self.maxlen else None
+        self._buffer[self.head] = vector
+        self.head = (self.head + 1) % self.maxlen
+        self._count = min(self._count + 1, self.maxlen)
+
+        self._smoothed = self.smoother.update(self, self._buffer[self.head - 1], evicted)
+        self._dominant = int(np.argmax(self._smoothed))
+
+    def clear(self):
+        self.head = 0
+        self._count = 0
+        self._smoothed = None
+        self.smoother.reset()
+
+    def window(self) -> np.ndarray:
+        """The stored vectors, oldest first"""
+        if self._count < self.maxlen:
+            return self._buffer[:self._count]
+        return np.concatenate((self._buffer[self.head:], self._buffer[:self.head]))
+
+    def smoothed(self) -> np.ndarray:
+        """Smoothed vector (cached until the next append); neutral when empty"""
+        return self._smoothed if self._smoothed is not None else DEFAULT_VECTOR
+
+    def dominant(self) -> Tuple[str, float]:
+        """Dominant emotion of the smoothed vector and its score"""
+        if self._smoothed is None:
+            return 'neutral', 1.0
+        return EMOTION_LABELS[self._dominant], float(self._smoothed[self._dominant])
+
+    @property
+    def nbytes(self) -> int:
+        return self._buffer.nbytes
+
+    def __len__(self) -> int:
+        return self._count
@@ -0,0 +1,165 @@
+"""
+Read-only Server-Sent Events feed of a room (/api/events)
+Each room watched over SSE gets one EventLog that joins the room like a
+WebSocket client does, so it receives the same serialized emotion and music
+messages from the fan-out. The log keeps the latest messages in a bounded ring
+with increasing ids; every viewer just reads from the log at its own pace, so a
+viewer costs no queue or WebSocket state. Reconnecting viewers resume from
+Last-Event-ID, or get a fresh music snapshot if the ids they missed are gone.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+from config import settings
+from connection_manager import ConnectionManager
+from streaming import sse_event
+
+logger = logging.getLogger(__name__)
+
+
+class EventLog:
+    """Bounded log of one room's messages, a member of the room like a ClientChannel"""
+
+    encoding = 'json'
+
+    def __init__(self, maxlen: Optional[int] = None):
+        # Set by ConnectionManager.add_member
+        self.room: Optional[str] = None
+        self.epoch = uuid.uuid4().hex[:8]
+        self.events: deque = deque(maxlen=maxlen or settings.sse_log_size)
+        self.last_id = 0
+        self.viewers = 0
+        self.idle_since: Optional[float] = None
+        self._appended = asyncio.Event()
+
+    def enqueue(self, payload: Union[str, bytes]) -> bool:
+        if isinstance(payload, bytes):
+            return False
+        try:
+            event = json.loads(payload).get('type', 'message')
+        except (ValueError, AttributeError):
+            event = 'message'
+        self.last_id += 1
+        self.events.append((self.last_id, event, payload))
+        # Wake every viewer waiting on the log, then start a new generation
+        self._appended.set()
+        self._appended = asyncio.Event()
+        return True
+
+    def event_id(self, number: int) -> str:
+        return f"{self.epoch}-{number}"
+
+    def parse_id(self, event_id: Optional[str]) -> Optional[int]:
+        """Position of a Last-Event-ID in this log, or None if it belongs to another log"""
+        if not event_id:
+            return None
+        epoch, _, number = event_id.partition('-')
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        return int(number)
+
+    def since(self, position: int) -> Optional[List[Tuple[int, str, str]]]:
+        """Events after position, or None if some of them were already evicted"""
+        if position > self.last_id:
+            return None
+        if position >= self.last_id:
+            return []
+        if not self.events or self.events[0][0] > position + 1:
+            return None
+        start = position + 1 - self.events[0][0]
+        return [self.events[i] for i in range(start, len(self.events))]
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._appended.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class EventLogs:
+    """The EventLog of every room currently watched over SSE on this worker"""
+
+    def __init__(self, manager: ConnectionManager, maxlen: Optional[int] = None,
+                 linger_s: Optional[float] = None, heartbeat_s: Optional[float] = None):
+        self.manager = manager
+        self.maxlen = maxlen or settings.sse_log_size
+        # Logs outlive their last viewer briefly so quick reconnects can resume
+        self.linger = linger_s if linger_s is not None else settings.sse_log_linger_s
+        self.heartbeat = heartbeat_s or settings.sse_heartbeat_s
+        self.logs: Dict[str, EventLog] = {}
+        self.connects = 0
+        self.resumes = 0
+        self.snapshots = 0
+
+    def open(self, room: str) -> EventLog:
+        self._sweep()
+        log = self.logs.get(room)
+        if log is None:
+            log = EventLog(self.maxlen)
+            self.logs[room] = log
+            self.manager.add_member(log, room)
+        log.viewers += 1
+        log.idle_since = None
+        return log
+
+    def close(self, log: EventLog):
+        log.viewers -= 1
+        if log.viewers == 0:
+            log.idle_since = time.monotonic()
+        self._sweep()
+
+    def _sweep(self):
+        now = time.monotonic()
+        for room, log in list(self.logs.items()):
+            if log.viewers == 0 and now - log.idle_since >= self.linger:
+                del self.logs[room]
+                self.manager.remove_member(log)
+
+    async def stream(self, room: str, last_event_id: Optional[str],
+                     snapshot: Callable[[str], Dict]) -> AsyncIterator[str]:
+        """SSE stream of a room: resume after last_event_id or start from a snapshot"""
+        log = self.open(room)
+        self.connects += 1
+        try:
+            yield f"retry: {settings.sse_retry_ms}\n\n"
+            position = log.parse_id(last_event_id)
+            events = log.since(position) if position is not None else None
+            if events is not None:
+                self.resumes += 1
+
+            while True:
+                if events is None:
+                    # New viewer, or it missed events that were already evicted
+                    self.snapshots += 1
+                    position = log.last_id
+                    yield sse_event(snapshot(room), event='music_update', event_id=log.event_id(position))
+                    events = []
+
+                for number, event, payload in events:
+                    yield sse_event(payload, event=event, event_id=log.event_id(number))
+                    position = number
+
+                if position >= log.last_id and not await log.wait(self.heartbeat):
+                    yield ": keepalive\n\n"
+                events = log.since(position)
+        finally:
+            self.close(log)
+
+    def approx_bytes(self) -> int:
+        return sum(len(payload) for log in self.logs.values() for _, _, payload in log.events)
+
+    def stats(self) -> Dict:
+        return {
+            'rooms': {room: {'viewers': log.viewers, 'buffered': len(log.events), 'last_id': log.last_id}
+                      for room, log in self.logs.items()},
+            'connects': self.connects,
+            'resumes': self.resumes,
+            'snapshots': self.snapshots
+        }
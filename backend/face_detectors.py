@@ -0,0 +1,257 @@
+"""
+Pluggable face detector backends
+Backends share one interface: detect(frame) returns (box, confidence) pairs with
+boxes as [x, y, w, h] in pixels and confidences in [0, 1]. Available backends:
+
+    haar     OpenCV Haar cascade (cheapest, frontal faces only)
+    dnn      OpenCV DNN ResNet-10 SSD (needs the model files, see
+             scripts/download_face_models.py)
+    mtcnn    facenet-pytorch MTCNN (most accurate, slowest)
+    cascade  a cheap backend first; MTCNN only when the cheap one is unsure
+
+Each backend records its latency and how often it finds a face so deployments
+can pick the right one.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+Detection = Tuple[List[int], float]
+
+FACE_DETECTORS = ('haar', 'dnn', 'mtcnn', 'cascade')
+
+
+class FaceDetectorBackend:
+    name = "abstract"
+    # Backends whose runtime objects can't be used from several threads at once
+    thread_safe = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.calls = 0
+        self.hits = 0
+        self.faces = 0
+        self.total_time = 0.0
+        self.latencies = deque(maxlen=1000)
+
+    def _detect(self, frame: np.ndarray, had_faces: bool) -> List[Detection]:
+        raise NotImplementedError
+
+    def detect(self, frame: np.ndarray, had_faces: bool = False) -> List[Detection]:
+        """
+        Detect faces in a BGR frame, recording latency and hit rate
+
+        had_faces tells whether the caller's previous frame had faces; only the
+        cascade backend uses it.
+        """
+        started = time.perf_counter()
+        if self.thread_safe:
+            detections = self._detect(frame, had_faces)
+        else:
+            with self._lock:
+                detections = self._detect(frame, had_faces)
+        elapsed = time.perf_counter() - started
+
+        self.calls += 1
+        self.total_time += elapsed
+        self.latencies.append(elapsed)
+        if detections:
+            self.hits += 1
+            self.faces += len(detections)
+        return detections
+
+    def find_faces(self, frame: np.ndarray, had_faces: bool = False) -> List[List[int]]:
+        """Boxes only, most confident first"""
+        detections = sorted(self.detect(frame, had_faces), key=lambda d: d[1], reverse=True)
+        return [box for box, _ in detections]
+
+    def stats(self) -> Dict:
+        latencies = sorted(self.latencies)
+        return {
+            'backend': self.name,
+            'calls': self.calls,
+            'hit_rate': self.hits / self.calls if self.calls else 0.0,
+            'faces': self.faces,
+            'avg_ms': 1000 * self.total_time / self.calls if self.calls else 0.0,
+            'p95_ms': 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0
+        }
+
+
+class HaarFaceDetector(FaceDetectorBackend):
+    """
+    Haar cascade; confidence grows with the number of overlapping raw detections
+    that were merged into the box (CONFIDENT_NEIGHBORS or more counts as 1.0)
+    """
+
+    name = "haar"
+    CONFIDENT_NEIGHBORS = 15
+
+    def __init__(self, cascade_file: Optional[str] = None):
+        super().__init__()
+        self.cascade = cv2.CascadeClassifier(
+            cascade_file or cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        )
+
+    def _detect(self, frame: np.ndarray, had_faces: bool) -> List[Detection]:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        boxes, neighbors = self.cascade.detectMultiScale2(
+            gray,
+            scaleFactor=1.1,
+            minNeighbors=3,
+            flags=cv2.CASCADE_SCALE_IMAGE,
+            minSize=(settings.min_face_size, settings.min_face_size)
+        )
+        return [
+            ([int(v) for v in box], min(1.0, float(count) / self.CONFIDENT_NEIGHBORS))
+            for box, count in zip(boxes, neighbors)
+        ]
+
+
+class DnnFaceDetector(FaceDetectorBackend):
+    """OpenCV's ResNet-10 SSD face detector (Caffe weights)"""
+
+    name = "dnn"
+    # setInput() and forward() share the Net's input and layer buffers
+    thread_safe = False
+    INPUT_SIZE = (300, 300)
+    MEAN = (104.0, 177.0, 123.0)
+
+    def __init__(self, model_path: Optional[str] = None, config_path: Optional[str] = None):
+        super().__init__()
+        model_path = model_path or os.path.join(settings.models_dir, settings.face_dnn_model)
+        config_path = config_path or os.path.join(settings.models_dir, settings.face_dnn_config)
+        if not (os.path.exists(model_path) and os.path.exists(config_path)):
+            raise FileNotFoundError(
+                f"DNN face model not found ({model_path}, {config_path}); "
+                "run scripts/download_face_models.py"
+            )
+        self.net = cv2.dnn.readNetFromCaffe(config_path, model_path)
+
+    def _detect(self, frame: np.ndarray, had_faces: bool) -> List[Detection]:
+        height, width = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(frame, self.INPUT_SIZE), 1.0, self.INPUT_SIZE, self.MEAN)
+        self.net.setInput(blob)
+        output = self.net.forward()[0, 0]
+
+        detections = []
+        for _, _, confidence, x1, y1, x2, y2 in output:
+            if confidence < settings.face_min_confidence:
+                continue
+            x1, x2 = int(max(0.0, x1) * width), int(min(1.0, x2) * width)
+            y1, y2 = int(max(0.0, y1) * height), int(min(1.0, y2) * height)
+            if x2 - x1 < settings.min_face_size or y2 - y1 < settings.min_face_size:
+                continue
+            detections.append(([x1, y1, x2 - x1, y2 - y1], float(confidence)))
+        return detections
+
+
+class MtcnnFaceDetector(FaceDetectorBackend):
+    """
+    facenet-pytorch MTCNN; detect() passes each image through the three
+    eval-mode networks under no_grad and keeps no per-call state, so concurrent
+    calls need no lock
+    """
+
+    name = "mtcnn"
+
+    def __init__(self):
+        super().__init__()
+        from facenet_pytorch import MTCNN
+        self.mtcnn = MTCNN(keep_all=True)
+
+    def _detect(self, frame: np.ndarray, had_faces: bool) -> List[Detection]:
+        boxes, probs = self.mtcnn.detect(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if boxes is None:
+            return []
+        return [
+            ([int(x1), int(y1), int(x2) - int(x1), int(y2) - int(y1)], float(prob))
+            for (x1, y1, x2, y2), prob in zip(boxes, probs)
+            if prob >= settings.face_min_confidence
+        ]
+
+
+class CascadeFaceDetector(FaceDetectorBackend):
+    """
+    Cheap detector first, MTCNN only when the cheap result is not trustworthy
+
+    The cheap result is used as is when every face it found scores at least
+    face_cascade_confident. MTCNN is asked instead when some face scores lower,
+    or when the cheap detector finds nothing although the caller's previous
+    frame had faces. No detection on a frame without recent faces means no face.
+    """
+
+    name = "cascade"
+
+    def __init__(self, cheap: FaceDetectorBackend, accurate: FaceDetectorBackend):
+        self.cheap = cheap
+        self.accurate = accurate
+        super().__init__()
+
+    def reset_stats(self):
+        super().reset_stats()
+        self.cheap.reset_stats()
+        self.accurate.reset_stats()
+        self.confident = 0
+        self.escalated = 0
+        self.no_face = 0
+
+    def _detect(self, frame: np.ndarray, had_faces: bool) -> List[Detection]:
+        detections = self.cheap.detect(frame)
+        if detections and all(confidence >= settings.face_cascade_confident for _, confidence in detections):
+            self.confident += 1
+            return detections
+        if not detections and not had_faces:
+            self.no_face += 1
+            return []
+        self.escalated += 1
+        return self.accurate.detect(frame)
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats.update({
+            'confident': self.confident,
+            'escalated': self.escalated,
+            'no_face': self.no_face,
+            'escalation_rate': self.escalated / self.calls if self.calls else 0.0,
+            'backends': {self.cheap.name: self.cheap.stats(), self.accurate.name: self.accurate.stats()}
+        })
+        return stats
+
+
+def _dnn_or_haar() -> FaceDetectorBackend:
+    try:
+        return DnnFaceDetector()
+    except (FileNotFoundError, cv2.error) as e:
+        logger.warning(f"{e}; falling back to the Haar cascade")
+        return HaarFaceDetector()
+
+
+def create_face_detector(name: Optional[str] = None) -> FaceDetectorBackend:
+    """Build the face detector backend selected by settings.face_detector"""
+    name = name or settings.face_detector
+    if name not in FACE_DETECTORS:
+        logger.warning(f"Unknown face detector {name!r}, using mtcnn")
+        name = 'mtcnn'
+
+    if name == 'haar':
+        return HaarFaceDetector()
+    if name == 'dnn':
+        return _dnn_or_haar()
+    if name == 'mtcnn':
+        return MtcnnFaceDetector()
+    cheap = _dnn_or_haar() if settings.face_cascade_cheap == 'dnn' else HaarFaceDetector()
+    return CascadeFaceDetector(cheap, MtcnnFaceDetector())
@@ -0,0 +1,177 @@
+"""
+Per-face smoothing histories
+With several people in frame every face keeps its own EmotionHistory, keyed by
+a stable face ID: the face tracker's track ID (face_tracker.py), or, with
+face_tracking off, an ID carried over from the previous frame's face with the
+best IoU. The scene-level emotion is then built from the faces' smoothed
+vectors, weighted by face_aggregate:
+
+    mean            each emotion averaged over the faces where it reaches confidence_threshold
+    area            weighted by face box area
+    confidence      weighted by each face's dominant score
+    largest         the largest face only
+    most_confident  the face with the highest dominant score only
+
+A face's history is freed once the face has been gone for face_history_timeout_s.
+"""
+
+import logging
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import settings
+from emotion_vectors import NUM_EMOTIONS, EmotionHistory, create_smoother, to_vector
+from face_tracker import iou
+
+logger = logging.getLogger(__name__)
+
+FACE_AGGREGATES = ('mean', 'area', 'confidence', 'largest', 'most_confident')
+
+
+def face_vector(face: Dict) -> np.ndarray:
+    """A face's emotion scores as a float32 vector"""
+    return face['scores'] if 'scores' in face else to_vector(face['emotions'])
+
+
+def aggregate(vectors: np.ndarray, boxes: List[List[int]], weighting: Optional[str] = None) -> np.ndarray:
+    """Combine N x 7 per-face vectors into one normalized scene vector"""
+    weighting = weighting or settings.face_aggregate
+    if weighting not in FACE_AGGREGATES:
+        raise ValueError(f"Unknown face aggregate: {weighting}")
+    if not len(vectors):
+        return np.zeros(NUM_EMOTIONS, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+
+    if weighting == 'mean':
+        passed = vectors >= settings.confidence_threshold
+        counts = passed.sum(axis=0)
+        sums = np.where(passed, vectors, 0.0).sum(axis=0)
+        combined = np.divide(sums, counts, out=np.zeros(NUM_EMOTIONS, dtype=np.float32), where=counts > 0)
+        if not combined.any():
+            # Nothing confident on any face: plain average rather than all zeros
+            combined = vectors.mean(axis=0)
+    else:
+        if weighting in ('area', 'largest'):
+            weights = np.array([max(0, box[2]) * max(0, box[3]) for box in boxes], dtype=np.float32)
+        else:
+            weights = vectors.max(axis=1)
+        if weighting in ('largest', 'most_confident'):
+            weights = (np.arange(len(weights)) == int(np.argmax(weights))).astype(np.float32)
+        if weights.sum() <= 0:
+            weights = np.ones(len(vectors), dtype=np.float32)
+        combined = weights @ vectors
+
+    combined = combined.astype(np.float32)
+    total = combined.sum()
+    if total > 0:
+        combined /= total
+    return combined
+
+
+class _FaceState:
+    __slots__ = ('history', 'box', 'first_seen', 'last_seen')
+
+    def __init__(self, history: EmotionHistory, box: List[int], now: float):
+        self.history = history
+        self.box = box
+        self.first_seen = now
+        self.last_seen = now
+
+
+class FaceHistories:
+    def __init__(self, smoothing_frames: Optional[int] = None, timeout: Optional[float] = None,
+                 iou_threshold: Optional[float] = None):
+        self.smoothing_frames = smoothing_frames or settings.emotion_smoothing_frames
+        self.timeout = timeout if timeout is not None else settings.face_history_timeout_s
+        self.iou_threshold = iou_threshold if iou_threshold is not None else settings.tracker_iou_threshold
+        self._faces: Dict[int, _FaceState] = {}
+        self.next_id = 1
+        self.created = 0
+        self.expired = 0
+
+    def update(self, faces: List[Dict], now: Optional[float] = None) -> np.ndarray:
+        """
+        Fold one frame's faces into their histories
+
+        Faces without a 'track_id' get one here. Returns the faces' smoothed
+        vectors (N x 7, in the order of faces); histories of faces gone for
+        longer than the timeout are freed.
+        """
+        now = now if now is not None else time.time()
+        self._assign_ids(faces)
+        smoothed = np.zeros((len(faces), NUM_EMOTIONS), dtype=np.float32)
+        for i, face in enumerate(faces):
+            state = self._faces.get(face['track_id'])
+            if state is None:
+                state = self._faces[face['track_id']] = _FaceState(
+                    EmotionHistory(self.smoothing_frames, create_smoother()), face['box'], now)
+                self.created += 1
+            state.history.append(face_vector(face))
+            state.box = face['box']
+            state.last_seen = now
+            smoothed[i] = state.history.smoothed()
+        self.expire(now)
+        return smoothed
+
+    def _assign_ids(self, faces: List[Dict]):
+        """Carry IDs over from the best overlapping face of earlier frames, or hand out new ones"""
+        untracked = [face for face in faces if 'track_id' not in face]
+        if not untracked:
+            return
+        taken = {face['track_id'] for face in faces if 'track_id' in face}
+        candidates = [(face_id, state) for face_id, state in self._faces.items() if face_id not in taken]
+        pairs = sorted(
+            ((iou(state.box, face['box']), f, face_id)
+             for face_id, state in candidates for f, face in enumerate(untracked)),
+            key=lambda pair: pair[0], reverse=True
+        )
+        assigned = {}
+        for overlap, f, face_id in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if f in assigned or face_id in taken:
+                continue
+            assigned[f] = face_id
+            taken.add(face_id)
+        for f, face in enumerate(untracked):
+            face_id = assigned.get(f)
+            if face_id is None:
+                face_id = max(self.next_id, max(self._faces, default=0) + 1)
+                self.next_id = face_id + 1
+            face['track_id'] = face_id
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Free the histories of faces not seen for longer than the timeout"""
+        now = now if now is not None else time.time()
+        gone = [face_id for face_id, state in self._faces.items() if now - state.last_seen > self.timeout]
+        for face_id in gone:
+            del self._faces[face_id]
+        self.expired += len(gone)
+        return len(gone)
+
+    def history(self, face_id: int) -> Optional[EmotionHistory]:
+        state = self._faces.get(face_id)
+        return state.history if state is not None else None
+
+    def reset(self):
+        self._faces.clear()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(state.history.nbytes for state in self._faces.values())
+
+    def __len__(self) -> int:
+        return len(self._faces)
+
+    def __contains__(self, face_id: int) -> bool:
+        return face_id in self._faces
+
+    def stats(self) -> Dict:
+        return {
+            'active': len(self._faces),
+            'created': self.created,
+            'expired': self.expired,
+            'timeout_s': self.timeout
+        }
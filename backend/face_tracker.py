@@ -0,0 +1,194 @@
+"""
+Inter-frame face tracking
+Full face detection runs every tracker_redetect_interval frames, or sooner when
+tracking gets unreliable. In between, each face box is carried forward with
+sparse Lucas-Kanade optical flow on a downscaled grayscale frame, so only the
+emotion classifier runs on the tracked crops. Detections are matched to existing
+tracks by IoU, which keeps each face's track ID stable across detections.
+"""
+
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+MIN_TRACK_POINTS = 4
+MAX_CORNERS = 30
+FB_ERROR_PX = 1.0
+LK_PARAMS = dict(winSize=(15, 15), maxLevel=2,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+
+def iou(a: List[int], b: List[int]) -> float:
+    """Intersection over union of two [x, y, w, h] boxes"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+class TrackingStats:
+    """Counters shared by every session's tracker"""
+
+    def __init__(self):
+        self.frames = 0
+        self.detections = 0
+        self.tracked = 0
+        self.reasons = {'no_tracks': 0, 'interval': 0, 'low_confidence': 0}
+        self.tracks_created = 0
+
+    def stats(self) -> Dict:
+        return {
+            'frames': self.frames,
+            'detections': self.detections,
+            'tracked_frames': self.tracked,
+            'detection_skip_ratio': self.tracked / self.frames if self.frames else 0.0,
+            'redetect_reasons': dict(self.reasons),
+            'tracks_created': self.tracks_created
+        }
+
+
+class Track:
+    __slots__ = ('track_id', 'box', 'points', 'confidence', 'age')
+
+    def __init__(self, track_id: int, box: List[int]):
+        self.track_id = track_id
+        self.box = box
+        self.points: Optional[np.ndarray] = None
+        self.confidence = 1.0
+        self.age = 0
+
+
+class FaceTracker:
+    def __init__(self, stats: Optional[TrackingStats] = None, redetect_interval: Optional[int] = None,
+                 min_confidence: Optional[float] = None, iou_threshold: Optional[float] = None,
+                 max_width: Optional[int] = None):
+        self.stats = stats or TrackingStats()
+        self.redetect_interval = redetect_interval or settings.tracker_redetect_interval
+        self.min_confidence = min_confidence if min_confidence is not None else settings.tracker_min_confidence
+        self.iou_threshold = iou_threshold if iou_threshold is not None else settings.tracker_iou_threshold
+        self.max_width = max_width or settings.tracker_max_width
+        self.tracks: List[Track] = []
+        self.next_id = 1
+        self.since_detection = 0
+        self.prev_gray: Optional[np.ndarray] = None
+
+    def update(self, frame: np.ndarray, detect: Callable[[], List[List[int]]]) -> List[Tuple[int, List[int]]]:
+        """
+        Face boxes for this frame as (track_id, box) pairs
+
+        detect is called only when a full detection is due; it must return the
+        frame's face boxes as [x, y, w, h] lists.
+        """
+        gray, scale = self._prepare(frame)
+        self.stats.frames += 1
+
+        reason = None
+        if not self.tracks:
+            reason = 'no_tracks'
+        elif self.since_detection + 1 >= self.redetect_interval:
+            reason = 'interval'
+        elif self.prev_gray is None or self.prev_gray.shape != gray.shape or not self._propagate(gray, scale, frame.shape):
+            reason = 'low_confidence'
+
+        if reason is not None:
+            self._assign(detect(), gray, scale)
+            self.since_detection = 0
+            self.stats.detections += 1
+            self.stats.reasons[reason] += 1
+        else:
+            self.since_detection += 1
+            self.stats.tracked += 1
+
+        self.prev_gray = gray
+        return [(track.track_id, track.box) for track in self.tracks]
+
+    def reset(self):
+        self.tracks = []
+        self.since_detection = 0
+        self.prev_gray = None
+
+    def _prepare(self, frame: np.ndarray) -> Tuple[np.ndarray, float]:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        scale = min(1.0, self.max_width / gray.shape[1])
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return gray, scale
+
+    def _seed_points(self, gray: np.ndarray, box: List[int], scale: float) -> Optional[np.ndarray]:
+        x, y, w, h = [int(round(v * scale)) for v in box]
+        # Inner part of the box: fewer background corners that move differently
+        mask = np.zeros_like(gray)
+        mask[max(0, y + h // 6):y + h - h // 6, max(0, x + w // 6):x + w - w // 6] = 255
+        return cv2.goodFeaturesToTrack(gray, MAX_CORNERS, 0.01, 3, mask=mask)
+
+    def _assign(self, boxes: List[List[int]], gray: np.ndarray, scale: float):
+        """Match detections to existing tracks by IoU; unmatched detections start new tracks"""
+        pairs = sorted(
+            ((iou(track.box, box), t, b) for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True
+        )
+        matched_tracks, matched_boxes, assignment = set(), set(), {}
+        for overlap, t, b in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in matched_tracks or b in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(b)
+            assignment[b] = self.tracks[t]
+
+        tracks = []
+        for b, box in enumerate(boxes):
+            track = assignment.get(b)
+            if track is None:
+                track = Track(self.next_id, box)
+                self.next_id += 1
+                self.stats.tracks_created += 1
+            track.box = [int(v) for v in box]
+            track.points = self._seed_points(gray, track.box, scale)
+            track.confidence = 1.0
+            track.age += 1
+            tracks.append(track)
+        self.tracks = tracks
+
+    def _propagate(self, gray: np.ndarray, scale: float, frame_shape: Tuple[int, ...]) -> bool:
+        """Move every track with optical flow; False if any of them became unreliable"""
+        height, width = frame_shape[:2]
+        for track in self.tracks:
+            p0 = track.points
+            if p0 is None or len(p0) < MIN_TRACK_POINTS:
+                return False
+
+            p1, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, p0, None, **LK_PARAMS)
+            back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, p1, None, **LK_PARAMS)
+            fb_error = np.linalg.norm((p0 - back).reshape(-1, 2), axis=1)
+            good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < FB_ERROR_PX)
+
+            track.confidence = float(good.sum()) / len(p0)
+            if track.confidence < self.min_confidence or good.sum() < MIN_TRACK_POINTS:
+                return False
+
+            old, new = p0.reshape(-1, 2)[good], p1.reshape(-1, 2)[good]
+            shift = np.median(new - old, axis=0) / scale
+            spread_old = np.median(np.linalg.norm(old - old.mean(axis=0), axis=1))
+            spread_new = np.median(np.linalg.norm(new - new.mean(axis=0), axis=1))
+            zoom = float(np.clip(spread_new / spread_old, 0.8, 1.25)) if spread_old > 0 else 1.0
+
+            x, y, w, h = track.box
+            cx, cy = x + w / 2 + shift[0], y + h / 2 + shift[1]
+            w, h = w * zoom, h * zoom
+            if cx < 0 or cy < 0 or cx > width or cy > height:
+                return False
+            track.box = [int(round(cx - w / 2)), int(round(cy - h / 2)), int(round(w)), int(round(h))]
+            track.points = new.reshape(-1, 1, 2)
+        return True
+
+    def approx_bytes(self) -> int:
+        return self.prev_gray.nbytes if self.prev_gray is not None else 0
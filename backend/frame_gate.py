@@ -0,0 +1,150 @@
+"""
+Frame-change gate for static scenes
+Before running inference, each frame is compared with the frame the session's
+last result came from: both are reduced to a small grayscale thumbnail and the
+mean absolute difference is taken over the whole picture and over the region
+around the last detected faces. While both stay under the threshold the last
+result is reused (marked cached), up to a maximum staleness after which a fresh
+detection is forced.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Padding around the union of face boxes, as a fraction of its size
+FACE_REGION_PADDING = 0.25
+# Recent differences kept for the percentiles in the stats
+DIFF_WINDOW = 512
+
+
+class FrameGateStats:
+    """Counters shared by every session's gate"""
+
+    def __init__(self):
+        self.frames = 0
+        self.skipped = 0
+        self.reasons = {'no_reference': 0, 'changed': 0, 'stale': 0}
+        self.diffs = deque(maxlen=DIFF_WINDOW)
+
+    def stats(self) -> Dict:
+        diffs = np.asarray(list(self.diffs), dtype=np.float32)
+        return {
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'skip_ratio': self.skipped / self.frames if self.frames else 0.0,
+            'refresh_reasons': dict(self.reasons),
+            'threshold': settings.frame_gate_threshold,
+            'diff_p50': float(np.percentile(diffs, 50)) if len(diffs) else 0.0,
+            'diff_p90': float(np.percentile(diffs, 90)) if len(diffs) else 0.0
+        }
+
+
+class FrameGate:
+    def __init__(self, stats: Optional[FrameGateStats] = None, threshold: Optional[float] = None,
+                 max_staleness_s: Optional[float] = None, width: Optional[int] = None):
+        self.stats = stats or FrameGateStats()
+        self.threshold = threshold if threshold is not None else settings.frame_gate_threshold
+        self.max_staleness = max_staleness_s if max_staleness_s is not None else settings.frame_gate_max_staleness_s
+        self.width = width or settings.frame_gate_width
+        self.reference: Optional[np.ndarray] = None
+        self.result: Optional[Dict] = None
+        self.region: Optional[tuple] = None
+        self.refreshed_at = 0.0
+        self._pending: Optional[np.ndarray] = None
+        self._scale = 1.0
+
+    def check(self, frame: np.ndarray, now: Optional[float] = None) -> Optional[Dict]:
+        """Return the last result (marked cached) if the scene hasn't changed, else None"""
+        now = now or time.time()
+        self.stats.frames += 1
+        thumb, scale = self._thumbnail(frame)
+        self._pending = thumb
+        self._scale = scale
+
+        if self.reference is None or self.result is None or self.reference.shape != thumb.shape:
+            self.stats.reasons['no_reference'] += 1
+            return None
+        if now - self.refreshed_at >= self.max_staleness:
+            self.stats.reasons['stale'] += 1
+            return None
+
+        diff = self.difference(self.reference, thumb, self.region)
+        self.stats.diffs.append(diff)
+        if diff >= self.threshold:
+            self.stats.reasons['changed'] += 1
+            return None
+
+        self.stats.skipped += 1
+        result = dict(self.result)
+        result['cached'] = True
+        result['timestamp'] = now
+        result['processing_time'] = time.time() - now
+        return result
+
+    def store(self, result: Dict, now: Optional[float] = None):
+        """Remember a fresh result and the frame (passed to check) it came from"""
+        if self._pending is None:
+            return
+        self.reference = self._pending
+        self._pending = None
+        self.result = result
+        self.region = self._face_region(result.get('faces') or [], self._scale, self.reference.shape)
+        self.refreshed_at = now or time.time()
+
+    def reset(self):
+        self.reference = None
+        self.result = None
+        self.region = None
+        self._pending = None
+        self.refreshed_at = 0.0
+
+    def _thumbnail(self, frame: np.ndarray):
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.width / float(width))
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA), scale
+
+    @staticmethod
+    def _face_region(faces: List[Dict], scale: float, shape) -> Optional[tuple]:
+        """Padded union of the face boxes in thumbnail coordinates"""
+        boxes = [face['box'] for face in faces if face.get('box')]
+        if not boxes:
+            return None
+        x1 = min(box[0] for box in boxes)
+        y1 = min(box[1] for box in boxes)
+        x2 = max(box[0] + box[2] for box in boxes)
+        y2 = max(box[1] + box[3] for box in boxes)
+        pad_x, pad_y = (x2 - x1) * FACE_REGION_PADDING, (y2 - y1) * FACE_REGION_PADDING
+        height, width = shape
+        left, top = max(0, int((x1 - pad_x) * scale)), max(0, int((y1 - pad_y) * scale))
+        right, bottom = min(width, int((x2 + pad_x) * scale) + 1), min(height, int((y2 + pad_y) * scale) + 1)
+        if right <= left or bottom <= top:
+            return None
+        return left, top, right, bottom
+
+    @staticmethod
+    def difference(reference: np.ndarray, thumb: np.ndarray, region: Optional[tuple] = None) -> float:
+        """Mean absolute difference (in gray levels) over the whole thumbnail and the face region"""
+        diff = cv2.absdiff(reference, thumb)
+        overall = float(diff.mean())
+        if region is None:
+            return overall
+        left, top, right, bottom = region
+        return max(overall, float(diff[top:bottom, left:right].mean()))
+
+    def approx_bytes(self) -> int:
+        size = 0
+        for thumb in (self.reference, self._pending):
+            if thumb is not None:
+                size += thumb.nbytes
+        return size
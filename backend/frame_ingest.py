@@ -0,0 +1,85 @@
+"""
+Per-connection ingest stage for /ws
+Keeps only the newest undecoded frame. Frames that are superseded before the
+detector is ready for them are dropped (and counted) without ever being decoded.
+"""
+
+import asyncio
+import time
+import uuid
+from typing import Dict, Optional
+
+from frame_protocol import Frame
+
+
+class FrameIngest:
+    def __init__(self, connection_id: Optional[str] = None):
+        self.connection_id = connection_id or uuid.uuid4().hex[:12]
+        self._frame: Optional[Frame] = None
+        self._event = asyncio.Event()
+        self._closed = False
+        self.connected_at = time.time()
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+
+    def put(self, frame: Frame):
+        """Store a new frame, replacing (and dropping) any frame still waiting"""
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+        self._event.set()
+
+    async def get(self) -> Optional[Frame]:
+        """Wait for the newest frame; returns None once the ingest is closed"""
+        while self._frame is None:
+            if self._closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        return self._take()
+
+    def newest(self, frame: Frame) -> Frame:
+        """Swap a frame taken earlier for a newer one if one has arrived meanwhile"""
+        newer = self._take()
+        if newer is None:
+            return frame
+        self.dropped += 1
+        return newer
+
+    def mark_processed(self):
+        self.processed += 1
+
+    def mark_dropped(self):
+        """Count a frame discarded downstream by pipeline backpressure"""
+        self.dropped += 1
+
+    def close(self):
+        self._closed = True
+        self._event.set()
+
+    def _take(self) -> Optional[Frame]:
+        frame, self._frame = self._frame, None
+        return frame
+
+    @property
+    def pending(self) -> int:
+        return 0 if self._frame is None else 1
+
+    def approx_bytes(self) -> int:
+        return len(self._frame.payload) if self._frame is not None else 0
+
+    def stats(self) -> Dict:
+        """Per-connection ingest counters"""
+        elapsed = max(time.time() - self.connected_at, 1e-6)
+        return {
+            'connection_id': self.connection_id,
+            'received': self.received,
+            'dropped': self.dropped,
+            'processed': self.processed,
+            'pending': self.pending,
+            'drop_ratio': self.dropped / self.received if self.received else 0.0,
+            'processed_fps': self.processed / elapsed,
+            'connected_for': elapsed
+        }
@@ -0,0 +1,300 @@
+"""
+WebSocket frame protocol for /ws
+Frames can arrive either as legacy JSON text messages carrying a base64 data URL,
+or as binary messages once the client has negotiated binary mode with a hello.
+
+Binary frame layout (little-endian, 16 byte header followed by the encoded image):
+
+    offset  size  field
+    0       1     message type (1 = frame)
+    1       1     codec (1 = jpeg, 2 = webp, 3 = png)
+    2       2     flags (reserved, 0)
+    4       4     sequence number (uint32)
+    8       8     client timestamp in milliseconds (float64)
+    16      n     raw image bytes
+
+Clients can also ask for compact binary results (hello with results='binary');
+JSON stays the default. emotion_result and emotion_update messages are then sent
+as binary messages (little-endian, 60 byte header then one record per face):
+
+    offset  size  field
+    0       1     message type (2 = emotion_result, 3 = emotion_update)
+    1       1     flags (bit 0 success, bit 1 cached, bit 2 has seq, bit 3 has client_ts)
+    2       1     dominant emotion id
+    3       1     number of face records
+    4       2     number of faces detected (uint16)
+    6       2     reserved, 0
+    8       4     echoed sequence number (uint32)
+    12      8     echoed client timestamp in milliseconds (float64)
+    20      8     server timestamp in seconds (float64)
+    28      4     processing time in milliseconds (float32)
+    32      28    emotion scores (7 x float32, in EMOTION_IDS order)
+
+    face record (36 bytes): box x, y, w, h (4 x int16), emotion scores (7 x float32)
+
+A hello may also carry max_fps, the client's own capture rate limit. The server
+answers with {'type': 'rate', 'fps': ...} messages (always JSON) on connect and
+whenever the session's target detection rate changes; clients should capture
+at that rate (see rate_controller.py).
+"""
+
+import base64
+import json
+import struct
+import time
+from typing import Dict, NamedTuple, Optional, Union
+
+import cv2
+import numpy as np
+
+PROTOCOL_VERSION = 1
+
+FRAME_HEADER = struct.Struct('<BBHId')
+
+MSG_FRAME = 1
+
+CODEC_JPEG = 1
+CODEC_WEBP = 2
+CODEC_PNG = 3
+
+CODECS = {
+    CODEC_JPEG: 'jpeg',
+    CODEC_WEBP: 'webp',
+    CODEC_PNG: 'png'
+}
+
+# Emotion ids used by binary results; the order is part of the protocol
+EMOTION_IDS = ('angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral')
+
+MSG_EMOTION_RESULT = 2
+MSG_EMOTION_UPDATE = 3
+
+RESULT_MESSAGES = {
+    'emotion_result': MSG_EMOTION_RESULT,
+    'emotion_update': MSG_EMOTION_UPDATE
+}
+
+RESULT_ENCODINGS = ('json', 'binary')
+
+RESULT_HEADER = struct.Struct('<BBBBHHIddf7f')
+FACE_RECORD = struct.Struct('<4h7f')
+
+RESULT_SUCCESS = 0x01
+RESULT_CACHED = 0x02
+RESULT_HAS_SEQ = 0x04
+RESULT_HAS_CLIENT_TS = 0x08
+
+
+class ProtocolError(ValueError):
+    """Raised when a WebSocket message does not follow the frame protocol"""
+
+
+class Frame(NamedTuple):
+    """An encoded frame as received from a client, not yet decoded"""
+    payload: Union[bytes, memoryview, str]
+    seq: Optional[int] = None
+    client_ts: Optional[float] = None
+    codec: int = CODEC_JPEG
+    received_at: float = 0.0
+
+    def echo(self) -> Dict:
+        """Fields echoed back in results so clients can measure round-trip latency"""
+        echo = {}
+        if self.seq is not None:
+            echo['seq'] = self.seq
+        if self.client_ts is not None:
+            echo['client_ts'] = self.client_ts
+        return echo
+
+
+def pack_frame(image_bytes: bytes, seq: int, client_ts: float, codec: int = CODEC_JPEG) -> bytes:
+    """Build a binary frame message (used by tests and Python clients)"""
+    return FRAME_HEADER.pack(MSG_FRAME, codec, 0, seq & 0xFFFFFFFF, client_ts) + image_bytes
+
+
+def parse_binary_frame(data: bytes) -> Frame:
+    """Parse a binary frame message without copying the image payload"""
+    if len(data) < FRAME_HEADER.size:
+        raise ProtocolError(f"Binary frame shorter than {FRAME_HEADER.size} byte header")
+
+    msg_type, codec, _flags, seq, client_ts = FRAME_HEADER.unpack_from(data)
+    if msg_type != MSG_FRAME:
+        raise ProtocolError(f"Unknown binary message type: {msg_type}")
+    if codec not in CODECS:
+        raise ProtocolError(f"Unknown codec: {codec}")
+
+    return Frame(
+        payload=memoryview(data)[FRAME_HEADER.size:],
+        seq=seq,
+        client_ts=client_ts,
+        codec=codec,
+        received_at=time.time()
+    )
+
+
+def parse_json_frame(message: Dict) -> Frame:
+    """Wrap a legacy JSON frame message; the data URL is decoded lazily"""
+    data = message.get('data')
+    if not isinstance(data, str):
+        raise ProtocolError("JSON frame is missing its data URL")
+
+    return Frame(
+        payload=data,
+        seq=message.get('seq'),
+        client_ts=message.get('timestamp'),
+        received_at=time.time()
+    )
+
+
+def parse_message(raw: Dict, binary_enabled: bool = True) -> Union[Frame, Dict]:
+    """
+    Parse a raw ASGI websocket.receive message
+
+    Returns a Frame for image frames (binary or JSON) and the decoded dict for
+    every other JSON message (control, hello, ...).
+    """
+    if raw.get('bytes') is not None:
+        if not binary_enabled:
+            raise ProtocolError("Binary frames require a hello with protocol 'binary'")
+        return parse_binary_frame(raw['bytes'])
+
+    try:
+        message = json.loads(raw.get('text') or '')
+    except ValueError as e:
+        raise ProtocolError(f"Invalid JSON message: {e}")
+
+    if not isinstance(message, dict) or 'type' not in message:
+        raise ProtocolError("JSON message must be an object with a 'type'")
+
+    if message['type'] == 'frame':
+        return parse_json_frame(message)
+    return message
+
+
+def hello_response(requested: Optional[str], results: Optional[str] = None) -> Dict:
+    """Build the server's answer to a client hello"""
+    protocol = 'binary' if requested == 'binary' else 'json'
+    response = {
+        'type': 'hello',
+        'protocol': protocol,
+        'results': 'binary' if results == 'binary' else 'json',
+        'version': PROTOCOL_VERSION
+    }
+    if protocol == 'binary':
+        response['header_size'] = FRAME_HEADER.size
+        response['codecs'] = list(CODECS.values())
+    if response['results'] == 'binary':
+        response['result_header_size'] = RESULT_HEADER.size
+        response['face_record_size'] = FACE_RECORD.size
+        response['emotions'] = list(EMOTION_IDS)
+    return response
+
+
+def _clip_int16(value) -> int:
+    return max(-32768, min(32767, int(value)))
+
+
+def pack_result(message: Dict) -> bytes:
+    """Encode an emotion_result or emotion_update message as a binary result"""
+    result = message['data']
+    emotions = result.get('emotions') or {}
+    faces = result.get('faces') or []
+    seq = message.get('seq')
+    client_ts = message.get('client_ts')
+
+    flags = 0
+    if result.get('success'):
+        flags |= RESULT_SUCCESS
+    if result.get('cached'):
+        flags |= RESULT_CACHED
+    if seq is not None:
+        flags |= RESULT_HAS_SEQ
+    if client_ts is not None:
+        flags |= RESULT_HAS_CLIENT_TS
+
+    dominant = result.get('dominant_emotion', 'neutral')
+    header = RESULT_HEADER.pack(
+        RESULT_MESSAGES[message['type']],
+        flags,
+        EMOTION_IDS.index(dominant) if dominant in EMOTION_IDS else EMOTION_IDS.index('neutral'),
+        min(len(faces), 255),
+        min(int(result.get('num_faces', len(faces))), 0xFFFF),
+        0,
+        (seq or 0) & 0xFFFFFFFF,
+        float(client_ts or 0.0),
+        float(result.get('timestamp', 0.0)),
+        1000 * float(result.get('processing_time', 0.0)),
+        *(float(emotions.get(label, 0.0)) for label in EMOTION_IDS)
+    )
+
+    records = [
+        FACE_RECORD.pack(
+            *(_clip_int16(v) for v in face['box'][:4]),
+            *(float(face['emotions'].get(label, 0.0)) for label in EMOTION_IDS)
+        )
+        for face in faces[:255]
+    ]
+    return header + b''.join(records)
+
+
+def unpack_result(data: bytes) -> Dict:
+    """Decode a binary result back into the JSON message shape (float32 precision)"""
+    if len(data) < RESULT_HEADER.size:
+        raise ProtocolError(f"Binary result shorter than {RESULT_HEADER.size} byte header")
+
+    fields = RESULT_HEADER.unpack_from(data)
+    msg_type, flags, dominant, face_count, num_faces, _, seq, client_ts, timestamp, processing_ms = fields[:10]
+    message_types = {code: name for name, code in RESULT_MESSAGES.items()}
+    if msg_type not in message_types:
+        raise ProtocolError(f"Unknown binary message type: {msg_type}")
+    if len(data) < RESULT_HEADER.size + face_count * FACE_RECORD.size:
+        raise ProtocolError("Binary result truncated")
+
+    faces = []
+    for i in range(face_count):
+        record = FACE_RECORD.unpack_from(data, RESULT_HEADER.size + i * FACE_RECORD.size)
+        faces.append({
+            'box': list(record[:4]),
+            'emotions': dict(zip(EMOTION_IDS, record[4:]))
+        })
+
+    emotions = dict(zip(EMOTION_IDS, fields[10:]))
+    result = {
+        'success': bool(flags & RESULT_SUCCESS),
+        'emotions': emotions,
+        'dominant_emotion': EMOTION_IDS[dominant],
+        'confidence': emotions[EMOTION_IDS[dominant]],
+        'num_faces': num_faces,
+        'faces': faces,
+        'timestamp': timestamp,
+        'processing_time': processing_ms / 1000
+    }
+    if flags & RESULT_CACHED:
+        result['cached'] = True
+
+    message = {'type': message_types[msg_type], 'data': result}
+    if flags & RESULT_HAS_SEQ:
+        message['seq'] = seq
+    if flags & RESULT_HAS_CLIENT_TS:
+        message['client_ts'] = client_ts
+    return message
+
+
+def decode_image(buffer: Union[bytes, memoryview]) -> Optional[np.ndarray]:
+    """Decode an encoded image straight from the receive buffer"""
+    nparr = np.frombuffer(buffer, np.uint8)
+    if nparr.size == 0:
+        return None
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+def decode_frame(frame: Frame) -> Optional[np.ndarray]:
+    """Decode a received frame into a BGR image, or None if it is not an image"""
+    payload = frame.payload
+    if isinstance(payload, str):
+        _, _, encoded = payload.partition(',')
+        try:
+            payload = base64.b64decode(encoded or payload)
+        except ValueError:
+            return None
+    return decode_image(payload)
@@ -0,0 +1,204 @@
+"""
+Batch emotion tagging of still images for /api/emotion/batch
+Images arrive as multipart parts or inside zip/tar archives. They are read and
+decoded in parallel, chunk by chunk, and each chunk goes through the detector's
+stateless batch path (no rate limiting, smoothing, music or broadcasts). Results
+are streamed back as NDJSON lines so memory stays bounded by one chunk.
+
+With a result cache, images are hashed while decoding and only the ones that
+miss the cache go to the detector.
+"""
+
+import asyncio
+import logging
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from frame_protocol import decode_image
+from result_cache import ResultCache
+from streaming import ndjson_line
+
+logger = logging.getLogger(__name__)
+
+CACHE_SCOPE = 'batch'
+
+ZIP_TYPES = ('application/zip', 'application/x-zip-compressed')
+TAR_TYPES = ('application/x-tar', 'application/gzip', 'application/x-gzip', 'application/x-gtar')
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz')
+
+
+class ImageItem:
+    __slots__ = ('index', 'name', 'data', 'error')
+
+    def __init__(self, index: int, name: str, data: Optional[bytes] = None, error: Optional[str] = None):
+        self.index = index
+        self.name = name
+        self.data = data
+        self.error = error
+
+
+def _archive_kind(filename: str, content_type: Optional[str]) -> Optional[str]:
+    name = (filename or '').lower()
+    if content_type in ZIP_TYPES or name.endswith('.zip'):
+        return 'zip'
+    if content_type in TAR_TYPES or name.endswith(TAR_SUFFIXES):
+        return 'tar'
+    return None
+
+
+def _iter_zip(fileobj: BinaryIO) -> Iterator[Tuple[str, Optional[bytes], Optional[str]]]:
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if info.file_size > settings.batch_max_image_bytes:
+                yield info.filename, None, "Image too large"
+                continue
+            yield info.filename, archive.read(info), None
+
+
+def _iter_tar(fileobj: BinaryIO) -> Iterator[Tuple[str, Optional[bytes], Optional[str]]]:
+    with tarfile.open(fileobj=fileobj, mode='r:*') as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            if member.size > settings.batch_max_image_bytes:
+                yield member.name, None, "Image too large"
+                continue
+            yield member.name, archive.extractfile(member).read(), None
+
+
+def iter_images(uploads) -> Iterator[ImageItem]:
+    """Yield the images of multipart uploads, expanding archives lazily"""
+    index = 0
+    for upload in uploads:
+        name = upload.filename or f"part-{index}"
+        kind = _archive_kind(name, upload.content_type)
+        try:
+            if kind == 'zip':
+                entries = _iter_zip(upload.file)
+            elif kind == 'tar':
+                entries = _iter_tar(upload.file)
+            else:
+                data = upload.file.read(settings.batch_max_image_bytes + 1)
+                too_large = len(data) > settings.batch_max_image_bytes
+                entries = iter([(name, None if too_large else data, "Image too large" if too_large else None)])
+
+            for entry_name, data, error in entries:
+                yield ImageItem(index, entry_name, data, error)
+                index += 1
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            yield ImageItem(index, name, error=f"Invalid archive: {e}")
+            index += 1
+
+
+def _take(iterator: Iterator[ImageItem], count: int) -> List[ImageItem]:
+    items = []
+    for item in iterator:
+        items.append(item)
+        if len(items) == count:
+            break
+    return items
+
+
+def _decode(item: ImageItem, cache: Optional[ResultCache] = None) -> Tuple[Optional[np.ndarray], Any]:
+    if item.data is None:
+        return None, None
+    frame = decode_image(item.data)
+    item.data = None
+    key = cache.key(frame) if cache is not None and frame is not None else None
+    return frame, key
+
+
+class BatchTagger:
+    def __init__(self, detect_batch_fn: Callable[[List[Optional[np.ndarray]]], List[Dict]],
+                 chunk_size: Optional[int] = None, decode_workers: Optional[int] = None,
+                 cache: Optional[ResultCache] = None):
+        self.detect_batch_fn = detect_batch_fn
+        self.cache = cache
+        self.chunk_size = chunk_size or settings.batch_chunk_size
+        self.decode_pool = ThreadPoolExecutor(
+            max_workers=decode_workers or settings.batch_decode_workers, thread_name_prefix="batch-decode"
+        )
+        # One inference thread so batch jobs queue behind each other instead of piling onto the CPU
+        self.inference_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-inference")
+
+        self.requests = 0
+        self.images = 0
+        self.failed = 0
+        self.faces = 0
+        self.decode_time = 0.0
+        self.inference_time = 0.0
+
+    async def stream(self, uploads) -> AsyncIterator[str]:
+        """Tag every image of the uploads, yielding one NDJSON line per image and a summary"""
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        started = time.perf_counter()
+        images = iter_images(uploads)
+        count = failed = 0
+
+        while count < settings.batch_max_images:
+            # Reading archive members is blocking I/O on the spooled upload
+            chunk = await loop.run_in_executor(
+                self.decode_pool, _take, images, min(self.chunk_size, settings.batch_max_images - count)
+            )
+            if not chunk:
+                break
+
+            decode_started = time.perf_counter()
+            decoded = await asyncio.gather(*(
+                loop.run_in_executor(self.decode_pool, _decode, item, self.cache) for item in chunk
+            ))
+            inference_started = time.perf_counter()
+            self.decode_time += inference_started - decode_started
+
+            frames = [frame for frame, _ in decoded]
+            if self.cache is not None:
+                keys = [key for _, key in decoded]
+                results = await loop.run_in_executor(
+                    self.inference_pool, self.cache.detect_batch, self.detect_batch_fn, frames, keys, CACHE_SCOPE
+                )
+            else:
+                results = await loop.run_in_executor(self.inference_pool, self.detect_batch_fn, frames)
+            self.inference_time += time.perf_counter() - inference_started
+
+            for item, result in zip(chunk, results):
+                if item.error is not None:
+                    result = dict(result, error=item.error)
+                if result.get('error'):
+                    failed += 1
+                self.faces += result.get('num_faces', 0)
+                yield ndjson_line({'index': item.index, 'name': item.name, **result})
+            count += len(chunk)
+
+        truncated = count >= settings.batch_max_images and next(images, None) is not None
+        self.images += count
+        self.failed += failed
+        yield ndjson_line({
+            'done': True,
+            'images': count,
+            'failed': failed,
+            'truncated': truncated,
+            'elapsed': time.perf_counter() - started
+        })
+
+    def close(self):
+        self.decode_pool.shutdown(wait=False)
+        self.inference_pool.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'images': self.images,
+            'failed': self.failed,
+            'faces': self.faces,
+            'avg_decode_ms': 1000 * self.decode_time / self.images if self.images else 0.0,
+            'avg_inference_ms': 1000 * self.inference_time / self.images if self.images else 0.0
+        }
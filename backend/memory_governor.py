@@ -0,0 +1,208 @@
+"""
+Memory governor for max_memory_mb
+Samples the process RSS every memory_check_interval_s together with the
+approximate size of the big consumers it was told about (music tracks,
+sessions, caches, queued frames and messages), and sheds load in a fixed order
+as RSS approaches max_memory_mb:
+
+    flush      (memory_flush_fraction)     drop caches and return freed memory to the OS
+    throttle   (memory_throttle_fraction)  also lower the sessions' frame rates
+    refuse     (memory_refuse_fraction)    also refuse new sessions
+
+With max_memory_growth_mb set, the same fractions also apply to RSS growth
+above the baseline taken once the models are warmed up (set_baseline), and
+the higher of the two usages decides.
+
+A level's actions run once, when it is entered (entering a higher level runs
+the skipped levels' actions too), and its leave actions once it is left, so
+state such as the rate controller's memory pressure is held in between. A level
+is only left once usage falls HYSTERESIS below its threshold. Returning freed
+memory to the OS (release()) is left to the caller so it can run off the event
+loop.
+"""
+
+import ctypes
+import gc
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ('normal', 'flush', 'throttle', 'refuse')
+HYSTERESIS = 0.05
+MB = 1024 * 1024
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    # No /proc: peak RSS is the best we have (bytes on macOS, KiB elsewhere)
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def release_memory():
+    """Collect garbage and hand free heap pages back to the OS where glibc allows it"""
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class MemoryGovernor:
+    def __init__(self, limit_mb: Optional[float] = None, growth_limit_mb: Optional[float] = None,
+                 rss: Callable[[], int] = rss_bytes):
+        self.limit = int((limit_mb or settings.max_memory_mb) * MB)
+        growth_limit_mb = growth_limit_mb if growth_limit_mb is not None else settings.max_memory_growth_mb
+        self.growth_limit = int(growth_limit_mb * MB) if growth_limit_mb else None
+        self.thresholds = (0.0, settings.memory_flush_fraction, settings.memory_throttle_fraction,
+                           settings.memory_refuse_fraction)
+        self._rss = rss
+        self._probes: Dict[str, Callable[[], int]] = {}
+        self._actions: Dict[int, List[Callable[[], None]]] = {level: [] for level in range(1, len(LEVELS))}
+        self._leave_actions: Dict[int, List[Callable[[], None]]] = {level: [] for level in range(1, len(LEVELS))}
+
+        self.level = 0
+        self.baseline: Optional[int] = None
+        self.release_pending = False
+        self.rss = 0
+        self.peak_rss = 0
+        self.consumers: Dict[str, int] = {}
+        self.checks = 0
+        self.transitions = 0
+        self.actions_run = {name: 0 for name in LEVELS[1:]}
+        self.refused = 0
+        self.last_freed = 0
+        self.last_change: Optional[float] = None
+
+    def track(self, name: str, probe: Callable[[], int]):
+        """Report a consumer's approximate size in the metrics"""
+        self._probes[name] = probe
+
+    def on(self, level: str, action: Callable[[], None], leave: Optional[Callable[[], None]] = None):
+        """Run an action whenever this level is entered from below, and leave when it is left"""
+        self._actions[LEVELS.index(level)].append(action)
+        if leave is not None:
+            self._leave_actions[LEVELS.index(level)].append(leave)
+
+    def set_baseline(self, rss: Optional[int] = None):
+        """RSS (default: now) that max_memory_growth_mb counts from, normally taken after model warm-up"""
+        self.baseline = rss if rss is not None else self._rss()
+        logger.info(f"Memory baseline {self.baseline / MB:.0f} MB of max_memory_mb {self.limit / MB:.0f}")
+        if self.baseline >= self.thresholds[1] * self.limit:
+            logger.error(f"The warmed-up app already uses {self.baseline / MB:.0f} MB, over the flush threshold "
+                         f"of max_memory_mb={self.limit / MB:.0f}; raise max_memory_mb or use app_lite")
+
+    @property
+    def usage(self) -> float:
+        """RSS as a fraction of max_memory_mb, or growth as one of max_memory_growth_mb if higher"""
+        usage = self.rss / self.limit
+        if self.growth_limit is not None and self.baseline is not None:
+            usage = max(usage, max(0, self.rss - self.baseline) / self.growth_limit)
+        return usage
+
+    @property
+    def admits_sessions(self) -> bool:
+        return self.level < LEVELS.index('refuse')
+
+    def refuse(self):
+        """Count a session turned away"""
+        self.refused += 1
+
+    def check(self) -> str:
+        """
+        Sample memory, update the level and run the actions of levels entered
+
+        Sets release_pending when the flush level was entered; the caller then
+        runs release().
+        """
+        self.checks += 1
+        self.rss = self._rss()
+        self.peak_rss = max(self.peak_rss, self.rss)
+        self.consumers = self._measure()
+
+        fraction = self.usage
+        target = max(level for level, threshold in enumerate(self.thresholds) if fraction >= threshold)
+        if target < self.level and fraction >= self.thresholds[self.level] - HYSTERESIS:
+            target = self.level
+        if target == self.level:
+            return LEVELS[self.level]
+
+        log = logger.warning if target > self.level else logger.info
+        log(f"Memory {self.rss / MB:.0f} MB ({fraction:.0%} of budget): {LEVELS[self.level]} -> {LEVELS[target]}")
+        previous = self.level
+        self.level = target
+        self.transitions += 1
+        self.last_change = time.time()
+
+        if target > previous:
+            for level in range(previous + 1, target + 1):
+                self._run(level, self._actions[level])
+                self.actions_run[LEVELS[level]] += 1
+                if level == 1:
+                    self.release_pending = True
+        else:
+            for level in range(previous, target, -1):
+                self._run(level, self._leave_actions[level])
+        return LEVELS[self.level]
+
+    def _run(self, level: int, actions: List[Callable[[], None]]):
+        for action in actions:
+            try:
+                action()
+            except Exception as e:
+                logger.error(f"Memory {LEVELS[level]} action failed: {e}")
+
+    def release(self) -> int:
+        """Collect garbage and trim the heap (blocking); returns the bytes freed"""
+        self.release_pending = False
+        before = self._rss()
+        release_memory()
+        after = self._rss()
+        self.last_freed = max(0, before - after)
+        self.rss = after
+        return self.last_freed
+
+    def _measure(self) -> Dict[str, int]:
+        sizes = {}
+        for name, probe in self._probes.items():
+            try:
+                sizes[name] = int(probe())
+            except Exception as e:
+                logger.error(f"Memory probe {name} failed: {e}")
+                sizes[name] = 0
+        return sizes
+
+    def stats(self) -> Dict:
+        tracked = sum(self.consumers.values())
+        return {
+            'level': LEVELS[self.level],
+            'admits_sessions': self.admits_sessions,
+            'rss_mb': self.rss / MB,
+            'peak_rss_mb': self.peak_rss / MB,
+            'baseline_mb': self.baseline / MB if self.baseline is not None else None,
+            'limit_mb': self.limit / MB,
+            'growth_limit_mb': self.growth_limit / MB if self.growth_limit is not None else None,
+            'usage': self.usage,
+            'thresholds': dict(zip(LEVELS[1:], self.thresholds[1:])),
+            'consumers_mb': {name: size / MB for name, size in self.consumers.items()},
+            # Models, interpreter and allocator overhead
+            'untracked_mb': max(0, self.rss - tracked) / MB,
+            'checks': self.checks,
+            'transitions': self.transitions,
+            'actions': dict(self.actions_run),
+            'refused_sessions': self.refused,
+            'last_freed_mb': self.last_freed / MB,
+            'last_change': self.last_change
+        }
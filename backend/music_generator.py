@@ -1,7 +1,6 @@
 import os
 import numpy as np
 from pydub import AudioSegment
-from pydub.playback import play
 import threading
 import time
 from typing import Dict, Optional, List
@@ -221,6 +220,28 @@ class MusicGenerator:
             'available_styles': ['ambient', 'electronic', 'classical']
         }
     
+    def load_state(self, state: Dict):
+        """Adopt music state written by another worker"""
+        with self.transition_lock:
+            emotion = state.get('current_emotion', self.current_emotion)
+            if emotion != self.current_emotion:
+                self.current_track = self._get_track_for_emotion(emotion)
+            self.current_emotion = emotion
+            self.target_emotion = state.get('target_emotion', self.target_emotion)
+            self.current_params = dict(state.get('params', self.current_params))
+        self.volume = state.get('volume', self.volume)
+        if state.get('style', self.style) != self.style:
+            # Reloading tracks synthesizes audio; keep it off the caller's thread
+            self.style = state['style']
+            self.executor.submit(self._load_music_tracks)
+    
+    def approx_bytes(self) -> int:
+        """Decoded audio held in memory"""
+        tracks = [track for tracks in self.music_tracks.values() for track in tracks]
+        if self.ambient_track is not None:
+            tracks.append(self.ambient_track)
+        return sum(len(track.raw_data) for track in tracks)
+    
     def start_playback(self):
         """Start music playback"""
         self.is_playing = True
@@ -0,0 +1,181 @@
+"""
+Delta-encoded, coalesced music state updates
+Processed frames only mark their room dirty. Once per tick each dirty room gets a
+single music_update carrying just the fields that changed since the previous one
+(versioned so clients can detect gaps). Clients get a full snapshot on connect,
+on room change and whenever they ask for one.
+
+Every worker process runs its own broadcaster for its own clients. The optional
+get_version callable lets it notice music changes made by other workers (shared
+state backend) and mark all of its rooms dirty. With blocking=True get_state and
+get_version are run on the default executor, off the event loop.
+"""
+
+import asyncio
+import logging
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from config import settings
+from connection_manager import ConnectionManager, serialize
+
+logger = logging.getLogger(__name__)
+
+FLOAT_TOLERANCE = 1e-4
+
+
+def diff_state(old: Dict, new: Dict) -> Dict:
+    """Return the fields of new that differ from old (recursing into dicts)"""
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff_state(previous, value)
+            if nested:
+                delta[key] = nested
+        elif isinstance(value, float) and isinstance(previous, (int, float)) and not isinstance(previous, bool):
+            if abs(value - previous) > FLOAT_TOLERANCE:
+                delta[key] = value
+        elif key not in old or value != previous:
+            delta[key] = dict(value) if isinstance(value, dict) else value
+    return delta
+
+
+def apply_delta(state: Dict, delta: Dict) -> Dict:
+    """Apply a delta produced by diff_state to a copy of state"""
+    merged = dict(state)
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = apply_delta(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _copy_state(state: Dict) -> Dict:
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in state.items()}
+
+
+class MusicStateBroadcaster:
+    def __init__(self, manager: ConnectionManager, get_state: Callable[[], Dict],
+                 tick_ms: Optional[int] = None, get_version: Optional[Callable[[], int]] = None,
+                 blocking: bool = False):
+        self.manager = manager
+        self.get_state = get_state
+        self.get_version = get_version
+        self.blocking = blocking
+        self._seen_version = None
+        # Latest state read by flush(), for snapshots of rooms nothing was published to yet
+        self._state: Optional[Dict] = None
+        self.tick = (tick_ms or settings.music_update_tick_ms) / 1000.0
+        self._dirty: Set[str] = set()
+        self._published: Dict[str, Tuple[int, Dict]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.marked = 0
+        self.full_updates = 0
+        self.delta_updates = 0
+        self.skipped = 0
+        self.bytes_sent = 0
+        self.bytes_full_equivalent = 0
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def mark_dirty(self, room: Optional[str] = None):
+        """Schedule a music update for one room (or every room) on the next tick"""
+        self.marked += 1
+        if room is None:
+            self._dirty.update(self.manager.rooms)
+        else:
+            self._dirty.add(room)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self._check_version()
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Music update flush failed: {e}")
+
+    async def _call(self, fn):
+        if not self.blocking:
+            return fn()
+        return await asyncio.get_running_loop().run_in_executor(None, fn)
+
+    async def _check_version(self):
+        if self.get_version is None:
+            return
+        version = await self._call(self.get_version)
+        if version != self._seen_version:
+            self._seen_version = version
+            self.mark_dirty()
+
+    async def flush(self):
+        """Publish one coalesced update per dirty room"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        state = self._state = await self._call(self.get_state)
+        full_payload = None
+
+        for room in dirty:
+            if room not in self.manager.rooms:
+                self._published.pop(room, None)
+                continue
+
+            version, previous = self._published.get(room, (0, None))
+            if previous is None:
+                message = {'type': 'music_update', 'full': True, 'version': version + 1, 'data': state}
+                published = _copy_state(state)
+                self.full_updates += 1
+            else:
+                delta = diff_state(previous, state)
+                if not delta:
+                    self.skipped += 1
+                    continue
+                message = {'type': 'music_update', 'version': version + 1, 'base': version, 'delta': delta}
+                # Track exactly what clients hold so sub-tolerance drift can't accumulate
+                published = apply_delta(previous, delta)
+                self.delta_updates += 1
+
+            payload = serialize(message)
+            if full_payload is None:
+                full_payload = serialize({'type': 'music_update', 'data': state})
+            self.bytes_sent += len(payload)
+            self.bytes_full_equivalent += len(full_payload)
+            self._published[room] = (version + 1, published)
+            # Versions are per worker, so deliver only to this worker's clients
+            self.manager.deliver(room, payload)
+
+    def snapshot(self, room: Optional[str]) -> Dict:
+        """Full state message matching the room's latest published version"""
+        version, published = self._published.get(room, (0, None)) if room else (0, None)
+        if published is None:
+            published = self._state if self._state is not None else self.get_state()
+            if room:
+                # The cached state may be a tick old; the next flush sends the room a full update
+                self._dirty.add(room)
+        return {
+            'type': 'music_update',
+            'full': True,
+            'version': version,
+            'data': published
+        }
+
+    def stats(self) -> Dict:
+        return {
+            'tick_ms': self.tick * 1000,
+            'marked': self.marked,
+            'full_updates': self.full_updates,
+            'delta_updates': self.delta_updates,
+            'skipped_unchanged': self.skipped,
+            'bytes_sent': self.bytes_sent,
+            'bytes_full_equivalent': self.bytes_full_equivalent
+        }
@@ -0,0 +1,269 @@
+"""
+Staged frame pipeline: decode -> detect -> publish
+Each stage has a bounded queue and its own worker pool, so OpenCV decoding and
+model inference never run on the asyncio event loop. Results are published back
+on the loop by resolving the submitter's future.
+
+Frames submitted as cacheable are hashed in the decode stage and answered from
+the result cache when the same image was detected before.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from frame_protocol import Frame, decode_frame
+from result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+BACKPRESSURE_POLICIES = ('block', 'drop_oldest', 'reject')
+CACHE_SCOPE = 'pipeline'
+
+
+def _value_bytes(value: Any) -> int:
+    """Approximate size of a queued job's value (encoded frame or decoded image)"""
+    if isinstance(value, Frame):
+        return len(value.payload)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, tuple):
+        return sum(_value_bytes(item) for item in value)
+    if isinstance(value, (bytes, str, memoryview)):
+        return len(value)
+    return 0
+
+
+class PipelineFull(Exception):
+    """Raised when a stage rejects a job because its queue is full"""
+
+
+class FrameDropped(Exception):
+    """Raised for a job evicted from a full queue by a newer one"""
+
+
+class _Job:
+    __slots__ = ('value', 'context', 'future', 'created_at')
+
+    def __init__(self, value: Any, context: Any, future: asyncio.Future):
+        self.value = value
+        self.context = context
+        self.future = future
+        self.created_at = time.perf_counter()
+
+    def finish(self):
+        if not self.future.done():
+            self.future.set_result(self.value)
+
+    def fail(self, error: Exception):
+        if not self.future.done():
+            self.future.set_exception(error)
+
+    def cancel(self):
+        self.future.cancel()
+
+
+class PipelineStage:
+    def __init__(self, name: str, fn: Callable[[Any, Any], Any], workers: int,
+                 queue_size: int, policy: str = 'block'):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.policy = policy
+        self.next_stage: Optional['PipelineStage'] = None
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{name}-stage")
+        self.queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.busy_time = 0.0
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Fail anything still queued so submitters don't hang
+        while self.queue is not None and not self.queue.empty():
+            self.queue.get_nowait().cancel()
+        self.executor.shutdown(wait=False)
+
+    async def put(self, job: _Job):
+        """Enqueue a job, applying the stage's backpressure policy when full"""
+        self.submitted += 1
+
+        if self.policy == 'block':
+            await self.queue.put(job)
+            return
+
+        if self.queue.full():
+            if self.policy == 'reject':
+                self.rejected += 1
+                job.fail(PipelineFull(f"{self.name} queue is full"))
+                return
+
+            oldest = self.queue.get_nowait()
+            self.dropped += 1
+            oldest.fail(FrameDropped(f"Evicted from {self.name} queue"))
+
+        self.queue.put_nowait(job)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            if job.future.done():
+                # Submitter already gave up on this job
+                continue
+
+            started = time.perf_counter()
+            try:
+                job.value = await loop.run_in_executor(self.executor, self.fn, job.value, job.context)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Pipeline stage {self.name} failed: {e}")
+                job.fail(e)
+                continue
+            finally:
+                self.busy_time += time.perf_counter() - started
+
+            self.completed += 1
+            if self.next_stage is None or job.value is None:
+                job.finish()
+            else:
+                await self.next_stage.put(job)
+
+    def approx_bytes(self) -> int:
+        if self.queue is None:
+            return 0
+        # asyncio.Queue has no public way to look at its items
+        return sum(_value_bytes(job.value) for job in list(self.queue._queue))
+
+    def stats(self) -> Dict:
+        return {
+            'workers': self.workers,
+            'policy': self.policy,
+            'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+            'queue_size': self.queue_size,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+            'avg_ms': 1000 * self.busy_time / self.completed if self.completed else 0.0
+        }
+
+
+class FramePipeline:
+    def __init__(self, detect_fn: Callable[[Any, Any], Dict],
+                 decode_fn: Callable[[Any], Any] = decode_frame,
+                 decode_workers: Optional[int] = None,
+                 inference_workers: Optional[int] = None,
+                 decode_queue_size: Optional[int] = None,
+                 inference_queue_size: Optional[int] = None,
+                 policy: Optional[str] = None,
+                 cache: Optional[ResultCache] = None):
+        policy = policy or settings.pipeline_backpressure
+        self.detect_fn = detect_fn
+        self.decode_fn = decode_fn
+        self.cache = cache
+        self.decode = PipelineStage(
+            'decode',
+            self._decode,
+            decode_workers or settings.decode_workers,
+            decode_queue_size or settings.decode_queue_size,
+            policy
+        )
+        self.detect = PipelineStage(
+            'detect',
+            self._detect,
+            inference_workers or settings.inference_workers,
+            inference_queue_size or settings.inference_queue_size,
+            policy
+        )
+        self.decode.next_stage = self.detect
+        self.latencies = deque(maxlen=256)
+        self.running = False
+
+    async def start(self):
+        self.decode.start()
+        self.detect.start()
+        self.running = True
+        logger.info(f"Frame pipeline started: {self.decode.workers} decode, {self.detect.workers} inference workers")
+
+    async def stop(self):
+        self.running = False
+        await self.decode.stop()
+        await self.detect.stop()
+
+    async def submit(self, frame: Any, context: Any = None, cacheable: bool = False) -> Optional[Dict]:
+        """
+        Run a frame through decode and detect
+
+        Returns the detection result, or None if the frame could not be decoded.
+        Raises FrameDropped or PipelineFull when backpressure discards the frame.
+        Only mark frames cacheable when their result depends on the image alone
+        (e.g. not on per-client smoothing state).
+        """
+        job = _Job(frame, (context, cacheable), asyncio.get_running_loop().create_future())
+        await self.decode.put(job)
+        result = await job.future
+        self.latencies.append(time.perf_counter() - job.created_at)
+        return result
+
+    def _decode(self, frame: Any, job_context) -> Optional[Tuple[Any, Any]]:
+        image = self.decode_fn(frame)
+        if image is None:
+            return None
+        _, cacheable = job_context
+        key = self.cache.key(image) if cacheable and self.cache is not None else None
+        return image, key
+
+    def _detect(self, decoded: Tuple[Any, Any], job_context) -> Dict:
+        image, key = decoded
+        context, _ = job_context
+        if key is None:
+            return self.detect_fn(image, context)
+
+        result = self.cache.get(key, CACHE_SCOPE)
+        if result is None:
+            result = self.detect_fn(image, context)
+            self.cache.put(key, result, CACHE_SCOPE)
+        return result
+
+    def approx_bytes(self) -> int:
+        """Frames and decoded images waiting in the stage queues"""
+        return self.decode.approx_bytes() + self.detect.approx_bytes()
+
+    def stats(self) -> Dict:
+        latencies = sorted(self.latencies)
+        return {
+            'running': self.running,
+            'stages': {
+                'decode': self.decode.stats(),
+                'detect': self.detect.stats()
+            },
+            'latency_ms': {
+                'p50': 1000 * latencies[len(latencies) // 2] if latencies else 0.0,
+                'p95': 1000 * latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+            }
+        }
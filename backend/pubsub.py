@@ -0,0 +1,255 @@
+"""
+Topic-based publish/subscribe used behind ConnectionManager
+Payloads are already-serialized (text or binary), so a message published to a
+topic is encoded once no matter how many subscribers receive it.
+InProcessPubSub delivers synchronously inside one worker; SQLitePubSub also
+relays every message through a shared SQLite database (WAL mode) so the other
+uvicorn workers on the host deliver it to their own subscribers.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+Payload = Union[str, bytes]
+Subscriber = Callable[[Payload], None]
+
+BROADCAST_TOPIC = "broadcast"
+# Messages kept for the next relay attempt while the shared database is failing
+RELAY_BACKLOG_LIMIT = 10000
+
+
+def encoded_topic(topic: str, encoding: Optional[str] = None) -> str:
+    """Encoding-specific variant of a topic, for messages only some clients want"""
+    if encoding is None:
+        return topic
+    return f"{topic}#{encoding}"
+
+
+def room_topic(room: str, encoding: Optional[str] = None) -> str:
+    return encoded_topic(f"room:{room}", encoding)
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """Open a connection to the shared state database in WAL mode"""
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class PubSub:
+    """Interface for distributing serialized messages by topic"""
+
+    def publish(self, topic: str, payload: Payload):
+        raise NotImplementedError
+
+    def subscribe(self, topic: str, callback: Subscriber):
+        raise NotImplementedError
+
+    def unsubscribe(self, topic: str, callback: Subscriber):
+        raise NotImplementedError
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> Dict:
+        return {}
+
+
+class InProcessPubSub(PubSub):
+    def __init__(self):
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+        self.published = 0
+        self.delivered = 0
+
+    def publish(self, topic: str, payload: Payload):
+        self.published += 1
+        self._dispatch(topic, payload)
+
+    def _dispatch(self, topic: str, payload: Payload):
+        for callback in list(self._subscribers.get(topic, ())):
+            try:
+                callback(payload)
+                self.delivered += 1
+            except Exception as e:
+                logger.error(f"Subscriber for {topic} failed: {e}")
+
+    def subscribe(self, topic: str, callback: Subscriber):
+        self._subscribers.setdefault(topic, []).append(callback)
+
+    def unsubscribe(self, topic: str, callback: Subscriber):
+        callbacks = self._subscribers.get(topic)
+        if not callbacks:
+            return
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            del self._subscribers[topic]
+
+    def topics(self) -> List[str]:
+        return list(self._subscribers)
+
+    def stats(self) -> Dict:
+        return {'published': self.published, 'delivered': self.delivered, 'topics': len(self._subscribers)}
+
+
+class SQLitePubSub(InProcessPubSub):
+    """
+    Delivers to local subscribers immediately and relays through a shared table
+
+    Every poll interval the outgoing messages are written in one transaction and
+    messages written by other workers since the last poll are delivered here.
+    When an exchange fails its messages go back to the front of the outgoing
+    queue for the next poll (up to RELAY_BACKLOG_LIMIT, oldest dropped first).
+    Relayed messages older than the retention window are pruned.
+    """
+
+    def __init__(self, path: str, poll_ms: Optional[int] = None,
+                 retention_s: Optional[float] = None, origin: Optional[str] = None):
+        super().__init__()
+        self.path = path
+        self.poll = (poll_ms or settings.state_poll_ms) / 1000.0
+        self.retention = retention_s or settings.state_message_retention_s
+        self.origin = origin or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._outgoing: List[Tuple[str, Payload]] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pubsub")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_id = 0
+        self._last_prune = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+        self.relayed_out = 0
+        self.relayed_in = 0
+        self.relay_failures = 0
+        self.relay_dropped = 0
+        self.exchange_time = 0.0
+        self.exchanges = 0
+
+    def publish(self, topic: str, payload: Payload):
+        super().publish(topic, payload)
+        self._outgoing.append((topic, payload))
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._open)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        loop = asyncio.get_running_loop()
+        # Hand over anything published since the last poll before closing
+        await loop.run_in_executor(self._executor, self._exchange, self._take_outgoing())
+        await loop.run_in_executor(self._executor, self._close)
+
+    def _open(self):
+        self._conn = connect_sqlite(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT, topic TEXT, "
+            "payload BLOB, is_text INTEGER, created REAL)"
+        )
+        self._last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _take_outgoing(self) -> List[Tuple[str, Payload]]:
+        outgoing, self._outgoing = self._outgoing, []
+        return outgoing
+
+    def _exchange(self, outgoing: List[Tuple[str, Payload]]) -> List[Tuple[str, Payload]]:
+        """Write our messages and read everyone else's (runs on the pubsub thread)"""
+        now = time.time()
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if outgoing:
+                conn.executemany(
+                    "INSERT INTO messages (origin, topic, payload, is_text, created) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (self.origin, topic, payload.encode() if isinstance(payload, str) else payload,
+                         isinstance(payload, str), now)
+                        for topic, payload in outgoing
+                    ]
+                )
+            rows = conn.execute(
+                "SELECT id, origin, topic, payload, is_text FROM messages WHERE id > ? ORDER BY id",
+                (self._last_id,)
+            ).fetchall()
+            if now - self._last_prune > self.retention / 2:
+                conn.execute("DELETE FROM messages WHERE created < ?", (now - self.retention,))
+                self._last_prune = now
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if rows:
+            self._last_id = rows[-1][0]
+        self.relayed_out += len(outgoing)
+        return [
+            (topic, payload.decode() if is_text else bytes(payload))
+            for _, origin, topic, payload, is_text in rows
+            if origin != self.origin
+        ]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll)
+            started = time.perf_counter()
+            outgoing = self._take_outgoing()
+            try:
+                incoming = await loop.run_in_executor(self._executor, self._exchange, outgoing)
+            except Exception as e:
+                logger.error(f"Pub/sub relay failed: {e}")
+                self.relay_failures += 1
+                self._requeue(outgoing)
+                continue
+            self.exchange_time += time.perf_counter() - started
+            self.exchanges += 1
+
+            for topic, payload in incoming:
+                self.relayed_in += 1
+                self._dispatch(topic, payload)
+
+    def _requeue(self, outgoing: List[Tuple[str, Payload]]):
+        """Put messages of a failed exchange back ahead of those published since"""
+        self._outgoing = outgoing + self._outgoing
+        excess = len(self._outgoing) - RELAY_BACKLOG_LIMIT
+        if excess > 0:
+            logger.warning(f"Pub/sub relay backlog full, dropping {excess} oldest messages")
+            self.relay_dropped += excess
+            del self._outgoing[:excess]
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats.update({
+            'origin': self.origin,
+            'relayed_out': self.relayed_out,
+            'relayed_in': self.relayed_in,
+            'relay_failures': self.relay_failures,
+            'relay_dropped': self.relay_dropped,
+            'backlog': len(self._outgoing),
+            'avg_exchange_ms': 1000 * self.exchange_time / self.exchanges if self.exchanges else 0.0
+        })
+        return stats
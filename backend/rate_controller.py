@@ -0,0 +1,225 @@
+"""
+Adaptive per-session detection rate
+Every rate_control_interval_s the controller compares what it measured against
+the configured budgets:
+
+    process CPU                    max_cpu_percent (of all cores)
+    p90 inference time per frame   frame_timeout_ms
+    p90 frame age when answered    music_transition_latency_ms
+
+and adjusts the total detection rate it hands out (AIMD: multiplicative
+decrease while any budget is exceeded, additive increase while everything has
+headroom). The total is shared max-min fairly across live sessions: sessions
+asking for less than an equal share (the max_fps of their hello) keep what they
+asked for and the rest is split evenly among the others. No session goes below
+min_detection_fps or above detection_fps. Other components (the memory
+governor) can force a decrease with pressure(), or one on every update until
+released with hold_pressure() / release_pressure().
+
+Target rates are applied to the sessions' rate limiters and reported to the
+clients ({'type': 'rate', 'fps': ...}) so they capture fewer frames instead of
+having them dropped here.
+"""
+
+import logging
+import os
+import time
+from collections import deque
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Increase only while every measurement is below this share of its budget
+HEADROOM = 0.8
+# Smallest target change worth telling a client about (fps, fraction of the old target)
+MIN_CHANGE_FPS = 0.5
+MIN_CHANGE_FRACTION = 0.1
+
+RateChange = Tuple[str, float, Set[Hashable]]
+
+
+def fair_share(demands: Dict[str, float], capacity: Optional[float]) -> Dict[str, float]:
+    """Max-min fair split of capacity across demands (None: everyone gets their demand)"""
+    if capacity is None or sum(demands.values()) <= capacity:
+        return dict(demands)
+    shares = {}
+    remaining = capacity
+    ordered = sorted(demands.items(), key=lambda item: item[1])
+    for i, (key, demand) in enumerate(ordered):
+        shares[key] = min(demand, remaining / (len(ordered) - i))
+        remaining -= shares[key]
+    return shares
+
+
+class _SessionRate:
+    __slots__ = ('requested', 'target', 'listeners')
+
+    def __init__(self, requested: float, target: float):
+        self.requested = requested
+        self.target = target
+        self.listeners: Set[Hashable] = set()
+
+
+class RateController:
+    def __init__(self, max_fps: Optional[float] = None, min_fps: Optional[float] = None,
+                 cpu_budget_percent: Optional[float] = None, latency_budget_ms: Optional[float] = None,
+                 delay_budget_ms: Optional[float] = None):
+        self.max_fps = float(max_fps or settings.detection_fps)
+        self.min_fps = min(self.max_fps, float(min_fps or settings.min_detection_fps))
+        self.cpu_budget = cpu_budget_percent if cpu_budget_percent is not None else settings.max_cpu_percent
+        self.latency_budget = (latency_budget_ms if latency_budget_ms is not None
+                               else settings.frame_timeout_ms) / 1000
+        self.delay_budget = (delay_budget_ms if delay_budget_ms is not None
+                             else settings.music_transition_latency_ms) / 1000
+        # Total fps handed out across sessions; None while nothing is constrained
+        self.capacity: Optional[float] = None
+        self._sessions: Dict[str, _SessionRate] = {}
+        self._latencies = deque(maxlen=512)
+        self._delays = deque(maxlen=512)
+        self._cpu_mark = (time.monotonic(), time.process_time())
+
+        self.cpu_percent = 0.0
+        self.latency_p90: Optional[float] = None
+        self.delay_p90: Optional[float] = None
+        self.decreases = 0
+        self.increases = 0
+        self.last_reason: Optional[str] = None
+        self._pressure: Set[str] = set()
+        self._held_pressure: Set[str] = set()
+
+    def attach(self, session_id: str, listener: Hashable) -> List[RateChange]:
+        """A connection starts streaming for a session; its target is always reported"""
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = _SessionRate(self.max_fps, self.max_fps)
+        state.listeners.add(listener)
+        changes = self._reallocate()
+        if not any(change[0] == session_id for change in changes):
+            changes.append((session_id, state.target, {listener}))
+        return changes
+
+    def detach(self, session_id: str, listener: Hashable) -> List[RateChange]:
+        """A connection stopped streaming; its share goes back to the others"""
+        state = self._sessions.get(session_id)
+        if state is None:
+            return []
+        state.listeners.discard(listener)
+        if state.listeners:
+            return []
+        del self._sessions[session_id]
+        return self._reallocate()
+
+    def request(self, session_id: str, fps: float) -> List[RateChange]:
+        """The client's own upper bound on its capture rate"""
+        state = self._sessions.get(session_id)
+        if state is None:
+            return []
+        state.requested = min(self.max_fps, max(self.min_fps, float(fps)))
+        return self._reallocate()
+
+    def observe(self, latency_s: Optional[float], delay_s: float):
+        """Record one answered frame: its inference time (None if skipped) and its age"""
+        if latency_s is not None:
+            self._latencies.append(latency_s)
+        self._delays.append(delay_s)
+
+    def pressure(self, reason: str):
+        """Treat the next update as over budget for an outside reason (e.g. memory)"""
+        self._pressure.add(reason)
+
+    def hold_pressure(self, reason: str):
+        """Treat every update as over budget for this reason until release_pressure()"""
+        self._held_pressure.add(reason)
+
+    def release_pressure(self, reason: str):
+        self._held_pressure.discard(reason)
+
+    def target_fps(self, session_id: str) -> float:
+        state = self._sessions.get(session_id)
+        return state.target if state is not None else self.max_fps
+
+    def interval(self, session_id: str) -> float:
+        return 1.0 / self.target_fps(session_id)
+
+    def _sample_cpu(self) -> float:
+        wall, cpu = time.monotonic(), time.process_time()
+        elapsed = wall - self._cpu_mark[0]
+        percent = 100 * (cpu - self._cpu_mark[1]) / (elapsed * (os.cpu_count() or 1)) if elapsed > 0 else 0.0
+        self._cpu_mark = (wall, cpu)
+        return percent
+
+    def update(self, cpu_percent: Optional[float] = None) -> List[RateChange]:
+        """Take the measurements since the last update and adjust the targets"""
+        self.cpu_percent = cpu_percent if cpu_percent is not None else self._sample_cpu()
+        self.latency_p90 = float(np.percentile(self._latencies, 90)) if self._latencies else None
+        self.delay_p90 = float(np.percentile(self._delays, 90)) if self._delays else None
+        self._latencies.clear()
+        self._delays.clear()
+
+        reasons = []
+        if self.cpu_percent > self.cpu_budget:
+            reasons.append('cpu')
+        if self.latency_p90 is not None and self.latency_p90 > self.latency_budget:
+            reasons.append('latency')
+        if self.delay_p90 is not None and self.delay_p90 > self.delay_budget:
+            reasons.append('delay')
+        reasons.extend(sorted(self._pressure | self._held_pressure))
+        self._pressure.clear()
+
+        in_use = sum(state.target for state in self._sessions.values())
+        floor = self.min_fps * len(self._sessions)
+        if reasons and self._sessions:
+            self.capacity = max(floor, in_use * settings.rate_decrease_factor)
+            self.decreases += 1
+            self.last_reason = '+'.join(reasons)
+        elif self.capacity is not None and self._has_headroom():
+            self.capacity += settings.rate_increase_fps * max(1, len(self._sessions))
+            self.increases += 1
+            if self.capacity >= sum(state.requested for state in self._sessions.values()):
+                self.capacity = None
+        return self._reallocate()
+
+    def _has_headroom(self) -> bool:
+        return (self.cpu_percent <= HEADROOM * self.cpu_budget
+                and (self.latency_p90 is None or self.latency_p90 <= HEADROOM * self.latency_budget)
+                and (self.delay_p90 is None or self.delay_p90 <= HEADROOM * self.delay_budget))
+
+    def _reallocate(self) -> List[RateChange]:
+        shares = fair_share({session_id: state.requested for session_id, state in self._sessions.items()},
+                            self.capacity)
+        changes = []
+        for session_id, share in shares.items():
+            state = self._sessions[session_id]
+            share = max(self.min_fps, share)
+            # Small steps are skipped, except onto a bound so a session can't stall next to it
+            at_bound = share in (state.requested, self.min_fps)
+            if share != state.target and (
+                    at_bound or abs(share - state.target) >= max(MIN_CHANGE_FPS, MIN_CHANGE_FRACTION * state.target)):
+                state.target = share
+                changes.append((session_id, share, set(state.listeners)))
+        return changes
+
+    def stats(self) -> Dict:
+        targets = [state.target for state in self._sessions.values()]
+        return {
+            'sessions': len(self._sessions),
+            'capacity_fps': self.capacity,
+            'total_target_fps': sum(targets),
+            'min_target_fps': min(targets) if targets else None,
+            'max_target_fps': max(targets) if targets else None,
+            'cpu_percent': self.cpu_percent,
+            'latency_p90_ms': 1000 * self.latency_p90 if self.latency_p90 is not None else None,
+            'delay_p90_ms': 1000 * self.delay_p90 if self.delay_p90 is not None else None,
+            'budgets': {
+                'cpu_percent': self.cpu_budget,
+                'latency_ms': 1000 * self.latency_budget,
+                'delay_ms': 1000 * self.delay_budget
+            },
+            'decreases': self.decreases,
+            'increases': self.increases,
+            'last_reason': self.last_reason
+        }
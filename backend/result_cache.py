@@ -0,0 +1,212 @@
+"""
+Content-addressed cache of emotion results for still images
+Results are keyed by a hash of the decoded image, so re-submitted images
+(retries, thumbnails, the same avatar) skip inference. The exact mode hashes the
+pixels; the perceptual mode uses a 64-bit difference hash and also matches
+images within result_cache_max_distance differing bits, which catches
+re-encoded or slightly resized copies. The cache is bounded by entry count and
+approximate bytes, evicts least recently used entries first and expires entries
+after result_cache_ttl_s.
+
+Only results that depend on the image alone are stored. Callers pass a scope
+so results computed by different paths (e.g. the REST pipeline and the batch
+endpoint) never answer for each other.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ('exact', 'perceptual')
+# Rough per-entry overhead on top of the serialized result
+ENTRY_OVERHEAD_BYTES = 200
+
+CacheKey = Union[bytes, int]
+
+
+def exact_hash(image: np.ndarray) -> bytes:
+    """128-bit digest of the pixels and the image shape"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(image.shape).encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.digest()
+
+
+def perceptual_hash(image: np.ndarray) -> int:
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class _Entry:
+    __slots__ = ('result', 'size', 'expires_at')
+
+    def __init__(self, result: Dict, size: int, expires_at: float):
+        self.result = result
+        self.size = size
+        self.expires_at = expires_at
+
+
+class ResultCache:
+    def __init__(self, max_entries: Optional[int] = None, max_mb: Optional[float] = None,
+                 ttl_s: Optional[float] = None, mode: Optional[str] = None,
+                 max_distance: Optional[int] = None):
+        mode = mode or settings.result_cache_hash
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown result cache hash: {mode}")
+
+        self.mode = mode
+        self.max_entries = max_entries or settings.result_cache_entries
+        max_mb = max_mb if max_mb is not None else settings.result_cache_max_mb
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl_s if ttl_s is not None else settings.result_cache_ttl_s
+        self.max_distance = max_distance if max_distance is not None else settings.result_cache_max_distance
+        self._entries: 'OrderedDict[Tuple[str, CacheKey], _Entry]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def key(self, image: np.ndarray) -> CacheKey:
+        """Cache key of a decoded image"""
+        return exact_hash(image) if self.mode == 'exact' else perceptual_hash(image)
+
+    def get(self, key: CacheKey, scope: str = '') -> Optional[Dict]:
+        """Return a copy of the cached result (marked cached), or None"""
+        now = time.time()
+        with self._lock:
+            entry_key = self._find(scope, key, now)
+            if entry_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_key)
+            if entry_key[1] == key:
+                self.hits += 1
+            else:
+                self.near_hits += 1
+            return dict(self._entries[entry_key].result, cached=True)
+
+    def put(self, key: CacheKey, result: Dict, scope: str = ''):
+        """
+        Store a result
+
+        Errors are not cached, and neither are results that do not depend on
+        this image alone: replays of an earlier result (marked cached) and
+        results smoothed over a session's earlier frames (marked smoothed).
+        """
+        if result.get('error') or result.get('cached') or result.get('smoothed'):
+            return
+        size = len(json.dumps(result, separators=(',', ':'), default=str)) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            entry_key = (scope, key)
+            previous = self._entries.pop(entry_key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[entry_key] = _Entry(result, size, time.time() + self.ttl)
+            self._bytes += size
+            self._evict()
+
+    def detect_batch(self, detect_batch_fn: Callable[[List[Optional[np.ndarray]]], List[Dict]],
+                     frames: List[Optional[np.ndarray]], keys: List[Optional[CacheKey]],
+                     scope: str = '') -> List[Dict]:
+        """Run a batch detect function on the frames that miss the cache only"""
+        results: List[Optional[Dict]] = [
+            self.get(key, scope) if key is not None else None for key in keys
+        ]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            computed = detect_batch_fn([frames[i] for i in misses])
+            for i, result in zip(misses, computed):
+                results[i] = result
+                if keys[i] is not None:
+                    self.put(keys[i], result, scope)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _find(self, scope: str, key: CacheKey, now: float) -> Optional[Tuple[str, CacheKey]]:
+        candidates = [(scope, key)] if (scope, key) in self._entries else []
+        if not candidates and self.mode == 'perceptual' and self.max_distance > 0:
+            # Closest near-duplicate within the allowed distance
+            best = self.max_distance + 1
+            for entry_scope, entry_hash in self._entries:
+                if entry_scope == scope:
+                    distance = hamming(entry_hash, key)
+                    if distance < best:
+                        best = distance
+                        candidates = [(entry_scope, entry_hash)]
+
+        for entry_key in candidates:
+            if self._entries[entry_key].expires_at > now:
+                return entry_key
+            self._drop(entry_key)
+            self.expired += 1
+        return None
+
+    def _drop(self, entry_key: Tuple[str, CacheKey]):
+        entry = self._entries.pop(entry_key)
+        self._bytes -= entry.size
+
+    def _evict(self):
+        # Least recently used entries come first in the OrderedDict
+        now = time.time()
+        while self._entries:
+            entry_key, entry = next(iter(self._entries.items()))
+            if entry.expires_at <= now:
+                self.expired += 1
+            elif len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self.evictions += 1
+            else:
+                break
+            self._drop(entry_key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def approx_bytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                'mode': self.mode,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_s': self.ttl,
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits + self.near_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expired': self.expired
+            }
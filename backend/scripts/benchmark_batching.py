@@ -0,0 +1,117 @@
+"""
+Throughput vs latency report for the micro-batching scheduler
+
+Simulates N concurrent producers (one per /ws connection) that each submit the
+face crops of one frame at a time, and reports classifier throughput and
+per-request latency for every combination of batch size and deadline.
+
+Usage (from backend/):
+    python scripts/benchmark_batching.py
+    python scripts/benchmark_batching.py --producers 32 --batch-sizes 1 8 32 --deadlines-ms 0 5 10
+    python scripts/benchmark_batching.py --synthetic   # no TensorFlow, fixed-cost fake model
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_scheduler import MicroBatchScheduler
+
+
+def load_classifier(synthetic: bool):
+    if synthetic:
+        # Fixed overhead plus a small per-item cost, roughly the shape of a CNN on CPU
+        def classify(crops):
+            time.sleep(0.004 + 0.0004 * len(crops))
+            return np.full((len(crops), 7), 1.0 / 7, dtype=np.float32)
+        return classify, (64, 64)
+
+    from emotion_detector import EmotionDetector
+    detector = EmotionDetector()
+    return detector._classify_batch, detector.emotion_target_size
+
+
+def run_case(classify, target_size, producers, faces_per_frame, frames, batch_size, deadline_ms):
+    scheduler = MicroBatchScheduler(
+        classify,
+        max_batch_size=batch_size,
+        max_delay_ms=deadline_ms,
+        expected_producers=producers
+    )
+    crops = np.random.uniform(-1, 1, (faces_per_frame,) + tuple(target_size)).astype(np.float32)
+    latencies = []
+    lock = threading.Lock()
+
+    def producer():
+        local = []
+        for _ in range(frames):
+            started = time.perf_counter()
+            scheduler.classify(crops)
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=producer) for _ in range(producers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stats = scheduler.stats()
+    scheduler.close()
+
+    latencies.sort()
+    return {
+        'batch_size': batch_size,
+        'deadline_ms': deadline_ms,
+        'frames_per_s': producers * frames / elapsed,
+        'faces_per_s': producers * frames * faces_per_frame / elapsed,
+        'p50_ms': 1000 * latencies[len(latencies) // 2],
+        'p95_ms': 1000 * latencies[int(len(latencies) * 0.95)],
+        'avg_batch': stats['avg_batch_size'],
+        'flush_reasons': stats['flush_reasons']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--producers', type=int, default=16, help='concurrent connections')
+    parser.add_argument('--faces-per-frame', type=int, default=1)
+    parser.add_argument('--frames', type=int, default=30, help='frames per producer')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--deadlines-ms', type=float, nargs='+', default=[0, 5, 10, 20])
+    parser.add_argument('--synthetic', action='store_true', help='use a fake fixed-cost model')
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a table')
+    args = parser.parse_args()
+
+    classify, target_size = load_classifier(args.synthetic)
+    classify(np.zeros((1,) + tuple(target_size), dtype=np.float32))  # warm-up
+
+    rows = [
+        run_case(classify, target_size, args.producers, args.faces_per_frame, args.frames, batch_size, deadline)
+        for batch_size in args.batch_sizes
+        for deadline in args.deadlines_ms
+    ]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"producers={args.producers} faces/frame={args.faces_per_frame} frames/producer={args.frames}")
+    print("| batch | deadline ms | frames/s | faces/s | p50 ms | p95 ms | avg batch |")
+    print("|------:|------------:|---------:|--------:|-------:|-------:|----------:|")
+    for row in rows:
+        print(f"| {row['batch_size']} | {row['deadline_ms']:g} | {row['frames_per_s']:.1f} | "
+              f"{row['faces_per_s']:.1f} | {row['p50_ms']:.1f} | {row['p95_ms']:.1f} | {row['avg_batch']:.1f} |")
+
+
+if __name__ == "__main__":
+    main()
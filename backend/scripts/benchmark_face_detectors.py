@@ -0,0 +1,81 @@
+"""
+Latency and hit rate of every face detector backend on your own footage
+
+Runs each backend over the same frames (a directory of images or a video file)
+and prints a markdown table, so a deployment can pick FACE_DETECTOR.
+
+Usage (from backend/):
+    python scripts/benchmark_face_detectors.py path/to/frames/
+    python scripts/benchmark_face_detectors.py clip.mp4 --max-frames 300 --json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import cv2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_detectors import FACE_DETECTORS, create_face_detector
+
+
+def load_frames(source: str, max_frames: int):
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source))[:max_frames]:
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                yield frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    count = 0
+    while count < max_frames:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        count += 1
+        yield frame
+    capture.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='directory of images or a video file')
+    parser.add_argument('--max-frames', type=int, default=200)
+    parser.add_argument('--backends', nargs='+', default=list(FACE_DETECTORS), choices=FACE_DETECTORS)
+    parser.add_argument('--json', action='store_true', help='print raw stats as JSON')
+    args = parser.parse_args()
+
+    frames = list(load_frames(args.source, args.max_frames))
+    if not frames:
+        sys.exit(f"No frames read from {args.source}")
+
+    results = []
+    for name in args.backends:
+        detector = create_face_detector(name)
+        detector.detect(frames[0])  # warm-up
+        detector.reset_stats()
+        had_faces = False
+        for frame in frames:
+            had_faces = bool(detector.find_faces(frame, had_faces))
+        stats = detector.stats()
+        stats['requested'] = name
+        results.append(stats)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{len(frames)} frames from {args.source}\n")
+    print("| backend | avg ms | p95 ms | hit rate | escalation rate |")
+    print("|---|---|---|---|---|")
+    for stats in results:
+        escalation = f"{stats['escalation_rate']:.0%}" if 'escalation_rate' in stats else "-"
+        label = stats['requested'] if stats['requested'] == stats['backend'] else f"{stats['requested']} ({stats['backend']})"
+        print(f"| {label} | {stats['avg_ms']:.1f} | {stats['p95_ms']:.1f} | {stats['hit_rate']:.0%} | {escalation} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark the lite emotion classifier against the TensorFlow path
+
+Reports, per backend, accuracy on a labelled evaluation set (FER2013's
+PrivateTest rows or images in emotion-named folders), median classify()
+latency at batch 1 and 16, and the peak and current resident memory of a fresh
+process that loads the backend and classifies a batch. The app_lite row is the
+whole lite detector (face cascade, lite classifier, smoothing) running on a
+frame, i.e. what the 512 MB deployment pays for emotions.
+
+Usage (from backend/):
+    python scripts/benchmark_lite_classifier.py --fer2013 path/to/fer2013.csv
+    python scripts/benchmark_lite_classifier.py path/to/faces/ [--backends lite,fer,int8]
+        [--model models/emotion_lite.npz] [--report lite_benchmark.json]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+from typing import Dict, Optional
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPTS_DIR))
+sys.path.append(SCRIPTS_DIR)
+
+from config import settings
+from memory_governor import MB, rss_bytes
+from quantize_emotion_model import LATENCY_BATCHES, build_classifier, latency, list_images, load_crops
+from train_lite_emotion_model import evaluate, load_fer2013
+
+BACKENDS = ('lite', 'fer', 'int8')
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process"""
+    # ru_maxrss survives exec, so it would include the benchmark process's peak
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def create(backend: str, model_path: Optional[str] = None):
+    if backend == 'lite':
+        from emotion_classifiers import LiteClassifier
+        return LiteClassifier(model_path, threads=settings.emotion_threads)
+    return build_classifier(backend)
+
+
+def measure_memory(backend: str, model_path: Optional[str]) -> Dict:
+    """Resident memory of a fresh process that loads the backend and classifies a batch"""
+    command = [sys.executable, os.path.abspath(__file__), '--measure', backend]
+    if model_path:
+        command += ['--model', model_path]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _measure(backend: str, model_path: Optional[str]):
+    baseline = rss_bytes()
+    if backend == 'app_lite':
+        from emotion_detector_simple import EmotionDetector
+        detector = EmotionDetector(model_path)
+        frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+        detector.detect_emotions(frame)
+        detector._classify_faces(frame, [[100, 100, 150, 150]] * max(LATENCY_BATCHES))
+    else:
+        classifier = create(backend, model_path)
+        classifier.classify(np.zeros((max(LATENCY_BATCHES),) + tuple(classifier.input_size), dtype=np.float32))
+    print(json.dumps({
+        'peak_rss_mb': round(peak_rss_bytes() / MB, 1),
+        'rss_mb': round(rss_bytes() / MB, 1),
+        'model_rss_mb': round((rss_bytes() - baseline) / MB, 1),
+        'tensorflow_imported': 'tensorflow' in sys.modules
+    }))
+
+
+def print_report(report: Dict):
+    print(f"\n{report['crops']} evaluation crops\n")
+    print("| backend | accuracy | " + " | ".join(f"batch {batch} p50 ms" for batch in LATENCY_BATCHES)
+          + " | peak RSS MB | TensorFlow |")
+    print("|---|---|" + "---|" * (len(LATENCY_BATCHES) + 2))
+    for name, row in report['backends'].items():
+        accuracy = f"{row['accuracy']:.1%}" if row.get('accuracy') is not None else "-"
+        timings = " | ".join(f"{row['latency_ms'][str(batch)]:.2f}" if 'latency_ms' in row else "-"
+                             for batch in LATENCY_BATCHES)
+        memory = row.get('memory', {})
+        tensorflow = ("yes" if memory['tensorflow_imported'] else "no") if memory else "-"
+        print(f"| {name} | {accuracy} | {timings} | {memory.get('peak_rss_mb', '-')} | {tensorflow} |")
+
+    lite = report['backends'].get('lite', {}).get('evaluation')
+    if lite:
+        print("\n| emotion | support | lite recall |")
+        print("|---|---|---|")
+        for label, row in lite['per_class'].items():
+            recall = f"{row['recall']:.1%}" if row['recall'] is not None else "-"
+            print(f"| {label} | {row['support']} | {recall} |")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='?', help='directory of face images in emotion-named folders')
+    parser.add_argument('--fer2013', default=None, help="FER2013's fer2013.csv (PrivateTest rows are evaluated)")
+    parser.add_argument('--backends', default='lite,fer', help=f"comma separated, from {', '.join(BACKENDS)}")
+    parser.add_argument('--model', default=None, help=f'lite model (default: models/{settings.emotion_lite_model})')
+    parser.add_argument('--report', default=None, help='write the results as JSON')
+    parser.add_argument('--skip-memory', action='store_true', help='do not measure RSS in subprocesses')
+    parser.add_argument('--measure', choices=BACKENDS + ('app_lite',), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        _measure(args.measure, args.model)
+        return
+    if not args.images and not args.fer2013:
+        parser.error("an image directory or --fer2013 is required")
+    backends = [name for name in args.backends.split(',') if name]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(sorted(unknown))}")
+
+    if args.fer2013:
+        crops, labels = load_fer2013(args.fer2013, usages=('PrivateTest',))
+    else:
+        crops, labels = load_crops(list_images(args.images))
+        labels = np.asarray(labels, dtype=np.int64)
+        crops, labels = crops[labels >= 0], labels[labels >= 0]
+    if not len(crops):
+        sys.exit("No labelled face crops to evaluate on")
+
+    report = {'crops': int(len(crops)), 'backends': {}}
+    for name in backends:
+        classifier = create(name, args.model)
+        evaluation = evaluate(np.concatenate([classifier.classify(crops[i:i + 64])
+                                              for i in range(0, len(crops), 64)]), labels)
+        report['backends'][name] = {
+            'accuracy': evaluation['accuracy'],
+            'evaluation': evaluation,
+            'latency_ms': {str(batch): latency(classifier, crops, batch) for batch in LATENCY_BATCHES}
+        }
+        print(f"{name}: accuracy {evaluation['accuracy']:.1%}")
+
+    if not args.skip_memory:
+        for name in backends + (['app_lite'] if 'lite' in backends else []):
+            report['backends'].setdefault(name, {})['memory'] = measure_memory(name, args.model)
+
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Download the OpenCV DNN (ResNet-10 SSD) face detector used by FACE_DETECTOR=dnn
+and by the cheap stage of FACE_DETECTOR=cascade
+
+Usage (from backend/):
+    python scripts/download_face_models.py
+"""
+
+import os
+import sys
+import urllib.request
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+FILES = {
+    settings.face_dnn_config:
+        "https://raw.githubusercontent.com/opencv/opencv/master/samples/dnn/face_detector/deploy.prototxt",
+    settings.face_dnn_model:
+        "https://raw.githubusercontent.com/opencv/opencv_3rdparty/"
+        "dnn_samples_face_detector_20170830/res10_300x300_ssd_iter_140000.caffemodel",
+}
+
+
+def main():
+    os.makedirs(settings.models_dir, exist_ok=True)
+    for name, url in FILES.items():
+        path = os.path.join(settings.models_dir, name)
+        if os.path.exists(path):
+            print(f"{path} already present")
+            continue
+        print(f"Downloading {url}")
+        try:
+            urllib.request.urlretrieve(url, path + ".part")
+        except Exception:
+            if os.path.exists(path + ".part"):
+                os.remove(path + ".part")
+            raise
+        os.replace(path + ".part", path)
+        print(f"Saved {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Export FER's Keras emotion model for EMOTION_BACKEND=onnx / opencv
+
+Writes models/emotion_model.onnx with tf2onnx when it is installed (N x 1 x H x W
+input, runs on ONNX Runtime and cv2.dnn). With --format pb, or without tf2onnx,
+writes a frozen TensorFlow graph (models/emotion_model.pb) that cv2.dnn reads;
+point EMOTION_MODEL at it and use EMOTION_BACKEND=opencv. The exported model is
+checked against the Keras model on random crops.
+
+Usage (from backend/):
+    python scripts/export_emotion_model.py [--format onnx|pb] [--output PATH]
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+
+def load_keras_model():
+    import pkg_resources
+    from tensorflow.keras.models import load_model
+    path = pkg_resources.resource_filename("fer", "data/emotion_model.hdf5")
+    return load_model(path, compile=False)
+
+
+def export_onnx(model, output: str):
+    import tensorflow as tf
+    import tf2onnx
+
+    height, width = model.input_shape[1:3]
+    spec = (tf.TensorSpec((None, height, width, 1), tf.float32, name="faces"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13,
+                               inputs_as_nchw=["faces"], output_path=output)
+
+
+def export_frozen_graph(model, output: str):
+    import tensorflow as tf
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    height, width = model.input_shape[1:3]
+    function = tf.function(lambda faces: model(faces), autograph=False).get_concrete_function(
+        tf.TensorSpec((None, height, width, 1), tf.float32, name="faces")
+    )
+    graph = convert_variables_to_constants_v2(function).graph.as_graph_def()
+    tf.io.write_graph(graph, os.path.dirname(output) or '.', os.path.basename(output), as_text=False)
+
+
+def verify(model, output: str, backend: str):
+    from emotion_classifiers import OnnxClassifier, OpenCVClassifier
+
+    height, width = model.input_shape[1:3]
+    crops = np.random.default_rng(0).uniform(-1, 1, (8, height, width)).astype(np.float32)
+    expected = model(crops[..., np.newaxis]).numpy()
+    classifier = OnnxClassifier(output) if backend == 'onnx' else OpenCVClassifier(output)
+    error = float(np.abs(classifier.classify(crops) - expected).max())
+    print(f"{backend}: max abs difference to Keras {error:.2e}")
+    if error > 1e-4:
+        raise SystemExit("Exported model does not match the Keras model")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--format", choices=("onnx", "pb"), default=None,
+                        help="default: onnx when tf2onnx is installed, else pb")
+    parser.add_argument("--output", default=None, help="output path (default: models/emotion_model.<format>)")
+    args = parser.parse_args()
+
+    fmt = args.format
+    if fmt is None:
+        try:
+            import tf2onnx  # noqa: F401
+            fmt = "onnx"
+        except ImportError:
+            print("tf2onnx is not installed; exporting a frozen graph for cv2.dnn")
+            fmt = "pb"
+    output = args.output or os.path.join(settings.models_dir, f"emotion_model.{fmt}")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+
+    model = load_keras_model()
+    if fmt == "onnx":
+        export_onnx(model, output)
+    else:
+        export_frozen_graph(model, output)
+    print(f"Wrote {output}")
+
+    verify(model, output, 'opencv')
+    if fmt == "onnx":
+        try:
+            verify(model, output, 'onnx')
+        except ImportError:
+            print("onnxruntime is not installed; skipped the ONNX Runtime check")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Quantize FER's emotion model to INT8 for EMOTION_BACKEND=int8
+
+Collects face crops from a calibration set (a directory of images, searched
+recursively; images without a detectable face that are already face-sized,
+like FER2013's 48x48 crops, are used whole), converts the Keras model to a
+full-integer TFLite model calibrated on part of them and compares it against
+the float model on the rest. The comparison report (per-class agreement with
+the float model, latency at batch 1 and 16, resident memory and model size) is
+printed and written next to the model as JSON. When the images sit in folders
+named after emotions, accuracy against those labels is reported too.
+
+The crops are split with a fixed seed, so the same calibration set always
+produces the same model.
+
+Usage (from backend/):
+    python scripts/quantize_emotion_model.py path/to/faces/ [--eval path/to/faces/]
+        [--output models/emotion_model.int8.tflite] [--max-calibration 500]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPTS_DIR))
+sys.path.append(SCRIPTS_DIR)
+
+from config import settings
+from emotion_classifiers import DEFAULT_INPUT_SIZE, preprocess_faces
+from emotion_vectors import EMOTION_INDEX, EMOTION_LABELS, NUM_EMOTIONS
+from export_emotion_model import load_keras_model
+from memory_governor import MB, rss_bytes
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+# Images at most this large are treated as face crops when no face is found
+FACE_SIZED = 128
+LATENCY_BATCHES = (1, 16)
+
+
+def list_images(directory: str) -> List[str]:
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def load_crops(paths: List[str], input_size: Tuple[int, int] = DEFAULT_INPUT_SIZE) -> Tuple[np.ndarray, List[int]]:
+    """Preprocessed face crops of the images and the emotion label of each (-1 when unknown)"""
+    from face_detectors import HaarFaceDetector
+
+    detector = HaarFaceDetector()
+    crops, labels = [], []
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        boxes = detector.find_faces(frame)
+        height, width = frame.shape[:2]
+        if not boxes and max(height, width) <= FACE_SIZED:
+            boxes = [[0, 0, width, height]]
+        faces, _ = preprocess_faces(frame, boxes, input_size)
+        crops.extend(faces)
+        label = EMOTION_INDEX.get(os.path.basename(os.path.dirname(path)).lower(), -1)
+        labels.extend([label] * len(faces))
+
+    if not crops:
+        return np.zeros((0,) + tuple(input_size), dtype=np.float32), []
+    return np.stack(crops), labels
+
+
+def manifest_hash(paths: List[str]) -> str:
+    """Digest of the calibration file names and contents, to tell calibration sets apart"""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def quantize(model, calibration: np.ndarray, output: str) -> int:
+    """Convert the Keras model to a full-integer TFLite model (float input and output)"""
+    import tensorflow as tf
+
+    def representative_dataset():
+        for crop in calibration:
+            yield [crop[np.newaxis, ..., np.newaxis].astype(np.float32)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # Keep float I/O so the backend takes the same crops as the float model
+    converter.inference_input_type = tf.float32
+    converter.inference_output_type = tf.float32
+    data = converter.convert()
+    with open(output, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+def compare(reference: np.ndarray, quantized: np.ndarray, labels: Optional[List[int]] = None) -> Dict:
+    """Agreement of the quantized model's top-1 emotion with the float model's, per class"""
+    expected = reference.argmax(axis=1)
+    predicted = quantized.argmax(axis=1)
+    confusion = np.zeros((NUM_EMOTIONS, NUM_EMOTIONS), dtype=np.int64)
+    np.add.at(confusion, (expected, predicted), 1)
+
+    per_class = {}
+    for index, label in enumerate(EMOTION_LABELS):
+        support = int(confusion[index].sum())
+        per_class[label] = {
+            'support': support,
+            'agreement': float(confusion[index, index] / support) if support else None
+        }
+
+    report = {
+        'crops': int(len(reference)),
+        'top1_agreement': float((expected == predicted).mean()) if len(reference) else None,
+        'mean_abs_diff': float(np.abs(reference - quantized).mean()) if len(reference) else None,
+        'max_abs_diff': float(np.abs(reference - quantized).max()) if len(reference) else None,
+        'per_class': per_class,
+        # Rows: float model's emotion, columns: quantized model's
+        'confusion': confusion.tolist()
+    }
+
+    if labels is not None:
+        known = np.asarray(labels) >= 0
+        if known.any():
+            truth = np.asarray(labels)[known]
+            report['label_accuracy'] = {
+                'float': float((expected[known] == truth).mean()),
+                'int8': float((predicted[known] == truth).mean()),
+                'labelled': int(known.sum())
+            }
+    return report
+
+
+def latency(classifier, crops: np.ndarray, batch: int, runs: int = 30) -> float:
+    """Median milliseconds per classify() call at the given batch size"""
+    batch_crops = np.resize(crops, (batch,) + crops.shape[1:]).astype(np.float32)
+    classifier.classify(batch_crops)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        classifier.classify(batch_crops)
+        timings.append(1000 * (time.perf_counter() - started))
+    return float(np.median(timings))
+
+
+def keras_model_bytes() -> int:
+    import pkg_resources
+    return os.path.getsize(pkg_resources.resource_filename("fer", "data/emotion_model.hdf5"))
+
+
+def build_classifier(backend: str, model_path: Optional[str] = None):
+    from emotion_classifiers import FerClassifier, TFLiteClassifier
+    if backend == 'int8':
+        return TFLiteClassifier(model_path, threads=settings.emotion_threads)
+    return FerClassifier(threads=settings.emotion_threads)
+
+
+def measure_memory(backend: str, model_path: str) -> Dict:
+    """Resident memory of a fresh process that loads the backend and classifies a batch"""
+    command = [sys.executable, os.path.abspath(__file__), '--measure', backend, '--output', model_path]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _measure(backend: str, model_path: str):
+    baseline = rss_bytes()
+    classifier = build_classifier(backend, model_path)
+    classifier.classify(np.zeros((max(LATENCY_BATCHES),) + tuple(classifier.input_size), dtype=np.float32))
+    print(json.dumps({'rss_mb': round(rss_bytes() / MB, 1), 'model_rss_mb': round((rss_bytes() - baseline) / MB, 1)}))
+
+
+def split(paths: List[str], eval_fraction: float, seed: int) -> Tuple[List[str], List[str]]:
+    shuffled = list(paths)
+    np.random.default_rng(seed).shuffle(shuffled)
+    count = int(round(len(shuffled) * eval_fraction))
+    return sorted(shuffled[count:]), sorted(shuffled[:count])
+
+
+def print_report(report: Dict):
+    evaluation = report['evaluation']
+    print(f"\n{evaluation['crops']} evaluation crops, top-1 agreement {evaluation['top1_agreement']:.1%}, "
+          f"mean abs diff {evaluation['mean_abs_diff']:.4f}\n")
+    print("| emotion | support | agreement |")
+    print("|---|---|---|")
+    for label, row in evaluation['per_class'].items():
+        agreement = f"{row['agreement']:.1%}" if row['agreement'] is not None else "-"
+        print(f"| {label} | {row['support']} | {agreement} |")
+    if 'label_accuracy' in evaluation:
+        accuracy = evaluation['label_accuracy']
+        print(f"\nAccuracy on {accuracy['labelled']} labelled crops: float {accuracy['float']:.1%}, "
+              f"int8 {accuracy['int8']:.1%}")
+
+    print("\n| backend | " + " | ".join(f"batch {batch} p50 ms" for batch in LATENCY_BATCHES) + " | RSS MB | model KB |")
+    print("|---|" + "---|" * (len(LATENCY_BATCHES) + 2))
+    for backend in ('fer', 'int8'):
+        timings = " | ".join(f"{report['latency_ms'][backend][str(batch)]:.2f}" for batch in LATENCY_BATCHES)
+        memory = report['memory'].get(backend, {}).get('rss_mb', '-')
+        print(f"| {backend} | {timings} | {memory} | {report['model_bytes'][backend] / 1024:.0f} |")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('calibration', nargs='?', help='directory of calibration images')
+    parser.add_argument('--eval', default=None, help='separate directory of evaluation images')
+    parser.add_argument('--eval-fraction', type=float, default=0.2,
+                        help='share of the calibration images held out for evaluation without --eval')
+    parser.add_argument('--max-calibration', type=int, default=500, help='most crops used for calibration')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help=f'model path (default: models/{settings.emotion_int8_model})')
+    parser.add_argument('--report', default=None, help='report path (default: <output>.report.json)')
+    parser.add_argument('--skip-memory', action='store_true', help='do not measure RSS in subprocesses')
+    parser.add_argument('--measure', choices=('fer', 'int8'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(settings.models_dir, settings.emotion_int8_model)
+    if args.measure:
+        _measure(args.measure, output)
+        return
+    if not args.calibration:
+        parser.error("a calibration image directory is required")
+
+    paths = list_images(args.calibration)
+    if args.eval:
+        calibration_paths, eval_paths = paths, list_images(args.eval)
+    else:
+        calibration_paths, eval_paths = split(paths, args.eval_fraction, args.seed)
+    calibration, _ = load_crops(calibration_paths)
+    evaluation, labels = load_crops(eval_paths)
+    if not len(calibration) or not len(evaluation):
+        sys.exit(f"Need face crops for calibration and evaluation, got {len(calibration)} and {len(evaluation)}")
+    if len(calibration) > args.max_calibration:
+        keep = np.random.default_rng(args.seed).choice(len(calibration), args.max_calibration, replace=False)
+        calibration = calibration[np.sort(keep)]
+    print(f"{len(calibration)} calibration crops, {len(evaluation)} evaluation crops")
+
+    import tensorflow as tf
+
+    model = load_keras_model()
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    size = quantize(model, calibration, output)
+    print(f"Wrote {output} ({size / 1024:.0f} KB)")
+
+    float_classifier = build_classifier('fer')
+    int8_classifier = build_classifier('int8', output)
+    report = {
+        'model': output,
+        'tensorflow': tf.__version__,
+        'calibration': {
+            'images': len(calibration_paths),
+            'crops': int(len(calibration)),
+            'sha256': manifest_hash(calibration_paths),
+            'seed': args.seed
+        },
+        'evaluation': compare(float_classifier.classify(evaluation), int8_classifier.classify(evaluation), labels),
+        'latency_ms': {
+            name: {str(batch): latency(classifier, evaluation, batch) for batch in LATENCY_BATCHES}
+            for name, classifier in (('fer', float_classifier), ('int8', int8_classifier))
+        },
+        'model_bytes': {
+            'fer': keras_model_bytes(),
+            'int8': size
+        },
+        'memory': {}
+    }
+    if not args.skip_memory:
+        report['memory'] = {backend: measure_memory(backend, output) for backend in ('fer', 'int8')}
+
+    report_path = args.report or os.path.splitext(output)[0] + '.report.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\nWrote {report_path}")
+
+
+if __name__ == "__main__":
+    main()
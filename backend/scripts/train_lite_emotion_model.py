@@ -0,0 +1,348 @@
+"""
+Train the numpy/OpenCV-only emotion classifier for EMOTION_BACKEND=lite and app_lite
+
+Extracts HOG features from preprocessed face crops (the same crops every other
+backend sees), standardizes them and trains a small MLP (or, with --hidden 0,
+a softmax regression) with Adam and class-balanced cross-entropy. The weights
+are written as a compressed float16 .npz that LiteClassifier loads with numpy
+alone; a training report (validation accuracy, per-class recall, confusion) is
+written next to it as JSON.
+
+Training data is either FER2013's CSV (emotion, pixels, Usage; the Training
+rows train, PublicTest validates) or a directory of images in folders named
+after emotions. With --teacher, images outside such folders are labelled by
+FER's Keras model instead (distillation; needs TensorFlow at training time only).
+--augment adds jittered copies of every training crop (flip, rotation, scale,
+shift, brightness and contrast), which small image sets such as video frames of
+a few people need. --val-images validates on a separate directory instead of a
+random share of the images, so frames of one video don't end up on both sides.
+
+Usage (from backend/):
+    python scripts/train_lite_emotion_model.py --fer2013 path/to/fer2013.csv
+    python scripts/train_lite_emotion_model.py path/to/faces/ [--teacher] [--hidden 64]
+        [--augment 4] [--val-images path/to/other/faces/] [--output models/emotion_lite.npz]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPTS_DIR))
+sys.path.append(SCRIPTS_DIR)
+
+from config import settings
+from emotion_classifiers import DEFAULT_INPUT_SIZE, hog_descriptor, hog_features, mlp_forward, preprocess_faces
+from emotion_vectors import EMOTION_LABELS, NUM_EMOTIONS
+from quantize_emotion_model import list_images, load_crops, split
+
+# HOG window, block, stride, cell (pixels) and orientation bins: 1764 features on 64 x 64 crops
+HOG_PARAMS = (64, 16, 8, 8, 9)
+FER2013_SIZE = 48
+
+
+def load_fer2013(path: str, input_size: Tuple[int, int] = DEFAULT_INPUT_SIZE,
+                 usages: Tuple[str, ...] = ('Training',), limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Preprocessed crops and labels of the FER2013 rows with the given Usage (its labels use EMOTION_LABELS order)"""
+    import cv2
+
+    crops, labels = [], []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get('Usage', 'Training') not in usages:
+                continue
+            gray = np.array(row['pixels'].split(), dtype=np.uint8).reshape(FER2013_SIZE, FER2013_SIZE)
+            face, _ = preprocess_faces(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR),
+                                       [[0, 0, FER2013_SIZE, FER2013_SIZE]], input_size)
+            crops.append(face[0])
+            labels.append(int(row['emotion']))
+            if limit is not None and len(crops) >= limit:
+                break
+    if not crops:
+        return np.zeros((0,) + tuple(input_size), dtype=np.float32), np.zeros(0, dtype=np.int64)
+    return np.stack(crops), np.asarray(labels, dtype=np.int64)
+
+
+def augment_crops(crops: np.ndarray, copies: int, seed: int = 0) -> np.ndarray:
+    """copies jittered versions of every crop, in crop order (each crop's copies together)"""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    height, width = crops.shape[1:3]
+    augmented = np.empty((len(crops) * copies,) + crops.shape[1:], dtype=np.float32)
+    for i, crop in enumerate(np.repeat(crops, copies, axis=0)):
+        if rng.random() < 0.5:
+            crop = crop[:, ::-1]
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rng.uniform(-12, 12), rng.uniform(0.9, 1.1))
+        matrix[:, 2] += rng.uniform(-3, 3, 2)
+        crop = cv2.warpAffine(np.ascontiguousarray(crop), matrix, (width, height), borderMode=cv2.BORDER_REFLECT)
+        augmented[i] = np.clip(crop * rng.uniform(0.8, 1.2) + rng.uniform(-0.15, 0.15), -1.0, 1.0)
+    return augmented
+
+
+def teacher_targets(crops: np.ndarray, batch: int = 64) -> np.ndarray:
+    """FER's Keras model's probabilities for the crops (soft targets)"""
+    from emotion_classifiers import FerClassifier
+
+    teacher = FerClassifier()
+    return np.concatenate([teacher.classify(crops[i:i + batch]) for i in range(0, len(crops), batch)])
+
+
+def one_hot(labels: np.ndarray) -> np.ndarray:
+    targets = np.zeros((len(labels), NUM_EMOTIONS), dtype=np.float32)
+    targets[np.arange(len(labels)), labels] = 1.0
+    return targets
+
+
+def class_weights(targets: np.ndarray) -> np.ndarray:
+    """Inverse class frequency, so rare emotions (disgust) aren't ignored"""
+    counts = targets.sum(axis=0)
+    weights = np.where(counts > 0, counts.sum() / (NUM_EMOTIONS * np.maximum(counts, 1e-6)), 0.0)
+    return weights.astype(np.float32)
+
+
+def init_weights(sizes: List[int], rng: np.random.Generator) -> List[Tuple[np.ndarray, np.ndarray]]:
+    return [(rng.normal(0.0, np.sqrt(2.0 / fan_in), (fan_in, fan_out)).astype(np.float32),
+             np.zeros(fan_out, dtype=np.float32))
+            for fan_in, fan_out in zip(sizes[:-1], sizes[1:])]
+
+
+def gradients(features: np.ndarray, targets: np.ndarray, sample_weights: np.ndarray,
+              weights: List[Tuple[np.ndarray, np.ndarray]], weight_decay: float):
+    """Weighted cross-entropy loss and its gradients for one minibatch"""
+    activations = [features]
+    for i, (weight, bias) in enumerate(weights):
+        out = activations[-1] @ weight + bias
+        if i < len(weights) - 1:
+            out = np.maximum(out, 0.0)
+        activations.append(out)
+    logits = activations[-1] - activations[-1].max(axis=1, keepdims=True)
+    probabilities = np.exp(logits)
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+
+    norm = sample_weights.sum()
+    loss = float(-(sample_weights * (targets * np.log(probabilities + 1e-9)).sum(axis=1)).sum() / norm)
+    delta = (probabilities - targets) * (sample_weights / norm)[:, np.newaxis]
+    grads = []
+    for i in range(len(weights) - 1, -1, -1):
+        weight, _ = weights[i]
+        grads.append((activations[i].T @ delta + weight_decay * weight, delta.sum(axis=0)))
+        if i > 0:
+            delta = (delta @ weight.T) * (activations[i] > 0)
+    return loss, grads[::-1]
+
+
+def train(features: np.ndarray, targets: np.ndarray, hidden: int = 64, epochs: int = 40,
+          learning_rate: float = 1e-3, weight_decay: float = 1e-4, batch_size: int = 128, seed: int = 0,
+          validation: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+          log=print) -> Tuple[List[Tuple[np.ndarray, np.ndarray]], List[Dict]]:
+    """
+    Adam on class-balanced cross-entropy over standardized features
+
+    targets are N x 7 (one-hot or soft). With validation (features, labels)
+    the weights of the epoch with the best validation accuracy are returned.
+    Returns the dense layers and the per-epoch history.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = [features.shape[1]] + ([hidden] if hidden else []) + [NUM_EMOTIONS]
+    weights = init_weights(sizes, rng)
+    moments = [(np.zeros_like(w), np.zeros_like(b), np.zeros_like(w), np.zeros_like(b)) for w, b in weights]
+    per_class = class_weights(targets)
+    sample_weights = targets @ per_class
+    beta1, beta2, step = 0.9, 0.999, 0
+
+    best, best_accuracy, history = None, -1.0, []
+    for epoch in range(epochs):
+        order = rng.permutation(len(features))
+        losses = []
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            loss, grads = gradients(features[batch], targets[batch], sample_weights[batch], weights, weight_decay)
+            losses.append(loss)
+            step += 1
+            updated = []
+            for (weight, bias), (grad_w, grad_b), (m_w, m_b, v_w, v_b) in zip(weights, grads, moments):
+                for m, v, grad in ((m_w, v_w, grad_w), (m_b, v_b, grad_b)):
+                    m *= beta1
+                    m += (1 - beta1) * grad
+                    v *= beta2
+                    v += (1 - beta2) * grad * grad
+                correction = np.sqrt(1 - beta2 ** step) / (1 - beta1 ** step)
+                weight = weight - learning_rate * correction * m_w / (np.sqrt(v_w) + 1e-8)
+                bias = bias - learning_rate * correction * m_b / (np.sqrt(v_b) + 1e-8)
+                updated.append((weight.astype(np.float32), bias.astype(np.float32)))
+            weights = updated
+
+        entry = {'epoch': epoch + 1, 'loss': float(np.mean(losses))}
+        if validation is not None:
+            entry['val_accuracy'] = float((mlp_forward(validation[0], weights).argmax(axis=1) == validation[1]).mean())
+            if entry['val_accuracy'] > best_accuracy:
+                best, best_accuracy = [(w.copy(), b.copy()) for w, b in weights], entry['val_accuracy']
+        history.append(entry)
+        log(f"epoch {entry['epoch']:3d}  loss {entry['loss']:.4f}"
+            + (f"  val accuracy {entry['val_accuracy']:.1%}" if 'val_accuracy' in entry else ""))
+    return (best if best is not None else weights), history
+
+
+def standardization(features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0)
+    scale[scale < 1e-6] = 1.0
+    return mean.astype(np.float32), scale.astype(np.float32)
+
+
+def save_model(path: str, weights: List[Tuple[np.ndarray, np.ndarray]], mean: np.ndarray, scale: np.ndarray,
+               hog_params=HOG_PARAMS, input_size: Tuple[int, int] = DEFAULT_INPUT_SIZE) -> int:
+    """Write the model in LiteClassifier's .npz layout; returns its size in bytes"""
+    arrays = {
+        'labels': np.array(EMOTION_LABELS),
+        'input_size': np.array(input_size, dtype=np.int32),
+        'hog': np.array(hog_params, dtype=np.int32),
+        'mean': mean.astype(np.float32),
+        'scale': scale.astype(np.float32)
+    }
+    for i, (weight, bias) in enumerate(weights):
+        arrays[f'w{i}'] = weight.astype(np.float16)
+        arrays[f'b{i}'] = bias.astype(np.float16)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    return os.path.getsize(path)
+
+
+def evaluate(probabilities: np.ndarray, labels: np.ndarray) -> Dict:
+    """Accuracy, per-class recall and confusion of predictions against labels"""
+    predicted = probabilities.argmax(axis=1)
+    confusion = np.zeros((NUM_EMOTIONS, NUM_EMOTIONS), dtype=np.int64)
+    np.add.at(confusion, (labels, predicted), 1)
+    per_class = {}
+    for index, label in enumerate(EMOTION_LABELS):
+        support = int(confusion[index].sum())
+        per_class[label] = {
+            'support': support,
+            'recall': float(confusion[index, index] / support) if support else None
+        }
+    return {
+        'crops': int(len(labels)),
+        'accuracy': float((predicted == labels).mean()) if len(labels) else None,
+        'per_class': per_class,
+        # Rows: label, columns: prediction
+        'confusion': confusion.tolist()
+    }
+
+
+def print_evaluation(evaluation: Dict):
+    print(f"\n{evaluation['crops']} crops, accuracy {evaluation['accuracy']:.1%}\n")
+    print("| emotion | support | recall |")
+    print("|---|---|---|")
+    for label, row in evaluation['per_class'].items():
+        recall = f"{row['recall']:.1%}" if row['recall'] is not None else "-"
+        print(f"| {label} | {row['support']} | {recall} |")
+
+
+def load_dataset(args) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Training crops and N x 7 targets, validation crops and labels"""
+    if args.fer2013:
+        crops, labels = load_fer2013(args.fer2013, usages=('Training',), limit=args.limit)
+        val_crops, val_labels = load_fer2013(args.fer2013, usages=('PublicTest',))
+        return crops, one_hot(labels), val_crops, val_labels
+
+    if args.val_images:
+        train_paths, val_paths = list_images(args.images), list_images(args.val_images)
+    else:
+        train_paths, val_paths = split(list_images(args.images), args.val_fraction, args.seed)
+    crops, labels = load_crops(train_paths)
+    val_crops, val_labels = load_crops(val_paths)
+    labels, val_labels = np.asarray(labels, dtype=np.int64), np.asarray(val_labels, dtype=np.int64)
+    if args.augment and len(crops):
+        crops = np.concatenate([crops, augment_crops(crops, args.augment, args.seed)])
+        labels = np.concatenate([labels, np.repeat(labels, args.augment)])
+    if args.teacher:
+        targets = teacher_targets(crops)
+        known = labels >= 0
+        targets[known] = one_hot(labels[known])
+        if len(val_crops):
+            unknown = val_labels < 0
+            if unknown.any():
+                val_labels[unknown] = teacher_targets(val_crops[unknown]).argmax(axis=1)
+    else:
+        crops, labels = crops[labels >= 0], labels[labels >= 0]
+        targets = one_hot(labels)
+    known = val_labels >= 0
+    return crops, targets, val_crops[known], val_labels[known]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='?', help='directory of face images in emotion-named folders')
+    parser.add_argument('--fer2013', default=None, help="FER2013's fer2013.csv instead of an image directory")
+    parser.add_argument('--teacher', action='store_true', help="label images outside emotion folders with FER's model")
+    parser.add_argument('--val-fraction', type=float, default=0.15, help='share of the images held out for validation')
+    parser.add_argument('--val-images', default=None, help='validate on this image directory instead of a random share')
+    parser.add_argument('--augment', type=int, default=0, help='jittered copies added per training crop')
+    parser.add_argument('--limit', type=int, default=None, help='most FER2013 training rows used')
+    parser.add_argument('--hidden', type=int, default=64, help='hidden units (0: softmax regression)')
+    parser.add_argument('--epochs', type=int, default=40)
+    parser.add_argument('--learning-rate', type=float, default=1e-3)
+    parser.add_argument('--weight-decay', type=float, default=1e-4)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help=f'model path (default: models/{settings.emotion_lite_model})')
+    parser.add_argument('--report', default=None, help='report path (default: <output>.report.json)')
+    args = parser.parse_args()
+    if not args.images and not args.fer2013:
+        parser.error("an image directory or --fer2013 is required")
+
+    started = time.perf_counter()
+    crops, targets, val_crops, val_labels = load_dataset(args)
+    if not len(crops):
+        sys.exit("No labelled face crops to train on")
+    print(f"{len(crops)} training crops, {len(val_crops)} validation crops "
+          f"({time.perf_counter() - started:.0f} s to load)")
+
+    hog = hog_descriptor(HOG_PARAMS)
+    features = hog_features(crops, hog)
+    mean, scale = standardization(features)
+    features = (features - mean) / scale
+    validation = ((hog_features(val_crops, hog) - mean) / scale, val_labels) if len(val_crops) else None
+
+    weights, history = train(features, targets, hidden=args.hidden, epochs=args.epochs,
+                             learning_rate=args.learning_rate, weight_decay=args.weight_decay,
+                             batch_size=args.batch_size, seed=args.seed, validation=validation)
+
+    output = args.output or os.path.join(settings.models_dir, settings.emotion_lite_model)
+    size = save_model(output, weights, mean, scale)
+    print(f"Wrote {output} ({size / 1024:.0f} KB)")
+
+    report = {
+        'model': output,
+        'model_bytes': size,
+        'hog': list(HOG_PARAMS),
+        'features': int(features.shape[1]),
+        'hidden': args.hidden,
+        'training_crops': int(len(crops)),
+        'augment': args.augment,
+        'class_counts': dict(zip(EMOTION_LABELS, np.bincount(targets.argmax(axis=1), minlength=NUM_EMOTIONS).tolist())),
+        'seed': args.seed,
+        'history': history
+    }
+    if validation is not None:
+        # Evaluate the weights as saved (float16)
+        from emotion_classifiers import LiteClassifier
+        report['validation'] = evaluate(LiteClassifier(output).classify(val_crops), val_labels)
+        print_evaluation(report['validation'])
+
+    report_path = args.report or os.path.splitext(output)[0] + '.report.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {report_path}")
+
+
+if __name__ == "__main__":
+    main()
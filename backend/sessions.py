@@ -0,0 +1,225 @@
+"""
+Per-client detection sessions
+Each session carries its own smoothing histories (the scene and every face in
+it) and rate limiter while the heavy model stays shared in EmotionDetector.
+The registry is bounded by session count and approximate memory, evicts least
+recently used sessions first and drops sessions that have been idle for too
+long.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from config import settings
+from emotion_vectors import NUM_EMOTIONS, EmotionHistory, create_smoother
+from face_histories import FaceHistories
+
+logger = logging.getLogger(__name__)
+
+# Rough per-object costs used for the memory cap
+SESSION_BASE_BYTES = 1024
+HISTORY_ENTRY_BYTES = NUM_EMOTIONS * 4
+
+
+def tracker_bytes() -> int:
+    """Worst-case size of a session's face tracker (one downscaled 4:3 gray frame)"""
+    if not settings.face_tracking:
+        return 0
+    return settings.tracker_max_width * settings.tracker_max_width * 3 // 4
+
+
+def frame_gate_bytes() -> int:
+    """Worst-case size of a session's frame-change gate (reference and pending thumbnails)"""
+    if not settings.frame_gate:
+        return 0
+    return 2 * settings.frame_gate_width * settings.frame_gate_width * 3 // 4
+
+
+class DetectionSession:
+    def __init__(self, session_id: str, smoothing_frames: Optional[int] = None,
+                 detection_interval: Optional[float] = None):
+        self.session_id = session_id
+        # Scene-level emotions, combined from the already smoothed faces
+        self.emotion_history = EmotionHistory(smoothing_frames or settings.emotion_smoothing_frames,
+                                              create_smoother('none'))
+        # Smoothing history of every face in view, by face ID
+        self.face_histories = FaceHistories(smoothing_frames)
+        self.last_detection_time = 0
+        self.detection_interval = detection_interval or 1.0 / settings.detection_fps
+        self.created_at = time.time()
+        self.last_seen = self.created_at
+        self.detections = 0
+        # Faces found in the last detected frame (hint for the cascade face detector)
+        self.last_face_count = 0
+        # Inter-frame face tracker, created by EmotionDetector on first use
+        self.tracker = None
+        # Frame-change gate, created by EmotionDetector on first use
+        self.frame_gate = None
+
+    def touch(self):
+        self.last_seen = time.time()
+
+    def reset(self):
+        self.emotion_history.clear()
+        self.face_histories.reset()
+        self.last_detection_time = 0
+        self.last_face_count = 0
+        if self.tracker is not None:
+            self.tracker.reset()
+        if self.frame_gate is not None:
+            self.frame_gate.reset()
+
+    def approx_bytes(self) -> int:
+        tracker = self.tracker.approx_bytes() if self.tracker is not None else 0
+        gate = self.frame_gate.approx_bytes() if self.frame_gate is not None else 0
+        return (SESSION_BASE_BYTES + self.emotion_history.nbytes + self.face_histories.nbytes
+                + tracker + gate)
+
+    def stats(self) -> Dict:
+        return {
+            'session_id': self.session_id,
+            'history_length': len(self.emotion_history),
+            'tracked_faces': len(self.face_histories),
+            'detections': self.detections,
+            'detection_interval': self.detection_interval,
+            'idle_for': time.time() - self.last_seen,
+            'age': time.time() - self.created_at
+        }
+
+
+class SessionRegistry:
+    def __init__(self, max_sessions: Optional[int] = None,
+                 idle_timeout: Optional[float] = None,
+                 max_memory_mb: Optional[float] = None,
+                 sweep_interval: float = 1.0):
+        self.max_sessions = max_sessions or settings.max_sessions
+        self.idle_timeout = idle_timeout or settings.session_idle_timeout_s
+        memory_mb = max_memory_mb if max_memory_mb is not None else settings.max_session_memory_mb
+        self.max_memory_bytes = int(memory_mb * 1024 * 1024)
+        self.sweep_interval = sweep_interval
+        # Histories are bounded, so the memory cap becomes an O(1) session count cap
+        session_bytes = (SESSION_BASE_BYTES
+                         + (1 + settings.max_faces) * settings.emotion_smoothing_frames * HISTORY_ENTRY_BYTES
+                         + tracker_bytes() + frame_gate_bytes())
+        self.memory_session_limit = max(1, self.max_memory_bytes // session_bytes)
+
+        self._sessions: 'OrderedDict[str, DetectionSession]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+
+        self.created = 0
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+        self.evicted_memory = 0
+
+    def get(self, session_id: str) -> DetectionSession:
+        """Return the session for an ID, creating it if needed, and mark it recently used"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = DetectionSession(session_id)
+                self._sessions[session_id] = session
+                self.created += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.touch()
+
+            self._maybe_sweep()
+            self._enforce_limits(keep=session_id)
+            return session
+
+    def peek(self, session_id: str) -> Optional[DetectionSession]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def release(self, session_id: str):
+        """Forget a session (e.g. when its connection closes)"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        with self._lock:
+            return self._evict_idle(now or time.time())
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._evict_idle(now)
+
+    def _evict_idle(self, now: float) -> int:
+        # Least recently seen sessions come first, so stop at the first active one
+        self._last_sweep = now
+        evicted = 0
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen <= self.idle_timeout:
+                break
+            del self._sessions[session.session_id]
+            evicted += 1
+        self.evicted_idle += evicted
+        return evicted
+
+    def _enforce_limits(self, keep: Optional[str] = None):
+        # Oldest entries come first in the OrderedDict
+        while len(self._sessions) > self.max_sessions:
+            if not self._evict_oldest(keep):
+                break
+            self.evicted_lru += 1
+
+        while len(self._sessions) > self.memory_session_limit:
+            if not self._evict_oldest(keep):
+                break
+            self.evicted_memory += 1
+
+    def _evict_oldest(self, keep: Optional[str]) -> bool:
+        for session_id in self._sessions:
+            if session_id != keep:
+                del self._sessions[session_id]
+                return True
+        return False
+
+    def _memory_bytes(self) -> int:
+        return sum(session.approx_bytes() for session in self._sessions.values())
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return self._memory_bytes()
+
+    def drop_caches(self) -> int:
+        """Free every session's frame-gate thumbnails (memory pressure); returns the sessions touched"""
+        with self._lock:
+            gates = [session.frame_gate for session in self._sessions.values() if session.frame_gate is not None]
+        for gate in gates:
+            gate.reset()
+        return len(gates)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def sessions(self) -> List[DetectionSession]:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'active': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'memory_bytes': self._memory_bytes(),
+                'max_memory_bytes': self.max_memory_bytes,
+                'idle_timeout': self.idle_timeout,
+                'created': self.created,
+                'evicted_lru': self.evicted_lru,
+                'evicted_idle': self.evicted_idle,
+                'evicted_memory': self.evicted_memory
+            }
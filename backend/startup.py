@@ -0,0 +1,91 @@
+"""
+Startup phases and readiness
+The app accepts connections as soon as its cheap parts are up; models are
+loaded and warmed up in the background. StartupTracker times every startup
+phase (logged one by one and as a breakdown once startup finishes) and holds
+the readiness state behind /ready, so healthchecks only route traffic to a
+worker that can actually run inference.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+STARTING = 'starting'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class StartupTracker:
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.status = STARTING
+        self.error: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+        self.total_ms: Optional[float] = None
+        self._ready: Optional[asyncio.Event] = None
+
+    def begin(self):
+        """Bind to the running event loop (call from the lifespan hook)"""
+        self._ready = asyncio.Event()
+        if self.status != STARTING:
+            self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = 1000 * seconds
+        logger.info(f"Startup phase {name}: {1000 * seconds:.0f} ms")
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def _timed(self, name: str, fn: Callable, *args):
+        with self.phase(name):
+            return fn(*args)
+
+    async def run_phase(self, name: str, fn: Callable, *args):
+        """Run a blocking phase on the default executor, off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, self._timed, name, fn, *args)
+
+    def mark_ready(self):
+        self._finish(READY)
+        breakdown = ', '.join(f"{name} {ms:.0f} ms" for name, ms in self.phases.items())
+        logger.info(f"Ready after {self.total_ms:.0f} ms ({breakdown})")
+
+    def mark_failed(self, error: str):
+        self.error = error
+        self._finish(FAILED)
+        logger.error(f"Startup failed after {self.total_ms:.0f} ms: {error}")
+
+    def _finish(self, status: str):
+        self.status = status
+        self.total_ms = 1000 * (time.perf_counter() - self.started_at)
+        if self._ready is not None:
+            self._ready.set()
+
+    async def wait_ready(self) -> bool:
+        """Wait until startup finishes; True if the app is ready, False if startup failed"""
+        if self.status == STARTING and self._ready is not None:
+            await self._ready.wait()
+        return self.ready
+
+    def stats(self) -> Dict:
+        return {
+            'status': self.status,
+            'error': self.error,
+            'elapsed_ms': self.total_ms if self.total_ms is not None
+            else 1000 * (time.perf_counter() - self.started_at),
+            'phases_ms': dict(self.phases)
+        }
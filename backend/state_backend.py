@@ -0,0 +1,282 @@
+"""
+State shared by every worker process serving the app
+With `uvicorn --workers N` each worker is its own process, so the emotion history,
+the music state, the per-worker connection stats and the pub/sub used for room
+messages live behind a StateBackend. InProcessStateBackend keeps everything in
+memory (single worker); SQLiteStateBackend keeps it in a SQLite database in WAL
+mode so all workers on one host see the same state. Its writes can wait on other
+workers' write locks, so async code runs them through call(), which moves them
+off the event loop; reads use a separate connection and never queue behind them.
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from pubsub import InProcessPubSub, PubSub, SQLitePubSub, connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+HISTORY_LIMIT = 100
+
+
+class StateBackend:
+    """Interface for state shared across worker processes"""
+
+    name = "abstract"
+    pubsub: PubSub
+    # Operations may block on I/O or locks held by other processes
+    blocking = False
+
+    def append_history(self, entry: Dict):
+        raise NotImplementedError
+
+    def history(self, limit: int) -> List[Dict]:
+        raise NotImplementedError
+
+    def history_count(self) -> int:
+        raise NotImplementedError
+
+    def get_music_state(self) -> Tuple[int, Optional[Dict]]:
+        """Return (version, state); version 0 means no state was stored yet"""
+        raise NotImplementedError
+
+    def set_music_state(self, state: Dict) -> int:
+        raise NotImplementedError
+
+    def music_version(self) -> int:
+        return self.get_music_state()[0]
+
+    def report_worker(self, worker_id: str, stats: Dict):
+        raise NotImplementedError
+
+    def worker_stats(self, max_age: Optional[float] = None) -> Dict[str, Dict]:
+        raise NotImplementedError
+
+    async def call(self, fn, *args):
+        """Run a state operation from async code, on the default executor if it may block"""
+        if not self.blocking:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def start(self):
+        await self.pubsub.start()
+
+    async def stop(self):
+        await self.pubsub.stop()
+
+
+class InProcessStateBackend(StateBackend):
+    name = "memory"
+
+    def __init__(self):
+        self.pubsub = InProcessPubSub()
+        self._history: List[Dict] = []
+        self._music: Tuple[int, Optional[Dict]] = (0, None)
+        self._workers: Dict[str, Tuple[float, Dict]] = {}
+
+    def append_history(self, entry: Dict):
+        self._history.append(entry)
+        if len(self._history) > HISTORY_LIMIT:
+            self._history.pop(0)
+
+    def history(self, limit: int) -> List[Dict]:
+        return self._history[-limit:]
+
+    def history_count(self) -> int:
+        return len(self._history)
+
+    def get_music_state(self) -> Tuple[int, Optional[Dict]]:
+        return self._music
+
+    def set_music_state(self, state: Dict) -> int:
+        version = self._music[0] + 1
+        self._music = (version, copy.deepcopy(state))
+        return version
+
+    def music_version(self) -> int:
+        return self._music[0]
+
+    def report_worker(self, worker_id: str, stats: Dict):
+        self._workers[worker_id] = (time.time(), stats)
+
+    def worker_stats(self, max_age: Optional[float] = None) -> Dict[str, Dict]:
+        cutoff = time.time() - (max_age or 5 * settings.worker_report_interval_s)
+        return {worker: stats for worker, (updated, stats) in self._workers.items() if updated >= cutoff}
+
+
+class SQLiteStateBackend(StateBackend):
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.state_db_path
+        self.pubsub = SQLitePubSub(self.path)
+        # Writes get their own connection: while one waits for another worker's
+        # write lock, reads (WAL snapshots, never blocked by writers) can go ahead
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(self.path)
+        self._write_lock = threading.Lock()
+        self._writer = connect_sqlite(self.path)
+        with self._write_lock:
+            self._writer.executescript(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, entry TEXT NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS kv ("
+                "key TEXT PRIMARY KEY, version INTEGER NOT NULL, value TEXT NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS workers ("
+                "worker_id TEXT PRIMARY KEY, updated REAL NOT NULL, stats TEXT NOT NULL);"
+            )
+
+    def append_history(self, entry: Dict):
+        with self._write_lock, self._transaction():
+            cursor = self._writer.execute("INSERT INTO history (entry) VALUES (?)", (json.dumps(entry),))
+            self._writer.execute("DELETE FROM history WHERE id <= ?", (cursor.lastrowid - HISTORY_LIMIT,))
+
+    def history(self, limit: int) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT entry FROM history ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [json.loads(entry) for (entry,) in reversed(rows)]
+
+    def history_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def get_music_state(self) -> Tuple[int, Optional[Dict]]:
+        with self._lock:
+            row = self._conn.execute("SELECT version, value FROM kv WHERE key = 'music'").fetchone()
+        if row is None:
+            return 0, None
+        return row[0], json.loads(row[1])
+
+    def set_music_state(self, state: Dict) -> int:
+        with self._write_lock, self._transaction():
+            self._writer.execute(
+                "INSERT INTO kv (key, version, value) VALUES ('music', 1, ?) "
+                "ON CONFLICT(key) DO UPDATE SET version = version + 1, value = excluded.value",
+                (json.dumps(state),)
+            )
+            return self._writer.execute("SELECT version FROM kv WHERE key = 'music'").fetchone()[0]
+
+    def music_version(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM kv WHERE key = 'music'").fetchone()
+        return row[0] if row else 0
+
+    def report_worker(self, worker_id: str, stats: Dict):
+        with self._write_lock:
+            self._writer.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, updated, stats) VALUES (?, ?, ?)",
+                (worker_id, time.time(), json.dumps(stats))
+            )
+
+    def worker_stats(self, max_age: Optional[float] = None) -> Dict[str, Dict]:
+        cutoff = time.time() - (max_age or 5 * settings.worker_report_interval_s)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT worker_id, stats FROM workers WHERE updated >= ?", (cutoff,)
+            ).fetchall()
+        return {worker: json.loads(stats) for worker, stats in rows}
+
+    async def stop(self):
+        await super().stop()
+        with self._lock:
+            self._conn.close()
+        with self._write_lock:
+            self._writer.close()
+
+    @contextmanager
+    def _transaction(self):
+        self._writer.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except Exception:
+            self._writer.execute("ROLLBACK")
+            raise
+        self._writer.execute("COMMIT")
+
+
+class SharedMusicState:
+    """
+    Keeps this worker's MusicGenerator in step with the shared music state
+
+    Wrap every change to the generator in `async with change()`: it first loads
+    state written by other workers, then stores the result for them if the change
+    altered it (so a no-op doesn't bump the version every worker polls). Changes
+    are serialized, so coroutines of one worker can't interleave their loads and
+    stores and lose each other's updates. current() and version() may block on a
+    shared backend; async code runs them through backend.call().
+    """
+
+    def __init__(self, backend: StateBackend, get_generator):
+        self.backend = backend
+        self.get_generator = get_generator
+        self._loaded_version = 0
+        # Created on first use so it belongs to the running event loop
+        self._lock: Optional[asyncio.Lock] = None
+
+    def pull(self):
+        generator = self.get_generator()
+        # The version alone tells whether there is anything to load
+        if generator is None or self.backend.music_version() == self._loaded_version:
+            return
+        version, state = self.backend.get_music_state()
+        if state is not None:
+            generator.load_state(state)
+            self._loaded_version = version
+
+    def push(self):
+        generator = self.get_generator()
+        if generator is not None:
+            self._loaded_version = self.backend.set_music_state(generator.get_current_state())
+
+    @asynccontextmanager
+    async def change(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await self.backend.call(self.pull)
+            before = self._state()
+            yield
+            if self._state() != before:
+                await self.backend.call(self.push)
+
+    def _state(self) -> Optional[Dict]:
+        generator = self.get_generator()
+        # Deep copy: the generator updates nested dicts such as params in place
+        return copy.deepcopy(generator.get_current_state()) if generator is not None else None
+
+    def current(self) -> Dict:
+        """Latest music state from any worker"""
+        version, state = self.backend.get_music_state()
+        if state is None:
+            generator = self.get_generator()
+            # Empty until the music tracks have loaded at startup
+            return generator.get_current_state() if generator is not None else {}
+        return state
+
+    def version(self) -> int:
+        return self.backend.music_version()
+
+
+def worker_id() -> str:
+    return str(os.getpid())
+
+
+def create_state_backend() -> StateBackend:
+    """Build the backend selected by settings.state_backend"""
+    if settings.state_backend == "sqlite":
+        logger.info(f"Using shared SQLite state at {settings.state_db_path}")
+        return SQLiteStateBackend()
+    if settings.state_backend != "memory":
+        logger.warning(f"Unknown state backend {settings.state_backend!r}, using in-process state")
+    return InProcessStateBackend()
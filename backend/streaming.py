@@ -0,0 +1,34 @@
+"""
+Line formats for streamed HTTP responses
+NDJSON (one JSON document per line) for programmatic consumers and Server-Sent
+Events for browsers (EventSource) and dashboards.
+"""
+
+import json
+from typing import Dict, Optional, Union
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# Headers that keep proxies such as nginx from buffering a stream
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
+
+
+def ndjson_line(data: Dict) -> str:
+    return json.dumps(data, separators=(',', ':')) + "\n"
+
+
+def sse_event(data: Union[Dict, str], event: Optional[str] = None, event_id: Optional[Union[int, str]] = None) -> str:
+    """Format one Server-Sent Event; dict data is sent as compact JSON"""
+    if not isinstance(data, str):
+        data = json.dumps(data, separators=(',', ':'))
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
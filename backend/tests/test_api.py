@@ -3,6 +3,7 @@ from fastapi.testclient import TestClient
 import sys
 import os
 import json
+import time
 import base64
 import numpy as np
 from PIL import Image
@@ -13,9 +14,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import app
 
 class TestAPI:
-    @pytest.fixture
+    @pytest.fixture(scope="class")
     def client(self):
-        return TestClient(app)
+        # Runs the lifespan; models load in the background until /ready says so
+        with TestClient(app) as client:
+            deadline = time.time() + 120
+            while client.get("/ready").status_code == 503 and time.time() < deadline:
+                time.sleep(0.1)
+            yield client
     
     @pytest.fixture
     def test_image(self):
@@ -41,6 +47,13 @@ class TestAPI:
         assert "emotion_detector" in data
         assert "music_generator" in data
     
+    def test_ready_reports_startup(self, client):
+        response = client.get("/ready")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "ready"
+        assert {"imports", "emotion_models", "warm_up", "music_tracks"} <= set(data["phases_ms"])
+    
     def test_emotion_detection_endpoint(self, client, test_image):
         response = client.post(
             "/api/emotion",
@@ -52,12 +65,49 @@ class TestAPI:
         assert "emotions" in data
         assert "dominant_emotion" in data
     
+    def test_emotion_detection_different_images_back_to_back(self, client):
+        with open(os.path.join(os.path.dirname(__file__), 'data', 'astronaut_face.jpg'), 'rb') as f:
+            face = f.read()
+        noise = io.BytesIO()
+        Image.fromarray(np.random.default_rng(17).integers(0, 255, (240, 320, 3), dtype=np.uint8)).save(noise, format='PNG')
+        noise = noise.getvalue()
+
+        first, second, again = (
+            client.post("/api/emotion", files={"file": ("test.png", upload, "image/png")}).json()
+            for upload in (face, noise, face)
+        )
+
+        assert first['dominant_emotion'] == 'happy' and first['num_faces'] == 1
+        # The second image is detected on its own, not answered with the first one's result
+        assert not second.get('cached')
+        assert second['num_faces'] == 0
+        assert second['emotions'] != first['emotions']
+        # Re-submitting an image is answered from the cache with that image's own result
+        assert again['cached'] is True
+        assert again['emotions'] == first['emotions']
+
     def test_emotion_detection_invalid_file(self, client):
         response = client.post(
             "/api/emotion",
             files={"file": ("test.txt", b"not an image", "text/plain")}
         )
-        assert response.status_code == 400 or response.status_code == 500
+        assert response.status_code == 400
+    
+    @pytest.mark.parametrize("error", ["full", "dropped"])
+    def test_emotion_detection_busy_pipeline(self, client, test_image, monkeypatch, error):
+        import app as app_module
+        from pipeline import FrameDropped, PipelineFull
+
+        async def submit(*args, **kwargs):
+            raise PipelineFull("detect queue is full") if error == "full" else FrameDropped()
+        monkeypatch.setattr(app_module.pipeline, "submit", submit)
+
+        response = client.post(
+            "/api/emotion",
+            files={"file": ("test.jpg", test_image, "image/jpeg")}
+        )
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
     
     def test_music_control_endpoint(self, client):
         response = client.get("/api/music/control")
@@ -104,6 +154,49 @@ class TestAPI:
                 # Timeout is acceptable for invalid image
                 pass
     
+    def test_websocket_binary_negotiation(self, client):
+        with client.websocket_connect("/ws") as websocket:
+            # Music state snapshot and target frame rate sent on connect
+            assert websocket.receive_json()["type"] == "music_update"
+            assert websocket.receive_json()["type"] == "rate"
+            websocket.send_text(json.dumps({"type": "hello", "protocol": "binary"}))
+            data = websocket.receive_json()
+            assert data["type"] == "hello"
+            assert data["protocol"] == "binary"
+            assert data["header_size"] == 16
+
+    def test_websocket_binary_frame_without_hello(self, client):
+        from frame_protocol import pack_frame
+
+        with client.websocket_connect("/ws") as websocket:
+            # Music state snapshot and target frame rate sent on connect
+            assert websocket.receive_json()["type"] == "music_update"
+            assert websocket.receive_json()["type"] == "rate"
+            websocket.send_bytes(pack_frame(b"\xff\xd8", seq=1, client_ts=0.0))
+            data = websocket.receive_json()
+            assert data["type"] == "error"
+
+    def test_websocket_frame_rate(self, client):
+        with client.websocket_connect("/ws") as websocket:
+            assert websocket.receive_json()["type"] == "music_update"
+            assert websocket.receive_json() == {"type": "rate", "fps": 15}
+            # A client capturing slower than the default caps its own share
+            websocket.send_text(json.dumps({"type": "hello", "max_fps": 5}))
+            assert websocket.receive_json()["type"] == "hello"
+            assert websocket.receive_json() == {"type": "rate", "fps": 5}
+
+    def test_websocket_ingest_stats(self, client):
+        with client.websocket_connect("/ws") as websocket:
+            # Music state snapshot and target frame rate sent on connect
+            assert websocket.receive_json()["type"] == "music_update"
+            assert websocket.receive_json()["type"] == "rate"
+            websocket.send_text(json.dumps({"type": "control", "action": "get_stats"}))
+            data = websocket.receive_json()
+            assert data["type"] == "ingest_stats"
+            assert "received" in data["data"]
+            assert "dropped" in data["data"]
+            assert "processed" in data["data"]
+
     def test_websocket_control_messages(self, client):
         with client.websocket_connect("/ws") as websocket:
             # Test volume control
@@ -0,0 +1,109 @@
+import pytest
+import threading
+import time
+import numpy as np
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_scheduler import MicroBatchScheduler
+
+def row_sum_classifier(calls):
+    def classify(crops):
+        calls.append(len(crops))
+        # One row per crop; column 0 identifies the crop it came from
+        out = np.zeros((len(crops), 7), dtype=np.float32)
+        out[:, 0] = crops.reshape(len(crops), -1)[:, 0]
+        return out
+    return classify
+
+class TestMicroBatchScheduler:
+    def test_routes_results_back_to_each_request(self):
+        calls = []
+        scheduler = MicroBatchScheduler(row_sum_classifier(calls), max_batch_size=16,
+                                        max_delay_ms=50, expected_producers=3)
+        results = {}
+
+        def producer(value, faces):
+            crops = np.full((faces, 4, 4), value, dtype=np.float32)
+            results[value] = scheduler.classify(crops)
+
+        threads = [threading.Thread(target=producer, args=(v, n)) for v, n in ((1, 1), (2, 3), (3, 2))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        scheduler.close()
+
+        # All three frames were classified together in one batch
+        assert calls == [6]
+        for value, faces in ((1, 1), (2, 3), (3, 2)):
+            assert results[value].shape == (faces, 7)
+            assert np.all(results[value][:, 0] == value)
+
+    def test_flushes_when_full(self):
+        calls = []
+        scheduler = MicroBatchScheduler(row_sum_classifier(calls), max_batch_size=2,
+                                        max_delay_ms=10000, expected_producers=100)
+        futures = [scheduler.submit(np.zeros((1, 4, 4), dtype=np.float32)) for _ in range(4)]
+        for future in futures:
+            future.result(timeout=2)
+        scheduler.close()
+
+        assert calls == [2, 2]
+        assert scheduler.stats()['flush_reasons']['full'] == 2
+
+    def test_flushes_on_deadline(self):
+        calls = []
+        scheduler = MicroBatchScheduler(row_sum_classifier(calls), max_batch_size=16,
+                                        max_delay_ms=20, expected_producers=100)
+        started = time.perf_counter()
+        scheduler.classify(np.zeros((1, 4, 4), dtype=np.float32))
+        waited = time.perf_counter() - started
+        scheduler.close()
+
+        assert 0.015 <= waited < 1.0
+        assert scheduler.stats()['flush_reasons']['deadline'] == 1
+
+    def test_single_producer_does_not_wait(self):
+        calls = []
+        scheduler = MicroBatchScheduler(row_sum_classifier(calls), max_batch_size=16,
+                                        max_delay_ms=5000, expected_producers=1)
+        started = time.perf_counter()
+        scheduler.classify(np.zeros((2, 4, 4), dtype=np.float32))
+        assert time.perf_counter() - started < 1.0
+        scheduler.close()
+
+    def test_waits_for_producers_in_flight(self):
+        calls = []
+        scheduler = MicroBatchScheduler(row_sum_classifier(calls), max_batch_size=16, max_delay_ms=5000)
+        with scheduler.producing():
+            with scheduler.producing():
+                future = scheduler.submit(np.full((1, 4, 4), 1, dtype=np.float32))
+                time.sleep(0.05)
+                # The other producer may still submit, so the batch stays open
+                assert not future.done()
+            # It left without submitting; nobody else can join now
+            assert future.result(timeout=1).shape == (1, 7)
+        scheduler.close()
+
+        assert calls == [1]
+        assert scheduler.stats()['flush_reasons']['producers'] == 1
+        assert scheduler.stats()['producers_in_flight'] == 0
+
+    def test_empty_request(self):
+        scheduler = MicroBatchScheduler(row_sum_classifier([]), max_batch_size=4, max_delay_ms=0)
+        assert scheduler.classify(np.zeros((0, 4, 4), dtype=np.float32)).shape == (0, 7)
+        scheduler.close()
+
+    def test_errors_propagate_to_every_request(self):
+        def failing(crops):
+            raise RuntimeError("model exploded")
+
+        scheduler = MicroBatchScheduler(failing, max_batch_size=4, max_delay_ms=0)
+        with pytest.raises(RuntimeError):
+            scheduler.classify(np.zeros((1, 4, 4), dtype=np.float32))
+        scheduler.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,162 @@
+import pytest
+import asyncio
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import ConnectionManager, ClientChannel, SLOW_CONSUMER_CLOSE_CODE
+from frame_ingest import FrameIngest
+from frame_protocol import unpack_result
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(payload)
+
+    async def send_bytes(self, payload):
+        self.sent.append(payload)
+
+    async def close(self, code=1000, reason=None):
+        self.closed_with = code
+
+class TestConnectionManager:
+    @pytest.mark.asyncio
+    async def test_broadcast_serializes_once(self):
+        manager = ConnectionManager()
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(first)
+        await manager.connect(second)
+
+        await manager.broadcast({'type': 'music_update', 'data': {'volume': 0.5}})
+        await asyncio.sleep(0.01)
+
+        assert json.loads(first.sent[0]) == {'type': 'music_update', 'data': {'volume': 0.5}}
+        # Both clients got the very same serialized payload
+        assert first.sent[0] is second.sent[0]
+
+    @pytest.mark.asyncio
+    async def test_slow_client_does_not_delay_others(self):
+        manager = ConnectionManager()
+        slow, fast = FakeWebSocket(delay=10), FakeWebSocket()
+        await manager.connect(slow)
+        await manager.connect(fast)
+
+        for i in range(5):
+            await manager.broadcast({'seq': i})
+        await asyncio.sleep(0.01)
+
+        assert len(fast.sent) == 5
+        assert slow.sent == []
+        manager.disconnect(slow)
+        manager.disconnect(fast)
+
+    @pytest.mark.asyncio
+    async def test_slow_consumer_evicted_when_queue_full(self):
+        slow = FakeWebSocket(delay=10)
+        channel = ClientChannel(slow, FrameIngest(), max_queue=3, max_lag_ms=60000)
+        channel.start()
+        await asyncio.sleep(0)
+
+        results = [channel.enqueue(str(i)) for i in range(6)]
+        await asyncio.sleep(0.01)
+
+        assert results == [True, True, True, False, False, False]
+        assert channel.closed
+        assert slow.closed_with == SLOW_CONSUMER_CLOSE_CODE
+
+    @pytest.mark.asyncio
+    async def test_lagging_consumer_evicted(self):
+        slow = FakeWebSocket(delay=10)
+        channel = ClientChannel(slow, FrameIngest(), max_queue=100, max_lag_ms=20)
+        channel.start()
+        await asyncio.sleep(0)
+
+        channel.enqueue("a")
+        channel.enqueue("b")
+        await asyncio.sleep(0.05)
+        assert channel.enqueue("c") is False
+        assert channel.close_reason == "lagging behind"
+
+    @pytest.mark.asyncio
+    async def test_send_stats(self):
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        ingest = await manager.connect(websocket)
+        await manager.send_personal(websocket, {'type': 'hello'})
+        await asyncio.sleep(0.01)
+
+        stats = manager.send_stats()['connections'][ingest.connection_id]
+        assert stats['sent'] == 1
+        assert stats['queue_depth'] == 0
+        assert stats['bytes_sent'] > 0
+
+    @pytest.mark.asyncio
+    async def test_room_publish_is_scoped(self):
+        manager = ConnectionManager()
+        lobby, stage, moved = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(lobby)
+        await manager.connect(stage, room="stage")
+        await manager.connect(moved)
+        manager.join(moved, "stage")
+
+        await manager.publish("stage", {'type': 'music_update'})
+        await asyncio.sleep(0.01)
+
+        assert lobby.sent == []
+        assert len(stage.sent) == 1
+        assert len(moved.sent) == 1
+        assert manager.room_stats() == {'lobby': 1, 'stage': 2}
+
+    @pytest.mark.asyncio
+    async def test_empty_rooms_are_unsubscribed(self):
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, room="solo")
+        assert manager.room_of(websocket) == "solo"
+
+        manager.disconnect(websocket)
+        assert manager.room_stats() == {}
+        assert manager.pubsub.topics() == []
+
+    @pytest.mark.asyncio
+    async def test_disconnect_is_idempotent(self):
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        manager.disconnect(websocket)
+        manager.disconnect(websocket)
+        assert manager.active_connections == []
+        assert await manager.send_personal(websocket, {'type': 'hello'}) is False
+
+    @pytest.mark.asyncio
+    async def test_results_encoded_per_negotiated_encoding(self):
+        manager = ConnectionManager()
+        text, compact = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(text)
+        await manager.connect(compact)
+        manager.set_encoding(compact, 'binary')
+
+        result = {'success': True, 'emotions': {'happy': 1.0}, 'dominant_emotion': 'happy',
+                  'confidence': 1.0, 'faces': [], 'timestamp': 1.0}
+        await manager.publish("lobby", {'type': 'emotion_update', 'data': result})
+        await manager.publish("lobby", {'type': 'music_update', 'full': True})
+        await asyncio.sleep(0.01)
+
+        assert [json.loads(p)['type'] for p in text.sent] == ['emotion_update', 'music_update']
+        assert isinstance(compact.sent[0], bytes)
+        assert unpack_result(compact.sent[0])['data']['dominant_emotion'] == 'happy'
+        # Messages without a compact form still go out as JSON
+        assert json.loads(compact.sent[1])['type'] == 'music_update'
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,277 @@
+import pytest
+import importlib.util
+import subprocess
+import numpy as np
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emotion_classifiers import (FerClassifier, LiteClassifier, OpenCVClassifier, TFLiteClassifier,
+                                 create_emotion_classifier, pad, preprocess_faces, tosquare)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# A real smiling face (see tests/data/README.md)
+REAL_FACE = os.path.join(BACKEND_DIR, 'tests', 'data', 'astronaut_face.jpg')
+
+def load_export_script(name='export_emotion_model'):
+    path = os.path.join(BACKEND_DIR, 'scripts', f'{name}.py')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class TestEmotionClassifiers:
+    @pytest.fixture(scope="class")
+    def fer_classifier(self):
+        return FerClassifier()
+
+    @pytest.fixture(scope="class")
+    def frozen_model(self, fer_classifier, tmp_path_factory):
+        path = str(tmp_path_factory.mktemp("models") / "emotion_model.pb")
+        export = load_export_script()
+        export.export_frozen_graph(export.load_keras_model(), path)
+        return path
+
+    @pytest.fixture
+    def crops(self):
+        frame = np.random.RandomState(0).randint(0, 255, (240, 320, 3), dtype=np.uint8)
+        crops, kept = preprocess_faces(frame, [[40, 40, 80, 100], [200, 100, 60, 60]], (64, 64))
+        assert kept == [[40, 40, 80, 100], [200, 100, 60, 60]]
+        return crops
+
+    def test_preprocessing_matches_fer(self):
+        from fer import FER
+        gray = np.random.RandomState(1).randint(0, 255, (120, 160), dtype=np.uint8)
+        assert np.array_equal(pad(gray), FER.pad(gray))
+        for box in ([0, 0, 40, 60], [10, 10, 60, 40], [5, 5, 30, 30]):
+            assert tosquare(box) == FER.tosquare(box)
+
+    def test_opencv_matches_fer(self, fer_classifier, frozen_model, crops):
+        classifier = OpenCVClassifier(frozen_model, threads=1)
+        ours = classifier.classify(crops)
+
+        assert ours.shape == (2, 7) and ours.dtype == np.float32
+        assert np.allclose(ours, fer_classifier.classify(crops), atol=1e-4)
+        assert classifier.stats()['crops'] == 2
+
+    def test_empty_batch(self, frozen_model):
+        classifier = OpenCVClassifier(frozen_model)
+        assert classifier.classify(np.zeros((0, 64, 64), dtype=np.float32)).shape == (0, 7)
+        assert classifier.calls == 0
+
+    def test_warm_up(self, frozen_model):
+        classifier = OpenCVClassifier(frozen_model)
+        classifier.warm_up(runs=2)
+        assert classifier.warmup_ms > 0
+        # Warm-up runs are not counted as traffic
+        assert classifier.calls == 0
+
+    def test_missing_model(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            OpenCVClassifier(str(tmp_path / "missing.onnx"))
+
+    def test_onnx_falls_back_to_opencv(self, frozen_model, monkeypatch):
+        from config import settings
+        monkeypatch.setattr(settings, 'emotion_model', frozen_model)
+        monkeypatch.setitem(sys.modules, 'onnxruntime', None)
+        classifier = create_emotion_classifier('onnx', warm_up=False)
+        assert classifier.name == 'opencv'
+
+    def test_opencv_backend_does_not_import_tensorflow(self, frozen_model):
+        env = dict(os.environ, EMOTION_BACKEND='opencv', EMOTION_MODEL=frozen_model, FACE_DETECTOR='haar')
+        code = ("import sys; from emotion_detector import EmotionDetector; EmotionDetector(); "
+                "print('tensorflow' in sys.modules)")
+        output = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        assert output.strip() == 'False'
+
+class TestInt8Classifier:
+    @pytest.fixture(scope="class")
+    def quantize_script(self):
+        return load_export_script('quantize_emotion_model')
+
+    @pytest.fixture(scope="class")
+    def int8_model(self, quantize_script, tmp_path_factory):
+        path = str(tmp_path_factory.mktemp("models") / "emotion_model.int8.tflite")
+        calibration = np.random.RandomState(0).uniform(-1, 1, (16, 64, 64)).astype(np.float32)
+        quantize_script.quantize(quantize_script.load_keras_model(), calibration, path)
+        return path
+
+    @pytest.fixture
+    def crops(self):
+        return np.random.RandomState(1).uniform(-1, 1, (5, 64, 64)).astype(np.float32)
+
+    def test_int8_close_to_fer(self, int8_model, crops):
+        classifier = TFLiteClassifier(int8_model, threads=1)
+        ours = classifier.classify(crops)
+
+        assert classifier.input_size == (64, 64)
+        assert ours.shape == (5, 7) and ours.dtype == np.float32
+        assert np.allclose(ours.sum(axis=1), 1.0, atol=0.02)
+        assert np.abs(ours - FerClassifier(threads=1).classify(crops)).mean() < 0.05
+
+    def test_batches_are_padded_to_powers_of_two(self, int8_model, crops):
+        classifier = TFLiteClassifier(int8_model, threads=1)
+        batched = classifier.classify(crops)
+        single = np.concatenate([classifier.classify(crops[i:i + 1]) for i in range(len(crops))])
+
+        # Zero padding doesn't leak into the real crops' scores
+        assert np.allclose(batched, single, atol=1e-6)
+        assert sorted(classifier.interpreters) == [1, 8]
+        classifier.classify(crops[:3])
+        assert sorted(classifier.interpreters) == [1, 4, 8]
+
+    def test_compare_report(self, quantize_script):
+        reference = np.eye(7, dtype=np.float32)[[3, 3, 6, 0]]
+        quantized = np.eye(7, dtype=np.float32)[[3, 4, 6, 0]]
+        report = quantize_script.compare(reference, quantized, labels=[3, 3, -1, 1])
+
+        assert report['top1_agreement'] == 0.75
+        assert report['per_class']['happy'] == {'support': 2, 'agreement': 0.5}
+        assert report['per_class']['fear'] == {'support': 0, 'agreement': None}
+        assert report['confusion'][3][4] == 1
+        assert report['label_accuracy'] == {'float': 2 / 3, 'int8': 1 / 3, 'labelled': 3}
+
+    def test_int8_backend_does_not_import_tensorflow(self, int8_model):
+        env = dict(os.environ, EMOTION_BACKEND='int8', EMOTION_INT8_MODEL=int8_model, FACE_DETECTOR='haar')
+        code = ("import sys; from emotion_detector import EmotionDetector; "
+                "print(EmotionDetector().classifier.name, 'tensorflow' in sys.modules)")
+        output = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        assert output.strip().splitlines()[-1] == 'int8 False'
+
+def synthetic_face(emotion, rng, size=96):
+    """A drawn face whose mouth shows the emotion: smile, frown or open"""
+    import cv2
+    image = np.full((size, size), rng.integers(90, 140), np.uint8)
+    cx, cy = (size // 2 + rng.integers(-3, 4, 2)).tolist()
+    cv2.ellipse(image, (cx, cy), (30, 38), 0, 0, 360, int(rng.integers(170, 220)), -1)
+    for dx in (-12, 12):
+        cv2.circle(image, (cx + dx, cy - 10), 4, 40, -1)
+    if emotion == 'happy':
+        cv2.ellipse(image, (cx, cy + 14), (14, 8), 0, 0, 180, 40, 3)
+    elif emotion == 'sad':
+        cv2.ellipse(image, (cx, cy + 22), (14, 8), 0, 180, 360, 40, 3)
+    else:
+        cv2.circle(image, (cx, cy + 14), 7, 40, -1)
+    image = cv2.add(image, rng.normal(0, 8, image.shape).clip(0, 255).astype(np.uint8))
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+class TestLiteClassifier:
+    EMOTIONS = {'happy': 3, 'sad': 4, 'surprise': 5}
+
+    @pytest.fixture(scope="class")
+    def train_script(self):
+        return load_export_script('train_lite_emotion_model')
+
+    @pytest.fixture(scope="class")
+    def dataset(self):
+        rng = np.random.default_rng(0)
+        crops, labels = [], []
+        for _ in range(40):
+            for emotion, label in self.EMOTIONS.items():
+                face, _ = preprocess_faces(synthetic_face(emotion, rng), [[0, 0, 96, 96]], (64, 64))
+                crops.append(face[0])
+                labels.append(label)
+        return np.stack(crops), np.array(labels)
+
+    @pytest.fixture(scope="class")
+    def lite_model(self, train_script, dataset, tmp_path_factory):
+        crops, labels = dataset
+        hog = train_script.hog_descriptor(train_script.HOG_PARAMS)
+        features = train_script.hog_features(crops[:90], hog)
+        mean, scale = train_script.standardization(features)
+        weights, history = train_script.train((features - mean) / scale, train_script.one_hot(labels[:90]),
+                                              hidden=16, epochs=30, batch_size=32, log=lambda line: None)
+        assert history[-1]['loss'] < history[0]['loss']
+        path = str(tmp_path_factory.mktemp("models") / "emotion_lite.npz")
+        train_script.save_model(path, weights, mean, scale)
+        return path
+
+    def test_lite_classifies_held_out_faces(self, lite_model, dataset):
+        crops, labels = dataset
+        classifier = LiteClassifier(lite_model, threads=1)
+        predictions = classifier.classify(crops[90:])
+
+        assert classifier.input_size == (64, 64)
+        assert predictions.shape == (30, 7) and predictions.dtype == np.float32
+        assert np.allclose(predictions.sum(axis=1), 1.0, atol=1e-5)
+        assert (predictions.argmax(axis=1) == labels[90:]).mean() >= 0.9
+
+    def test_model_is_compact(self, lite_model):
+        with np.load(lite_model) as model:
+            assert model['w0'].dtype == np.float16
+            assert model['w0'].shape == (1764, 16)
+        assert os.path.getsize(lite_model) < 100 * 1024
+
+    def test_rejects_other_label_order(self, lite_model, tmp_path):
+        with np.load(lite_model) as model:
+            arrays = dict(model)
+        arrays['labels'] = arrays['labels'][::-1]
+        path = str(tmp_path / "reversed.npz")
+        np.savez(path, **arrays)
+        with pytest.raises(ValueError):
+            LiteClassifier(path)
+
+    def test_missing_model(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            LiteClassifier(str(tmp_path / "missing.npz"))
+
+    def test_evaluate_report(self, train_script):
+        probabilities = np.eye(7, dtype=np.float32)[[3, 4, 4, 6]]
+        report = train_script.evaluate(probabilities, np.array([3, 4, 3, 6]))
+
+        assert report['accuracy'] == 0.75
+        assert report['per_class']['happy'] == {'support': 2, 'recall': 0.5}
+        assert report['per_class']['angry'] == {'support': 0, 'recall': None}
+        assert report['confusion'][3][4] == 1
+
+    def test_lite_detector_does_not_import_tensorflow(self, lite_model):
+        env = dict(os.environ, EMOTION_LITE_MODEL=lite_model)
+        code = ("import sys; from emotion_detector_simple import EmotionDetector; "
+                "print(EmotionDetector().classifier.name, 'tensorflow' in sys.modules)")
+        output = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        assert output.strip().splitlines()[-1] == 'lite False'
+
+    def test_lite_detector_scores_faces(self, lite_model):
+        from emotion_detector_simple import EmotionDetector
+
+        detector = EmotionDetector(lite_model)
+        frame = synthetic_face('happy', np.random.default_rng(5), size=240)
+        scores = detector._classify_faces(frame, [[72, 72, 96, 96]])
+        assert scores.shape == (1, 7)
+        assert int(scores[0].argmax()) == self.EMOTIONS['happy']
+
+    def test_lite_detector_without_model_reports_demo_scores(self, tmp_path):
+        import cv2
+        from emotion_detector_simple import EmotionDetector
+
+        detector = EmotionDetector(str(tmp_path / "missing.npz"))
+        assert detector.classifier is None
+        frame = cv2.imread(REAL_FACE)
+        result = detector.detect_emotions(frame)
+
+        # The real face is found and scored, not answered with constant neutral, and flagged as fake
+        assert result['success'] and result['num_faces'] == 1
+        assert result['demo'] is True
+        scores = detector._classify_faces(frame, [face['box'] for face in result['faces']] * 2)
+        assert scores.shape == (2, 7)
+        assert np.allclose(scores.sum(axis=1), 1.0, atol=1e-5)
+        assert not np.allclose(scores[0], scores[1])
+        assert detector.get_emotion_stats()['classifier'] is None
+
+    def test_trained_model_on_real_face(self):
+        import cv2
+        from emotion_detector_simple import EmotionDetector
+
+        detector = EmotionDetector()
+        result = detector.detect_emotions(cv2.imread(REAL_FACE))
+        # Smiling astronaut (not in the training set), which the fer model scores as happy
+        assert detector.classifier is not None
+        assert result['num_faces'] == 1
+        assert result['dominant_emotion'] == 'happy'
+        assert 'demo' not in result
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -96,6 +96,127 @@ class TestEmotionDetector:
         assert 'current_emotions' in stats
         assert 'detection_fps' in stats
     
+    def test_sessions_rate_limit_independently(self, detector, test_frame):
+        from sessions import DetectionSession
+
+        first = DetectionSession("first", detection_interval=60.0)
+        second = DetectionSession("second")
+
+        detector.detect_emotions(test_frame, first)
+        # A busy session does not rate-limit another one
+        assert detector.time_until_next_detection(first) > 0
+        assert detector.time_until_next_detection(second) == 0
+        assert first.last_detection_time > 0
+        assert second.last_detection_time == 0
+        assert detector.last_detection_time == 0
+
+    def test_face_crops_match_fer(self, detector, test_frame):
+        boxes = [[100, 100, 120, 150], [0, 0, 50, 50]]
+        crops, kept = detector._face_crops(test_frame, boxes)
+        assert crops.shape == (2,) + detector.emotion_target_size
+        assert kept == boxes
+
+        # Batched classification gives the same scores as FER's own pipeline
+        ours = detector._classify_batch(crops)
+        reference = detector.detector.detect_emotions(test_frame, face_rectangles=boxes)
+        for scores, face in zip(ours, reference):
+            expected = [face['emotions'][label] for label in detector.EMOTION_LABELS]
+            assert np.allclose(np.round(scores, 2), expected, atol=0.011)
+
+    def test_detect_emotions_batch_is_stateless(self, detector, test_frame):
+        results = detector.detect_emotions_batch([test_frame, None, test_frame])
+
+        assert len(results) == 3
+        assert results[1]['success'] is False
+        assert results[0]['emotions'] == results[2]['emotions']
+        # No smoothing history or rate limiting on the batch path
+        assert len(detector.emotion_history) == 0
+        assert detector.last_detection_time == 0
+
+    def test_concurrent_sessions_share_a_batch(self, detector, test_frame):
+        import threading
+        from face_detectors import FaceDetectorBackend
+        from sessions import DetectionSession
+
+        class BarrierDetector(FaceDetectorBackend):
+            """One fixed face, found only once both sessions are detecting"""
+            name = 'barrier'
+            def __init__(self):
+                self.barrier = threading.Barrier(2)
+                super().__init__()
+
+            def _detect(self, frame, had_faces):
+                self.barrier.wait(timeout=5)
+                return [([200, 120, 160, 160], 0.99)]
+
+        detector.face_detector = BarrierDetector()
+        batch_sizes = []
+        classify = detector.classifier.classify
+        detector.classifier.classify = lambda crops: batch_sizes.append(len(crops)) or classify(crops)
+
+        results = {}
+        def run(name):
+            results[name] = detector.detect_emotions(test_frame, DetectionSession(name))
+        threads = [threading.Thread(target=run, args=(name,)) for name in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results['a']['success'] and results['b']['success']
+        assert batch_sizes == [2]
+        assert detector.batcher.stats()['flush_reasons']['producers'] == 1
+
+    def test_detect_emotions_batch_uses_batcher(self, detector, test_frame):
+        detector.face_detector.find_faces = lambda frame, had_faces=False: [[200, 120, 160, 160]]
+        requests = detector.batcher.stats()['requests']
+        results = detector.detect_emotions_batch([test_frame, test_frame])
+
+        assert [result['num_faces'] for result in results] == [1, 1]
+        # Both images' crops went to the micro-batcher as one chunk
+        assert detector.batcher.stats()['requests'] == requests + 1
+
+    def test_static_frames_skip_inference(self, detector, test_frame):
+        from sessions import DetectionSession
+        session = DetectionSession('static', detection_interval=0.001)
+
+        first = detector.detect_emotions(test_frame, session)
+        session.last_detection_time = 0
+        second = detector.detect_emotions(test_frame, session)
+
+        assert not first.get('cached', False)
+        assert second['cached'] is True
+        assert second['emotions'] == first['emotions']
+        assert session.detections == 1
+        assert detector.frame_gate_stats.stats()['skipped'] == 1
+
+    def test_process_faces_averages_confident_scores(self, detector):
+        faces = [
+            {'box': [0, 0, 50, 50], 'emotions': {'happy': 0.9, 'sad': 0.1}, 'track_id': 1},
+            {'box': [60, 0, 50, 50], 'emotions': {'happy': 0.6, 'angry': 0.4}}
+        ]
+        result = detector._process_faces(faces)
+
+        # Only happy passes the confidence threshold on any face
+        assert result['emotions'].dtype == np.float32
+        assert detector.EMOTION_LABELS[int(np.argmax(result['emotions']))] == 'happy'
+        assert result['emotions'].sum() == pytest.approx(1.0)
+        assert result['faces'][0] == {'box': [0, 0, 50, 50], 'emotions': {'happy': 0.9, 'sad': 0.1}, 'track_id': 1}
+
+    def test_process_faces_smooths_each_face(self, detector):
+        from sessions import DetectionSession
+
+        session = DetectionSession("faces", smoothing_frames=4)
+        happy = {'box': [0, 0, 50, 50], 'emotions': {'happy': 1.0}, 'track_id': 1}
+        sad = {'box': [60, 0, 50, 50], 'emotions': {'sad': 1.0}, 'track_id': 2}
+        detector._process_faces([happy, sad], session, 0.0)
+        result = detector._process_faces([dict(happy, emotions={'angry': 1.0}), sad], session, 0.1)
+
+        assert [face['track_id'] for face in result['faces']] == [1, 2]
+        assert result['faces'][0]['emotions']['happy'] == pytest.approx(0.5)
+        assert result['faces'][1]['emotions']['sad'] == pytest.approx(1.0)
+        assert len(session.face_histories) == 2
+
     @pytest.mark.parametrize("num_faces", [0, 1, 3, 10])
     def test_multi_face_handling(self, detector, num_faces):
         # Mock faces result
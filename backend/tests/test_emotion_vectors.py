@@ -0,0 +1,94 @@
+import pytest
+import numpy as np
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emotion_vectors import (EMOTION_LABELS, EmotionHistory, ExponentialMovingAverage, KalmanFilter,
+                             MedianFilter, MovingAverage, create_smoother, to_dict, to_vector)
+
+def onehot(label, weight=1.0):
+    vector = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+    vector[EMOTION_LABELS.index(label)] = weight
+    return vector
+
+class TestEmotionVectors:
+    def test_dict_round_trip(self):
+        vector = to_vector({'happy': 0.75, 'sad': 0.25})
+        assert vector.dtype == np.float32
+        emotions = to_dict(vector)
+        assert list(emotions) == list(EMOTION_LABELS)
+        assert emotions['happy'] == 0.75 and emotions['neutral'] == 0.0
+        assert all(type(score) is float for score in emotions.values())
+
+    def test_empty_history_is_neutral(self):
+        history = EmotionHistory(3, MovingAverage())
+        assert not history
+        assert history.dominant() == ('neutral', 1.0)
+        assert to_dict(history.smoothed())['neutral'] == 1.0
+
+    def test_ring_buffer_keeps_last_maxlen(self):
+        history = EmotionHistory(3, MovingAverage())
+        for label in ('angry', 'sad', 'happy', 'happy'):
+            history.append(onehot(label))
+
+        assert len(history) == 3
+        assert history.maxlen == 3
+        assert [EMOTION_LABELS[i] for i in history.window().argmax(axis=1)] == ['sad', 'happy', 'happy']
+
+    def test_moving_average_matches_window_mean(self):
+        rng = np.random.default_rng(0)
+        history = EmotionHistory(5, MovingAverage())
+        for _ in range(23):
+            history.append(rng.random(len(EMOTION_LABELS)).astype(np.float32))
+            assert np.allclose(history.smoothed(), history.window().mean(axis=0), atol=1e-6)
+
+    def test_dicts_are_accepted(self):
+        history = EmotionHistory(2, MovingAverage())
+        history.append({'happy': 1.0})
+        history.append({'sad': 1.0})
+        assert to_dict(history.smoothed())['happy'] == pytest.approx(0.5)
+
+    def test_ema(self):
+        history = EmotionHistory(5, ExponentialMovingAverage(alpha=0.5))
+        history.append(onehot('happy'))
+        history.append(onehot('sad'))
+        smoothed = to_dict(history.smoothed())
+        assert smoothed['happy'] == pytest.approx(0.5)
+        assert smoothed['sad'] == pytest.approx(0.5)
+
+    def test_median_ignores_a_single_outlier(self):
+        history = EmotionHistory(5, MedianFilter())
+        for label in ('happy', 'happy', 'angry', 'happy', 'happy'):
+            history.append(onehot(label))
+        assert history.dominant() == ('happy', pytest.approx(1.0))
+
+    def test_kalman_converges(self):
+        history = EmotionHistory(5, KalmanFilter(process_var=0.01, measurement_var=0.05))
+        history.append(onehot('neutral'))
+        for _ in range(30):
+            history.append(onehot('happy'))
+        label, confidence = history.dominant()
+        assert label == 'happy' and confidence > 0.9
+        assert history.smoothed().sum() == pytest.approx(1.0)
+
+    def test_smoothed_result_is_cached(self):
+        history = EmotionHistory(3, MovingAverage())
+        history.append(onehot('happy'))
+        assert history.smoothed() is history.smoothed()
+
+    def test_clear_resets_smoother(self):
+        history = EmotionHistory(3, ExponentialMovingAverage(alpha=0.5))
+        history.append(onehot('happy'))
+        history.clear()
+        history.append(onehot('sad'))
+        assert history.dominant() == ('sad', 1.0)
+        assert len(history) == 1
+
+    def test_create_smoother(self):
+        assert isinstance(create_smoother('median'), MedianFilter)
+        with pytest.raises(ValueError):
+            create_smoother('gaussian')
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
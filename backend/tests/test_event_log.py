@@ -0,0 +1,105 @@
+import pytest
+import asyncio
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import ConnectionManager, serialize
+from event_log import EventLog, EventLogs
+
+def snapshot(room):
+    return {'type': 'music_update', 'full': True, 'version': 0, 'data': {'room': room}}
+
+def parse(event):
+    fields = {}
+    for line in event.strip().split("\n"):
+        key, _, value = line.partition(": ")
+        fields[key] = value
+    return fields
+
+class TestEventLog:
+    @pytest.mark.asyncio
+    async def test_since_resumes_and_detects_gaps(self):
+        log = EventLog(maxlen=3)
+        for i in range(5):
+            log.enqueue(serialize({'type': 'emotion_update', 'i': i}))
+
+        assert [number for number, _, _ in log.since(3)] == [4, 5]
+        assert log.since(5) == []
+        # Events 2 and 3 were evicted from the ring
+        assert log.since(1) is None
+        assert log.since(9) is None
+        assert log.parse_id(log.event_id(4)) == 4
+        assert log.parse_id("otherlog-4") is None
+
+    @pytest.mark.asyncio
+    async def test_binary_payloads_are_ignored(self):
+        log = EventLog()
+        assert log.enqueue(b"\x02\x00") is False
+        assert log.last_id == 0
+
+class TestEventLogs:
+    @pytest.mark.asyncio
+    async def test_stream_snapshot_then_live_events(self):
+        manager = ConnectionManager()
+        logs = EventLogs(manager, heartbeat_s=5)
+        stream = logs.stream("stage", None, snapshot)
+
+        assert (await stream.__anext__()).startswith("retry: ")
+        first = parse(await stream.__anext__())
+        assert first['event'] == 'music_update'
+        assert json.loads(first['data'])['data'] == {'room': 'stage'}
+        assert manager.room_stats() == {'stage': 1}
+
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        await manager.publish("stage", {'type': 'emotion_update', 'data': {'dominant_emotion': 'happy'}})
+        event = parse(await asyncio.wait_for(pending, 1))
+        assert event['event'] == 'emotion_update'
+        assert json.loads(event['data'])['data']['dominant_emotion'] == 'happy'
+        await stream.aclose()
+
+    @pytest.mark.asyncio
+    async def test_resume_from_last_event_id(self):
+        manager = ConnectionManager()
+        logs = EventLogs(manager, heartbeat_s=5)
+        stream = logs.stream("lobby", None, snapshot)
+        await stream.__anext__()
+        last_id = parse(await stream.__anext__())['id']
+        await stream.aclose()
+
+        # Missed while disconnected; the log lingers and keeps them
+        for i in range(3):
+            await manager.publish("lobby", {'type': 'notice', 'i': i})
+
+        resumed = logs.stream("lobby", last_id, snapshot)
+        await resumed.__anext__()
+        events = [parse(await resumed.__anext__()) for _ in range(3)]
+        assert [json.loads(e['data'])['i'] for e in events] == [0, 1, 2]
+        assert logs.stats()['resumes'] == 1
+        await resumed.aclose()
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_when_idle(self):
+        logs = EventLogs(ConnectionManager(), heartbeat_s=0.01)
+        stream = logs.stream("lobby", None, snapshot)
+        await stream.__anext__()
+        await stream.__anext__()
+        assert await stream.__anext__() == ": keepalive\n\n"
+        await stream.aclose()
+
+    @pytest.mark.asyncio
+    async def test_log_leaves_room_after_linger(self):
+        manager = ConnectionManager()
+        logs = EventLogs(manager, linger_s=0)
+        stream = logs.stream("solo", None, snapshot)
+        await stream.__anext__()
+        await stream.aclose()
+
+        assert logs.logs == {}
+        assert manager.room_stats() == {}
+        assert manager.pubsub.topics() == []
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,111 @@
+import pytest
+import numpy as np
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_detectors import (
+    CascadeFaceDetector, FaceDetectorBackend, HaarFaceDetector, MtcnnFaceDetector, create_face_detector
+)
+
+class FixedDetector(FaceDetectorBackend):
+    """Backend returning preset detections, to exercise the cascade logic"""
+    def __init__(self, name, detections):
+        self.name = name
+        self.detections = detections
+        super().__init__()
+
+    def _detect(self, frame, had_faces):
+        return self.detections
+
+class SharedStateDetector(FaceDetectorBackend):
+    """Backend that records how many threads are inside _detect at once"""
+    def __init__(self, thread_safe):
+        self.name = 'shared'
+        self.thread_safe = thread_safe
+        self.inside = 0
+        self.most_inside = 0
+        super().__init__()
+
+    def _detect(self, frame, had_faces):
+        self.inside += 1
+        self.most_inside = max(self.most_inside, self.inside)
+        time.sleep(0.05)
+        self.inside -= 1
+        return []
+
+class TestFaceDetectors:
+    @pytest.fixture
+    def blank_frame(self):
+        return np.zeros((240, 320, 3), dtype=np.uint8)
+
+    def test_haar_on_blank_frame(self, blank_frame):
+        detector = HaarFaceDetector()
+        assert detector.find_faces(blank_frame) == []
+        stats = detector.stats()
+        assert stats['calls'] == 1
+        assert stats['hit_rate'] == 0.0
+        assert stats['avg_ms'] > 0
+
+    def test_mtcnn_on_blank_frame(self, blank_frame):
+        assert MtcnnFaceDetector().find_faces(blank_frame) == []
+
+    def test_dnn_falls_back_to_haar_without_model(self, tmp_path, monkeypatch):
+        from config import settings
+        monkeypatch.setattr(settings, 'models_dir', str(tmp_path))
+        assert isinstance(create_face_detector('dnn'), HaarFaceDetector)
+
+    def test_cascade_trusts_confident_cheap_result(self, blank_frame):
+        cheap = FixedDetector('cheap', [([10, 10, 50, 50], 0.95)])
+        accurate = FixedDetector('accurate', [])
+        cascade = CascadeFaceDetector(cheap, accurate)
+
+        assert cascade.find_faces(blank_frame) == [[10, 10, 50, 50]]
+        assert accurate.calls == 0
+        assert cascade.stats()['confident'] == 1
+
+    def test_cascade_escalates_when_unsure(self, blank_frame):
+        cheap = FixedDetector('cheap', [([10, 10, 50, 50], 0.4)])
+        accurate = FixedDetector('accurate', [([12, 8, 52, 54], 0.99)])
+        cascade = CascadeFaceDetector(cheap, accurate)
+
+        assert cascade.find_faces(blank_frame) == [[12, 8, 52, 54]]
+        assert cascade.stats()['escalation_rate'] == 1.0
+
+    def test_cascade_skips_mtcnn_without_faces(self, blank_frame):
+        accurate = FixedDetector('accurate', [([0, 0, 40, 40], 0.9)])
+        cascade = CascadeFaceDetector(FixedDetector('cheap', []), accurate)
+
+        assert cascade.find_faces(blank_frame) == []
+        assert accurate.calls == 0
+        # A face that just vanished from the cheap detector is double-checked
+        assert cascade.find_faces(blank_frame, had_faces=True) == [[0, 0, 40, 40]]
+        stats = cascade.stats()
+        assert stats['no_face'] == 1 and stats['escalated'] == 1
+        assert stats['backends']['accurate']['calls'] == 1
+
+    def test_faces_sorted_by_confidence(self, blank_frame):
+        detector = FixedDetector('fixed', [([0, 0, 40, 40], 0.6), ([100, 0, 40, 40], 0.9)])
+        assert detector.find_faces(blank_frame) == [[100, 0, 40, 40], [0, 0, 40, 40]]
+
+    def _detect_concurrently(self, detector, frame):
+        threads = [threading.Thread(target=detector.detect, args=(frame,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return detector.most_inside
+
+    def test_unsafe_backend_serialized(self, blank_frame):
+        assert self._detect_concurrently(SharedStateDetector(thread_safe=False), blank_frame) == 1
+        assert self._detect_concurrently(SharedStateDetector(thread_safe=True), blank_frame) > 1
+
+    def test_dnn_is_locked(self):
+        from face_detectors import DnnFaceDetector
+        assert DnnFaceDetector.thread_safe is False
+        assert MtcnnFaceDetector.thread_safe is True
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
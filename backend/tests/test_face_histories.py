@@ -0,0 +1,122 @@
+import pytest
+import numpy as np
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emotion_vectors import EMOTION_INDEX, NUM_EMOTIONS, to_dict
+from face_histories import FaceHistories, aggregate
+
+
+def face(box, emotion, score=1.0, track_id=None):
+    emotions = {emotion: score, 'neutral': 1.0 - score} if emotion != 'neutral' else {'neutral': 1.0}
+    entry = {'box': box, 'emotions': emotions}
+    if track_id is not None:
+        entry['track_id'] = track_id
+    return entry
+
+
+class TestAggregate:
+    @pytest.fixture
+    def vectors(self):
+        vectors = np.zeros((2, NUM_EMOTIONS), dtype=np.float32)
+        vectors[0, EMOTION_INDEX['happy']] = 0.6
+        vectors[0, EMOTION_INDEX['neutral']] = 0.4
+        vectors[1, EMOTION_INDEX['sad']] = 0.9
+        vectors[1, EMOTION_INDEX['neutral']] = 0.1
+        return vectors
+
+    @pytest.fixture
+    def boxes(self):
+        # The first face is the larger one, the second the more confident one
+        return [[0, 0, 200, 200], [300, 0, 50, 50]]
+
+    def test_largest(self, vectors, boxes):
+        combined = aggregate(vectors, boxes, 'largest')
+        assert np.allclose(combined, vectors[0])
+
+    def test_most_confident(self, vectors, boxes):
+        combined = aggregate(vectors, boxes, 'most_confident')
+        assert np.allclose(combined, vectors[1])
+
+    def test_area_weighted(self, vectors, boxes):
+        combined = to_dict(aggregate(vectors, boxes, 'area'))
+        assert combined['happy'] == pytest.approx(0.6 * 16 / 17, abs=1e-5)
+        assert combined['sad'] == pytest.approx(0.9 / 17, abs=1e-5)
+
+    def test_mean_ignores_unconfident_scores(self, vectors, boxes):
+        combined = to_dict(aggregate(vectors, boxes, 'mean'))
+        assert combined['happy'] == pytest.approx(0.6 / 1.5)
+        assert combined['sad'] == pytest.approx(0.9 / 1.5)
+        assert combined['neutral'] == 0.0
+
+    @pytest.mark.parametrize("weighting", ['mean', 'area', 'confidence', 'largest', 'most_confident'])
+    def test_normalized(self, vectors, boxes, weighting):
+        combined = aggregate(vectors, boxes, weighting)
+        assert combined.dtype == np.float32
+        assert combined.sum() == pytest.approx(1.0)
+
+    def test_no_faces(self):
+        assert not aggregate(np.zeros((0, NUM_EMOTIONS)), [], 'area').any()
+
+    def test_unknown_weighting(self, vectors, boxes):
+        with pytest.raises(ValueError):
+            aggregate(vectors, boxes, 'loudest')
+
+
+class TestFaceHistories:
+    def test_faces_are_smoothed_independently(self):
+        histories = FaceHistories(smoothing_frames=4, timeout=10)
+        for _ in range(4):
+            smoothed = histories.update([face([0, 0, 50, 50], 'happy', track_id=1),
+                                         face([100, 0, 50, 50], 'sad', track_id=2)], now=0.0)
+        assert to_dict(smoothed[0])['happy'] == pytest.approx(1.0)
+        assert to_dict(smoothed[1])['sad'] == pytest.approx(1.0)
+
+        # One frame of a different emotion is damped only for that face
+        smoothed = histories.update([face([0, 0, 50, 50], 'angry', track_id=1),
+                                     face([100, 0, 50, 50], 'sad', track_id=2)], now=0.0)
+        assert to_dict(smoothed[0])['happy'] == pytest.approx(0.75)
+        assert to_dict(smoothed[1])['sad'] == pytest.approx(1.0)
+
+    def test_ids_follow_overlapping_boxes_without_tracker(self):
+        histories = FaceHistories(timeout=10, iou_threshold=0.3)
+        first = [face([0, 0, 50, 50], 'happy'), face([200, 0, 50, 50], 'sad')]
+        histories.update(first, now=0.0)
+        ids = [f['track_id'] for f in first]
+        assert len(set(ids)) == 2
+
+        # Both faces moved a little and come back in the other order
+        second = [face([205, 0, 50, 50], 'sad'), face([4, 0, 50, 50], 'happy')]
+        histories.update(second, now=1.0)
+        assert [f['track_id'] for f in second] == ids[::-1]
+
+        third = [face([400, 0, 50, 50], 'angry')]
+        histories.update(third, now=2.0)
+        assert third[0]['track_id'] not in ids
+
+    def test_gone_faces_are_freed_after_timeout(self):
+        histories = FaceHistories(timeout=2.0)
+        histories.update([face([0, 0, 50, 50], 'happy', track_id=1),
+                          face([100, 0, 50, 50], 'sad', track_id=2)], now=0.0)
+        histories.update([face([0, 0, 50, 50], 'happy', track_id=1)], now=1.5)
+        assert len(histories) == 2
+
+        histories.update([face([0, 0, 50, 50], 'happy', track_id=1)], now=3.0)
+        assert 1 in histories and 2 not in histories
+        assert histories.expire(now=10.0) == 1
+        assert len(histories) == 0
+        assert histories.nbytes == 0
+        assert histories.stats()['expired'] == 2
+
+    def test_returning_face_starts_fresh(self):
+        histories = FaceHistories(smoothing_frames=4, timeout=1.0)
+        histories.update([face([0, 0, 50, 50], 'happy', track_id=1)], now=0.0)
+        histories.expire(now=5.0)
+        smoothed = histories.update([face([0, 0, 50, 50], 'sad', track_id=1)], now=5.0)
+        assert to_dict(smoothed[0])['sad'] == pytest.approx(1.0)
+        assert len(histories.history(1)) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
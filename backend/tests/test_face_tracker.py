@@ -0,0 +1,84 @@
+import pytest
+import numpy as np
+import cv2
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_tracker import FaceTracker, TrackingStats, iou
+
+class TestFaceTracker:
+    @pytest.fixture
+    def scene(self):
+        rng = np.random.RandomState(0)
+        background = cv2.GaussianBlur(rng.randint(0, 255, (240, 320), dtype=np.uint8), (5, 5), 0)
+        patch = cv2.GaussianBlur(rng.randint(0, 255, (60, 60), dtype=np.uint8), (3, 3), 0)
+
+        def frame_at(step):
+            """A textured 60x60 "face" moving 3 px right and 2 px down per frame"""
+            x, y = 80 + 3 * step, 60 + 2 * step
+            frame = background.copy()
+            frame[y:y + 60, x:x + 60] = patch
+            return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR), [x, y, 60, 60]
+        return frame_at
+
+    def test_iou(self):
+        assert iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1.0
+        assert iou([0, 0, 10, 10], [20, 20, 10, 10]) == 0.0
+        assert iou([0, 0, 10, 10], [5, 0, 10, 10]) == pytest.approx(1 / 3)
+
+    def test_tracks_between_detections(self, scene):
+        stats = TrackingStats()
+        tracker = FaceTracker(stats, redetect_interval=5, max_width=320)
+        calls = []
+
+        for step in range(10):
+            frame, truth = scene(step)
+            def detect(truth=truth):
+                calls.append(step)
+                return [truth]
+            tracked = tracker.update(frame, detect)
+
+            assert len(tracked) == 1
+            track_id, box = tracked[0]
+            assert track_id == 1
+            assert iou(box, truth) > 0.8
+
+        # Detection ran on frames 0 and 5 only
+        assert calls == [0, 5]
+        summary = stats.stats()
+        assert summary['detections'] == 2
+        assert summary['detection_skip_ratio'] == pytest.approx(0.8)
+        assert summary['redetect_reasons'] == {'no_tracks': 1, 'interval': 1, 'low_confidence': 0}
+
+    def test_redetects_when_tracking_fails(self, scene):
+        tracker = FaceTracker(redetect_interval=100)
+        frame, truth = scene(0)
+        tracker.update(frame, lambda: [truth])
+
+        # A completely different picture: flow can't follow the face
+        noise = np.random.RandomState(1).randint(0, 255, frame.shape, dtype=np.uint8)
+        tracked = tracker.update(noise, lambda: [[200, 150, 60, 60]])
+
+        assert tracker.stats.reasons['low_confidence'] == 1
+        # The new detection doesn't overlap the old track, so it is a new face
+        assert tracked == [(2, [200, 150, 60, 60])]
+
+    def test_ids_follow_faces_across_detections(self, scene):
+        tracker = FaceTracker(redetect_interval=1)
+        frame, truth = scene(0)
+        tracker.update(frame, lambda: [truth, [250, 10, 50, 50]])
+        frame, truth = scene(1)
+        tracked = tracker.update(frame, lambda: [[250, 12, 50, 50], truth])
+
+        assert dict(tracked) == {2: [250, 12, 50, 50], 1: truth}
+
+    def test_no_faces_means_no_tracks(self, scene):
+        tracker = FaceTracker()
+        frame, _ = scene(0)
+        assert tracker.update(frame, lambda: []) == []
+        assert tracker.update(frame, lambda: []) == []
+        assert tracker.stats.reasons['no_tracks'] == 2
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
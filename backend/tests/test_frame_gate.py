@@ -0,0 +1,86 @@
+import pytest
+import numpy as np
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_gate import FrameGate, FrameGateStats
+
+class TestFrameGate:
+    @pytest.fixture
+    def frame(self):
+        return np.random.RandomState(0).randint(0, 255, (480, 640, 3), dtype=np.uint8)
+
+    @pytest.fixture
+    def result(self):
+        return {'success': True, 'dominant_emotion': 'happy', 'faces': [{'box': [200, 150, 120, 120]}],
+                'timestamp': 0.0}
+
+    def test_first_frame_runs_inference(self, frame):
+        gate = FrameGate(threshold=3.0, max_staleness_s=10)
+        assert gate.check(frame, now=1.0) is None
+        assert gate.stats.reasons['no_reference'] == 1
+
+    def test_static_scene_reuses_result(self, frame, result):
+        gate = FrameGate(threshold=3.0, max_staleness_s=10)
+        gate.check(frame, now=1.0)
+        gate.store(result, now=1.0)
+
+        # Mild sensor noise stays under the threshold
+        noisy = np.clip(frame.astype(np.int16) + np.random.RandomState(1).randint(-4, 5, frame.shape), 0, 255)
+        cached = gate.check(noisy.astype(np.uint8), now=1.5)
+
+        assert cached['cached'] is True
+        assert cached['dominant_emotion'] == 'happy'
+        assert cached['timestamp'] == 1.5
+        assert 'cached' not in result
+
+    def test_change_in_face_region_forces_inference(self, frame, result):
+        gate = FrameGate(threshold=3.0, max_staleness_s=10)
+        gate.check(frame, now=1.0)
+        gate.store(result, now=1.0)
+
+        # A change confined to the face is small over the whole picture but not over the face
+        changed = frame.copy()
+        changed[170:250, 220:300] = 0
+        assert FrameGate.difference(gate._thumbnail(frame)[0], gate._thumbnail(changed)[0]) < 3.0
+
+        assert gate.check(changed, now=1.5) is None
+        assert gate.stats.reasons['changed'] == 1
+
+    def test_max_staleness_forces_refresh(self, frame, result):
+        gate = FrameGate(threshold=3.0, max_staleness_s=2.0)
+        gate.check(frame, now=1.0)
+        gate.store(result, now=1.0)
+
+        assert gate.check(frame, now=2.0) is not None
+        assert gate.check(frame, now=3.5) is None
+        assert gate.stats.reasons['stale'] == 1
+
+        gate.store(result, now=3.5)
+        assert gate.check(frame, now=4.0) is not None
+
+    def test_skip_ratio(self, frame, result):
+        stats = FrameGateStats()
+        gate = FrameGate(stats, threshold=3.0, max_staleness_s=10)
+        gate.check(frame, now=1.0)
+        gate.store(result, now=1.0)
+        for i in range(3):
+            gate.check(frame, now=1.1 + i)
+
+        summary = stats.stats()
+        assert summary['frames'] == 4
+        assert summary['skipped'] == 3
+        assert summary['skip_ratio'] == pytest.approx(0.75)
+        assert summary['diff_p90'] == 0.0
+
+    def test_reset_drops_reference(self, frame, result):
+        gate = FrameGate(threshold=3.0, max_staleness_s=10)
+        gate.check(frame, now=1.0)
+        gate.store(result, now=1.0)
+        gate.reset()
+        assert gate.check(frame, now=1.5) is None
+        assert gate.approx_bytes() > 0
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
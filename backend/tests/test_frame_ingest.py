@@ -0,0 +1,71 @@
+import pytest
+import asyncio
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_ingest import FrameIngest
+from frame_protocol import Frame
+
+class TestFrameIngest:
+    @pytest.mark.asyncio
+    async def test_latest_frame_wins(self):
+        ingest = FrameIngest()
+        for seq in range(5):
+            ingest.put(Frame(payload=b'', seq=seq))
+
+        frame = await ingest.get()
+        assert frame.seq == 4
+        assert ingest.received == 5
+        assert ingest.dropped == 4
+        assert ingest.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_get_waits_for_frame(self):
+        ingest = FrameIngest()
+        getter = asyncio.create_task(ingest.get())
+        await asyncio.sleep(0)
+        assert not getter.done()
+
+        ingest.put(Frame(payload=b'', seq=1))
+        frame = await asyncio.wait_for(getter, timeout=1)
+        assert frame.seq == 1
+        assert ingest.dropped == 0
+
+    @pytest.mark.asyncio
+    async def test_newest_replaces_stale_frame(self):
+        ingest = FrameIngest()
+        ingest.put(Frame(payload=b'', seq=1))
+        stale = await ingest.get()
+
+        # Nothing newer: keep the frame we hold
+        assert ingest.newest(stale).seq == 1
+        assert ingest.dropped == 0
+
+        ingest.put(Frame(payload=b'', seq=2))
+        assert ingest.newest(stale).seq == 2
+        assert ingest.dropped == 1
+
+    @pytest.mark.asyncio
+    async def test_close_releases_waiter(self):
+        ingest = FrameIngest()
+        getter = asyncio.create_task(ingest.get())
+        await asyncio.sleep(0)
+        ingest.close()
+        assert await asyncio.wait_for(getter, timeout=1) is None
+
+    def test_stats(self):
+        ingest = FrameIngest(connection_id="abc")
+        ingest.put(Frame(payload=b''))
+        ingest.put(Frame(payload=b''))
+        ingest.mark_processed()
+
+        stats = ingest.stats()
+        assert stats['connection_id'] == "abc"
+        assert stats['received'] == 2
+        assert stats['dropped'] == 1
+        assert stats['processed'] == 1
+        assert stats['drop_ratio'] == 0.5
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
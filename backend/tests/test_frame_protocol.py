@@ -0,0 +1,151 @@
+import pytest
+import numpy as np
+import cv2
+import base64
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_protocol import (
+    Frame, ProtocolError, FRAME_HEADER, CODEC_JPEG, CODEC_WEBP,
+    pack_frame, parse_binary_frame, parse_message, hello_response, decode_frame,
+    EMOTION_IDS, RESULT_HEADER, FACE_RECORD, pack_result, unpack_result
+)
+
+class TestFrameProtocol:
+    @pytest.fixture
+    def jpeg_bytes(self):
+        img = np.full((48, 64, 3), 200, dtype=np.uint8)
+        ok, encoded = cv2.imencode('.jpg', img)
+        assert ok
+        return encoded.tobytes()
+
+    def test_header_size(self):
+        assert FRAME_HEADER.size == 16
+
+    def test_binary_round_trip(self, jpeg_bytes):
+        data = pack_frame(jpeg_bytes, seq=42, client_ts=1234.5, codec=CODEC_WEBP)
+        frame = parse_binary_frame(data)
+
+        assert frame.seq == 42
+        assert frame.client_ts == 1234.5
+        assert frame.codec == CODEC_WEBP
+        assert isinstance(frame.payload, memoryview)
+        assert bytes(frame.payload) == jpeg_bytes
+        assert frame.echo() == {'seq': 42, 'client_ts': 1234.5}
+
+    def test_binary_frame_decodes_without_base64(self, jpeg_bytes):
+        frame = parse_binary_frame(pack_frame(jpeg_bytes, seq=1, client_ts=0.0))
+        image = decode_frame(frame)
+        assert image is not None
+        assert image.shape == (48, 64, 3)
+
+    def test_short_binary_frame_rejected(self):
+        with pytest.raises(ProtocolError):
+            parse_binary_frame(b'\x01\x01')
+
+    def test_unknown_codec_rejected(self, jpeg_bytes):
+        data = FRAME_HEADER.pack(1, 99, 0, 0, 0.0) + jpeg_bytes
+        with pytest.raises(ProtocolError):
+            parse_binary_frame(data)
+
+    def test_binary_requires_negotiation(self, jpeg_bytes):
+        raw = {'type': 'websocket.receive', 'bytes': pack_frame(jpeg_bytes, 1, 0.0)}
+        with pytest.raises(ProtocolError):
+            parse_message(raw, binary_enabled=False)
+        assert isinstance(parse_message(raw, binary_enabled=True), Frame)
+
+    def test_legacy_json_frame(self, jpeg_bytes):
+        data_url = 'data:image/jpeg;base64,' + base64.b64encode(jpeg_bytes).decode()
+        raw = {'type': 'websocket.receive', 'text': json.dumps({'type': 'frame', 'data': data_url, 'seq': 7})}
+        frame = parse_message(raw)
+
+        assert isinstance(frame, Frame)
+        assert frame.echo() == {'seq': 7}
+        assert decode_frame(frame).shape == (48, 64, 3)
+
+    def test_control_messages_pass_through(self):
+        raw = {'type': 'websocket.receive', 'text': json.dumps({'type': 'control', 'action': 'reset'})}
+        assert parse_message(raw) == {'type': 'control', 'action': 'reset'}
+
+    def test_invalid_json_rejected(self):
+        with pytest.raises(ProtocolError):
+            parse_message({'type': 'websocket.receive', 'text': 'not json'})
+
+    def test_invalid_image_decodes_to_none(self):
+        frame = Frame(payload=b'not an image', codec=CODEC_JPEG)
+        assert decode_frame(frame) is None
+
+    @pytest.mark.parametrize("requested,expected", [("binary", "binary"), ("json", "json"), (None, "json")])
+    def test_hello_response(self, requested, expected):
+        response = hello_response(requested)
+        assert response['type'] == 'hello'
+        assert response['protocol'] == expected
+
+    @pytest.fixture
+    def result_message(self):
+        emotions = {'angry': 0.05, 'disgust': 0.0, 'fear': 0.05, 'happy': 0.7,
+                    'sad': 0.05, 'surprise': 0.1, 'neutral': 0.05}
+        return {
+            'type': 'emotion_result',
+            'data': {
+                'success': True,
+                'emotions': emotions,
+                'dominant_emotion': 'happy',
+                'confidence': 0.7,
+                'num_faces': 2,
+                'faces': [
+                    {'box': [10, 20, 100, 120], 'emotions': emotions},
+                    {'box': [300, 40, 80, 90], 'emotions': emotions}
+                ],
+                'timestamp': 1700000000.25,
+                'processing_time': 0.031
+            },
+            'seq': 42,
+            'client_ts': 1700000000123.0
+        }
+
+    def test_result_round_trip(self, result_message):
+        packed = pack_result(result_message)
+        assert len(packed) == RESULT_HEADER.size + 2 * FACE_RECORD.size
+
+        decoded = unpack_result(packed)
+        assert decoded['type'] == 'emotion_result'
+        assert decoded['seq'] == 42
+        assert decoded['client_ts'] == 1700000000123.0
+        data = decoded['data']
+        assert data['success'] and 'cached' not in data
+        assert data['dominant_emotion'] == 'happy'
+        assert data['faces'][1]['box'] == [300, 40, 80, 90]
+        for label, score in result_message['data']['emotions'].items():
+            assert data['emotions'][label] == pytest.approx(score, abs=1e-6)
+        assert data['processing_time'] == pytest.approx(0.031, abs=1e-6)
+
+    def test_result_smaller_than_json(self, result_message):
+        assert len(pack_result(result_message)) < len(json.dumps(result_message)) / 2
+
+    def test_cached_result_without_faces(self):
+        message = {'type': 'emotion_update', 'data': {
+            'success': True, 'emotions': {'neutral': 1.0}, 'dominant_emotion': 'neutral',
+            'confidence': 1.0, 'cached': True, 'timestamp': 1.0
+        }}
+        decoded = unpack_result(pack_result(message))
+        assert decoded['type'] == 'emotion_update'
+        assert decoded['data']['cached'] is True
+        assert decoded['data']['faces'] == []
+        assert 'seq' not in decoded
+
+    def test_emotion_ids_match_detector(self):
+        from emotion_detector import EmotionDetector
+        assert list(EMOTION_IDS) == EmotionDetector.EMOTION_LABELS
+
+    def test_hello_negotiates_results(self):
+        assert hello_response('binary')['results'] == 'json'
+        response = hello_response('json', 'binary')
+        assert response['results'] == 'binary'
+        assert response['result_header_size'] == RESULT_HEADER.size
+        assert response['emotions'] == list(EMOTION_IDS)
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
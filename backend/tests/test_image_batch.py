@@ -0,0 +1,124 @@
+import pytest
+import asyncio
+import io
+import json
+import tarfile
+import zipfile
+import numpy as np
+import cv2
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from image_batch import BatchTagger, iter_images
+
+def make_upload(name, data, content_type):
+    return UploadFile(file=io.BytesIO(data), filename=name, headers=Headers({'content-type': content_type}))
+
+def collect(tagger, uploads):
+    async def run():
+        return [json.loads(line) async for line in tagger.stream(uploads)]
+    return asyncio.run(run())
+
+class TestImageBatch:
+    @pytest.fixture
+    def jpeg_bytes(self):
+        ok, encoded = cv2.imencode('.jpg', np.full((24, 32, 3), 120, dtype=np.uint8))
+        assert ok
+        return encoded.tobytes()
+
+    @pytest.fixture
+    def zip_bytes(self, jpeg_bytes):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for i in range(5):
+                archive.writestr(f"stills/{i}.jpg", jpeg_bytes)
+        return buffer.getvalue()
+
+    @pytest.fixture
+    def tagger(self):
+        calls = []
+        def detect_batch(frames):
+            calls.append(len(frames))
+            return [
+                {'success': True, 'num_faces': 1, 'height': frame.shape[0]} if frame is not None
+                else {'success': False, 'num_faces': 0, 'error': 'Invalid image'}
+                for frame in frames
+            ]
+        tagger = BatchTagger(detect_batch, chunk_size=4, decode_workers=2)
+        tagger.calls = calls
+        yield tagger
+        tagger.close()
+
+    def test_archives_are_expanded(self, jpeg_bytes, zip_bytes):
+        tar_buffer = io.BytesIO()
+        with tarfile.open(fileobj=tar_buffer, mode='w:gz') as archive:
+            info = tarfile.TarInfo("one.jpg")
+            info.size = len(jpeg_bytes)
+            archive.addfile(info, io.BytesIO(jpeg_bytes))
+
+        uploads = [
+            make_upload("a.jpg", jpeg_bytes, "image/jpeg"),
+            make_upload("set.zip", zip_bytes, "application/zip"),
+            make_upload("set.tgz", tar_buffer.getvalue(), "application/gzip")
+        ]
+        items = list(iter_images(uploads))
+        assert [item.index for item in items] == list(range(7))
+        assert items[1].name == "stills/0.jpg"
+        assert items[-1].name == "one.jpg"
+        assert all(item.data == jpeg_bytes for item in items)
+
+    def test_invalid_archive_reported(self):
+        items = list(iter_images([make_upload("broken.zip", b"not a zip", "application/zip")]))
+        assert len(items) == 1
+        assert items[0].error.startswith("Invalid archive")
+
+    def test_stream_classifies_in_chunks(self, tagger, jpeg_bytes, zip_bytes):
+        lines = collect(tagger, [
+            make_upload("a.jpg", jpeg_bytes, "image/jpeg"),
+            make_upload("junk.bin", b"junk", "application/octet-stream"),
+            make_upload("set.zip", zip_bytes, "application/zip")
+        ])
+
+        results, summary = lines[:-1], lines[-1]
+        assert [r['index'] for r in results] == list(range(7))
+        assert results[0] == {'index': 0, 'name': 'a.jpg', 'success': True, 'num_faces': 1, 'height': 24}
+        assert results[1]['error'] == 'Invalid image'
+        assert summary['done'] and summary['images'] == 7 and summary['failed'] == 1
+        assert tagger.calls == [4, 3]
+        assert tagger.stats()['faces'] == 6
+
+    def test_max_images_truncates(self, tagger, jpeg_bytes, monkeypatch):
+        from config import settings
+        monkeypatch.setattr(settings, 'batch_max_images', 3)
+        lines = collect(tagger, [make_upload(f"{i}.jpg", jpeg_bytes, "image/jpeg") for i in range(5)])
+        assert len(lines) == 4
+        assert lines[-1]['truncated'] is True
+
+    def test_cache_skips_repeated_images(self, jpeg_bytes, zip_bytes):
+        from result_cache import ResultCache
+        calls = []
+        def detect_batch(frames):
+            calls.append(len(frames))
+            return [{'success': frame is not None, 'num_faces': 0} for frame in frames]
+        tagger = BatchTagger(detect_batch, chunk_size=4, decode_workers=2,
+                             cache=ResultCache(max_entries=8, max_mb=1, ttl_s=60, mode='exact'))
+        try:
+            lines = collect(tagger, [
+                make_upload("a.jpg", jpeg_bytes, "image/jpeg"),
+                make_upload("junk.bin", b"junk", "application/octet-stream"),
+                make_upload("set.zip", zip_bytes, "application/zip")
+            ])
+        finally:
+            tagger.close()
+
+        # The second chunk holds only copies of an image detected in the first
+        assert calls == [4]
+        assert [bool(line.get('cached')) for line in lines[4:-1]] == [True, True, True]
+        assert lines[-1]['images'] == 7
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
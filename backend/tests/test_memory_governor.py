@@ -0,0 +1,148 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_governor import MB, MemoryGovernor, rss_bytes
+from rate_controller import RateController
+
+class FakeRss:
+    def __init__(self, mb):
+        self.mb = mb
+
+    def __call__(self):
+        return int(self.mb * MB)
+
+class TestMemoryGovernor:
+    @pytest.fixture
+    def rss(self):
+        return FakeRss(100)
+
+    @pytest.fixture
+    def governor(self, rss):
+        # Thresholds from the defaults: flush 85%, throttle 90%, refuse 95%
+        governor = MemoryGovernor(limit_mb=200, rss=rss)
+        governor.set_baseline(0)
+        return governor
+
+    def test_rss_is_measured(self):
+        assert rss_bytes() > 10 * MB
+
+    def test_sheds_in_order(self, governor, rss):
+        calls = []
+        governor.on('flush', lambda: calls.append('flush'))
+        governor.on('throttle', lambda: calls.append('throttle'))
+
+        assert governor.check() == 'normal'
+        assert calls == []
+
+        rss.mb = 172
+        assert governor.check() == 'flush'
+        assert calls == ['flush']
+
+        rss.mb = 182
+        calls.clear()
+        assert governor.check() == 'throttle'
+        assert calls == ['throttle']
+        assert governor.admits_sessions
+
+        rss.mb = 195
+        assert governor.check() == 'refuse'
+        assert not governor.admits_sessions
+        assert governor.stats()['actions'] == {'flush': 1, 'throttle': 1, 'refuse': 1}
+
+    def test_actions_run_on_transitions_only(self, governor, rss):
+        calls = []
+        governor.on('flush', lambda: calls.append('flush'))
+        governor.on('throttle', lambda: calls.append('throttle'))
+
+        rss.mb = 190
+        governor.check()
+        # Jumping straight to a higher level runs the skipped levels' actions once
+        assert calls == ['flush', 'throttle']
+        assert governor.release_pending
+        governor.release()
+        assert not governor.release_pending
+
+        governor.check()
+        governor.check()
+        assert calls == ['flush', 'throttle']
+        assert not governor.release_pending
+
+    def test_usage_is_absolute_rss(self, governor, rss):
+        rss.mb = 180
+        assert governor.check() == 'throttle'
+        assert governor.stats()['usage'] == pytest.approx(0.9)
+
+    def test_growth_limit_counts_from_baseline(self, rss):
+        rss.mb = 900
+        governor = MemoryGovernor(limit_mb=4000, growth_limit_mb=200, rss=rss)
+        # No baseline yet (models still loading): only the absolute limit applies
+        assert governor.check() == 'normal'
+        assert governor.stats()['usage'] == pytest.approx(0.225)
+
+        governor.set_baseline()
+        rss.mb = 1000
+        assert governor.check() == 'normal'
+        assert governor.stats()['usage'] == pytest.approx(0.5)
+        rss.mb = 1080
+        assert governor.check() == 'throttle'
+        assert governor.stats()['baseline_mb'] == pytest.approx(900)
+
+    def test_throttle_holds_rate_pressure_while_it_lasts(self, governor, rss):
+        controller = RateController(max_fps=15, min_fps=2, cpu_budget_percent=50,
+                                    latency_budget_ms=50, delay_budget_ms=100)
+        controller.attach('a', 'ws-a')
+        governor.on('throttle', lambda: controller.hold_pressure('memory'),
+                    leave=lambda: controller.release_pressure('memory'))
+
+        rss.mb = 182
+        rates = []
+        for _ in range(4):
+            governor.check()
+            controller.update(cpu_percent=0)
+            rates.append(controller.target_fps('a'))
+        # Every update while memory stays high lowers the rate; none adds any back
+        assert rates == sorted(rates, reverse=True) and len(set(rates)) == 4
+        assert controller.stats()['increases'] == 0
+
+        rss.mb = 100
+        governor.check()
+        controller.update(cpu_percent=0)
+        assert controller.target_fps('a') > rates[-1]
+
+    def test_hysteresis(self, governor, rss):
+        rss.mb = 182
+        governor.check()
+        # Just under the throttle threshold is not enough to step down
+        rss.mb = 175
+        assert governor.check() == 'throttle'
+        rss.mb = 165
+        assert governor.check() == 'normal'
+        assert governor.stats()['transitions'] == 2
+
+    def test_consumers_in_stats(self, governor, rss):
+        governor.track('cache', lambda: 10 * MB)
+        governor.track('broken', lambda: 1 / 0)
+        governor.check()
+        stats = governor.stats()
+
+        assert stats['consumers_mb'] == {'cache': 10, 'broken': 0}
+        assert stats['untracked_mb'] == pytest.approx(90)
+        assert stats['rss_mb'] == pytest.approx(100)
+        assert stats['usage'] == pytest.approx(0.5)
+
+    def test_failing_action_does_not_stop_shedding(self, governor, rss):
+        calls = []
+        governor.on('flush', lambda: 1 / 0)
+        governor.on('flush', lambda: calls.append('second'))
+        rss.mb = 190
+        governor.check()
+        assert calls == ['second']
+
+    def test_refused_sessions_are_counted(self, governor):
+        governor.refuse()
+        assert governor.stats()['refused_sessions'] == 1
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,142 @@
+import pytest
+import asyncio
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import ConnectionManager
+from music_sync import MusicStateBroadcaster, diff_state, apply_delta
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload):
+        self.sent.append(json.loads(payload))
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+def make_state(emotion="neutral", volume=0.6, tempo=1.0):
+    return {
+        'current_emotion': emotion,
+        'volume': volume,
+        'params': {'tempo': tempo, 'reverb': 0.3},
+        'available_styles': ['ambient', 'electronic', 'classical']
+    }
+
+class TestStateDiff:
+    def test_diff_only_changed_fields(self):
+        old = make_state()
+        new = make_state(emotion="happy", tempo=1.2)
+        assert diff_state(old, new) == {'current_emotion': 'happy', 'params': {'tempo': 1.2}}
+
+    def test_diff_ignores_float_noise(self):
+        assert diff_state(make_state(volume=0.6), make_state(volume=0.60000001)) == {}
+
+    def test_apply_delta_round_trip(self):
+        old = make_state()
+        new = make_state(emotion="sad", volume=0.4, tempo=0.8)
+        assert apply_delta(old, diff_state(old, new)) == new
+        assert old == make_state()
+
+class TestMusicStateBroadcaster:
+    @pytest.mark.asyncio
+    async def test_full_then_coalesced_delta(self):
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        state = {'value': make_state()}
+        broadcaster = MusicStateBroadcaster(manager, lambda: state['value'])
+
+        broadcaster.mark_dirty("lobby")
+        await broadcaster.flush()
+
+        # Three frames within one tick produce a single delta
+        for tempo in (1.1, 1.2, 1.3):
+            state['value'] = make_state(emotion="happy", tempo=tempo)
+            broadcaster.mark_dirty("lobby")
+        await broadcaster.flush()
+        await asyncio.sleep(0.01)
+
+        assert len(websocket.sent) == 2
+        full, delta = websocket.sent
+        assert full['full'] is True
+        assert full['version'] == 1
+        assert delta == {
+            'type': 'music_update', 'version': 2, 'base': 1,
+            'delta': {'current_emotion': 'happy', 'params': {'tempo': 1.3}}
+        }
+
+    @pytest.mark.asyncio
+    async def test_unchanged_state_is_not_sent(self):
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        broadcaster = MusicStateBroadcaster(manager, make_state)
+
+        broadcaster.mark_dirty("lobby")
+        await broadcaster.flush()
+        broadcaster.mark_dirty("lobby")
+        await broadcaster.flush()
+        await asyncio.sleep(0.01)
+
+        assert len(websocket.sent) == 1
+        assert broadcaster.stats()['skipped_unchanged'] == 1
+
+    @pytest.mark.asyncio
+    async def test_blocking_reads_run_off_the_event_loop(self):
+        import threading
+        manager = ConnectionManager()
+        await manager.connect(FakeWebSocket())
+        threads = set()
+        def get_state():
+            threads.add(threading.get_ident())
+            return make_state()
+        def get_version():
+            threads.add(threading.get_ident())
+            return 1
+        broadcaster = MusicStateBroadcaster(manager, get_state, get_version=get_version, blocking=True)
+
+        await broadcaster._check_version()
+        await broadcaster.flush()
+
+        assert threads and threading.get_ident() not in threads
+        assert broadcaster.stats()['full_updates'] == 1
+
+    @pytest.mark.asyncio
+    async def test_snapshot_matches_published_version(self):
+        manager = ConnectionManager()
+        await manager.connect(FakeWebSocket())
+        state = {'value': make_state()}
+        broadcaster = MusicStateBroadcaster(manager, lambda: state['value'])
+
+        broadcaster.mark_dirty("lobby")
+        await broadcaster.flush()
+        state['value'] = make_state(emotion="angry")
+
+        snapshot = broadcaster.snapshot("lobby")
+        assert snapshot['version'] == 1
+        assert snapshot['data']['current_emotion'] == "neutral"
+
+    @pytest.mark.asyncio
+    async def test_other_rooms_not_notified(self):
+        manager = ConnectionManager()
+        lobby, stage = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(lobby)
+        await manager.connect(stage, room="stage")
+        broadcaster = MusicStateBroadcaster(manager, make_state)
+
+        broadcaster.mark_dirty("stage")
+        await broadcaster.flush()
+        await asyncio.sleep(0.01)
+
+        assert lobby.sent == []
+        assert len(stage.sent) == 1
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,125 @@
+import pytest
+import asyncio
+import time
+import numpy as np
+import cv2
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_protocol import Frame
+from pipeline import FramePipeline, PipelineStage, FrameDropped, PipelineFull
+
+def slow_detect(frame, context=None):
+    time.sleep(0.05)
+    return {'success': True, 'shape': frame.shape, 'context': context}
+
+class TestFramePipeline:
+    @pytest.fixture
+    def jpeg_frame(self):
+        ok, encoded = cv2.imencode('.jpg', np.zeros((32, 32, 3), dtype=np.uint8))
+        return Frame(payload=encoded.tobytes())
+
+    @pytest.mark.asyncio
+    async def test_submit_decodes_and_detects(self, jpeg_frame):
+        pipeline = FramePipeline(slow_detect, decode_workers=1, inference_workers=1)
+        await pipeline.start()
+        try:
+            result = await pipeline.submit(jpeg_frame, context='session-1')
+            assert result['shape'] == (32, 32, 3)
+            assert result['context'] == 'session-1'
+        finally:
+            await pipeline.stop()
+
+        stats = pipeline.stats()
+        assert stats['stages']['decode']['completed'] == 1
+        assert stats['stages']['detect']['completed'] == 1
+
+    @pytest.mark.asyncio
+    async def test_undecodable_frame_returns_none(self):
+        pipeline = FramePipeline(slow_detect)
+        await pipeline.start()
+        try:
+            assert await pipeline.submit(Frame(payload=b'not an image')) is None
+            assert pipeline.detect.submitted == 0
+        finally:
+            await pipeline.stop()
+
+    @pytest.mark.asyncio
+    async def test_event_loop_stays_responsive(self, jpeg_frame):
+        pipeline = FramePipeline(slow_detect, inference_workers=1, inference_queue_size=64,
+                                 decode_queue_size=64, policy='block')
+        await pipeline.start()
+        try:
+            jobs = [asyncio.create_task(pipeline.submit(jpeg_frame)) for _ in range(10)]
+
+            # The loop keeps ticking while ~0.5s of inference is queued
+            worst = 0.0
+            for _ in range(10):
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                worst = max(worst, time.perf_counter() - started)
+            assert worst < 0.04
+
+            results = await asyncio.gather(*jobs)
+            assert all(r['success'] for r in results)
+        finally:
+            await pipeline.stop()
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest_policy(self):
+        stage = PipelineStage('test', lambda value, context: value, workers=1, queue_size=1, policy='drop_oldest')
+        stage.queue = asyncio.Queue(maxsize=1)
+        loop = asyncio.get_running_loop()
+
+        from pipeline import _Job
+        first = _Job(1, None, loop.create_future())
+        second = _Job(2, None, loop.create_future())
+        await stage.put(first)
+        await stage.put(second)
+
+        assert stage.dropped == 1
+        with pytest.raises(FrameDropped):
+            await first.future
+        assert stage.queue.get_nowait() is second
+
+    @pytest.mark.asyncio
+    async def test_reject_policy(self):
+        stage = PipelineStage('test', lambda value, context: value, workers=1, queue_size=1, policy='reject')
+        stage.queue = asyncio.Queue(maxsize=1)
+        loop = asyncio.get_running_loop()
+
+        from pipeline import _Job
+        first = _Job(1, None, loop.create_future())
+        second = _Job(2, None, loop.create_future())
+        await stage.put(first)
+        await stage.put(second)
+
+        assert stage.rejected == 1
+        with pytest.raises(PipelineFull):
+            await second.future
+
+    @pytest.mark.asyncio
+    async def test_cacheable_frames_skip_inference(self, jpeg_frame):
+        from result_cache import ResultCache
+        cache = ResultCache(max_entries=8, max_mb=1, ttl_s=60, mode='exact')
+        pipeline = FramePipeline(slow_detect, cache=cache)
+        await pipeline.start()
+        try:
+            first = await pipeline.submit(jpeg_frame, cacheable=True)
+            second = await pipeline.submit(jpeg_frame, cacheable=True)
+            uncached = await pipeline.submit(jpeg_frame, context='session-1')
+        finally:
+            await pipeline.stop()
+
+        assert 'cached' not in first
+        assert second == dict(first, cached=True)
+        assert uncached['context'] == 'session-1' and 'cached' not in uncached
+        assert cache.stats()['hits'] == 1
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError):
+            PipelineStage('test', lambda value, context: value, workers=1, queue_size=1, policy='lifo')
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,43 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pubsub import InProcessPubSub, room_topic
+
+class TestInProcessPubSub:
+    def test_publish_reaches_topic_subscribers_only(self):
+        pubsub = InProcessPubSub()
+        lobby, other = [], []
+        pubsub.subscribe(room_topic("lobby"), lobby.append)
+        pubsub.subscribe(room_topic("other"), other.append)
+
+        pubsub.publish(room_topic("lobby"), "hello")
+        assert lobby == ["hello"]
+        assert other == []
+
+    def test_unsubscribe_removes_empty_topics(self):
+        pubsub = InProcessPubSub()
+        received = []
+        pubsub.subscribe("t", received.append)
+        pubsub.unsubscribe("t", received.append)
+        pubsub.unsubscribe("t", received.append)
+
+        pubsub.publish("t", "x")
+        assert received == []
+        assert pubsub.topics() == []
+
+    def test_failing_subscriber_does_not_block_others(self):
+        pubsub = InProcessPubSub()
+        received = []
+
+        def broken(payload):
+            raise RuntimeError("boom")
+
+        pubsub.subscribe("t", broken)
+        pubsub.subscribe("t", received.append)
+        pubsub.publish("t", "x")
+        assert received == ["x"]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,118 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_controller import RateController, fair_share
+
+def targets(changes):
+    return {session_id: fps for session_id, fps, _ in changes}
+
+class TestFairShare:
+    def test_unconstrained(self):
+        assert fair_share({'a': 15, 'b': 5}, None) == {'a': 15, 'b': 5}
+        assert fair_share({'a': 15, 'b': 5}, 30) == {'a': 15, 'b': 5}
+
+    def test_small_demands_are_met_first(self):
+        shares = fair_share({'a': 15, 'b': 2, 'c': 15}, 12)
+        assert shares['b'] == 2
+        assert shares['a'] == shares['c'] == 5
+
+class TestRateController:
+    @pytest.fixture
+    def controller(self):
+        return RateController(max_fps=15, min_fps=2, cpu_budget_percent=50,
+                              latency_budget_ms=50, delay_budget_ms=100)
+
+    def test_attach_reports_target(self, controller):
+        changes = controller.attach('a', 'ws-a')
+        assert changes == [('a', 15.0, {'ws-a'})]
+        assert controller.interval('a') == pytest.approx(1 / 15)
+        # Unknown sessions run at the maximum rate
+        assert controller.target_fps('missing') == 15
+
+    def test_cpu_overload_lowers_rates_fairly(self, controller):
+        controller.attach('a', 'ws-a')
+        controller.attach('b', 'ws-b')
+
+        changes = controller.update(cpu_percent=90)
+        assert targets(changes) == {'a': pytest.approx(10.5), 'b': pytest.approx(10.5)}
+        assert dict((sid, listeners) for sid, _, listeners in changes) == {'a': {'ws-a'}, 'b': {'ws-b'}}
+        assert controller.stats()['last_reason'] == 'cpu'
+
+        # Never below the floor
+        for _ in range(20):
+            controller.update(cpu_percent=90)
+        assert controller.target_fps('a') == 2
+
+    def test_latency_and_delay_budgets(self, controller):
+        controller.attach('a', 'ws-a')
+        for _ in range(10):
+            controller.observe(0.08, 0.05)
+        controller.update(cpu_percent=0)
+        assert controller.stats()['last_reason'] == 'latency'
+
+        for _ in range(10):
+            controller.observe(None, 0.3)
+        controller.update(cpu_percent=0)
+        assert controller.stats()['last_reason'] == 'delay'
+        assert controller.target_fps('a') < 15
+
+    def test_headroom_restores_rates(self, controller):
+        controller.attach('a', 'ws-a')
+        controller.update(cpu_percent=90)
+        assert controller.target_fps('a') == pytest.approx(10.5)
+
+        # Within budget but without headroom: hold
+        controller.update(cpu_percent=45)
+        assert controller.target_fps('a') == pytest.approx(10.5)
+
+        for _ in range(10):
+            controller.update(cpu_percent=10)
+        assert controller.target_fps('a') == 15
+        assert controller.capacity is None
+
+    def test_requested_rate_and_detach(self, controller):
+        controller.attach('a', 'ws-a')
+        controller.attach('b', 'ws-b')
+        assert targets(controller.request('b', 4)) == {'b': 4}
+        controller.update(cpu_percent=90)
+        # b asked for less than an equal share and keeps it; a gets the rest
+        assert controller.target_fps('b') == 4
+        assert controller.target_fps('a') == pytest.approx(19 * 0.7 - 4)
+
+        # a's other connection keeps the session alive; the last one frees the share
+        controller.attach('a', 'ws-a2')
+        assert controller.detach('a', 'ws-a') == []
+        controller.detach('a', 'ws-a2')
+        assert controller.stats()['sessions'] == 1
+
+    def test_outside_pressure(self, controller):
+        controller.attach('a', 'ws-a')
+        controller.pressure('memory')
+        assert targets(controller.update(cpu_percent=0)) == {'a': pytest.approx(10.5)}
+        assert controller.stats()['last_reason'] == 'memory'
+        # Pressure only applies to the next update
+        controller.update(cpu_percent=45)
+        assert controller.target_fps('a') == pytest.approx(10.5)
+
+    def test_held_pressure(self, controller):
+        controller.attach('a', 'ws-a')
+        controller.hold_pressure('memory')
+        controller.update(cpu_percent=0)
+        controller.update(cpu_percent=0)
+        assert controller.target_fps('a') == pytest.approx(15 * 0.7 * 0.7)
+        assert controller.stats()['increases'] == 0
+
+        controller.release_pressure('memory')
+        controller.update(cpu_percent=0)
+        assert controller.stats()['increases'] == 1
+
+    def test_small_changes_are_not_reported(self, controller):
+        controller.attach('a', 'ws-a')
+        controller.capacity = 14.8
+        assert controller.update(cpu_percent=45) == []
+        assert controller.target_fps('a') == 15
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
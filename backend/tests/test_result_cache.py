@@ -0,0 +1,129 @@
+import pytest
+import numpy as np
+import cv2
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_cache import ResultCache, exact_hash, hamming, perceptual_hash
+
+class TestResultCache:
+    @pytest.fixture
+    def image(self):
+        # Smooth gradient with a bright blob so the perceptual hash has structure
+        x = np.linspace(0, 255, 320)
+        image = np.tile(x, (240, 1)).astype(np.uint8)
+        cv2.circle(image, (100, 120), 40, 255, -1)
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    @pytest.fixture
+    def result(self):
+        return {'success': True, 'dominant_emotion': 'happy', 'num_faces': 1}
+
+    def test_exact_hash_depends_on_pixels_and_shape(self, image):
+        assert exact_hash(image) == exact_hash(image.copy())
+        changed = image.copy()
+        changed[0, 0, 0] ^= 1
+        assert exact_hash(changed) != exact_hash(image)
+        assert exact_hash(image.reshape(480, 160, 3)) != exact_hash(image)
+
+    def test_perceptual_hash_survives_resize_and_reencode(self, image):
+        resized = cv2.resize(image, (160, 120), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, 60])
+        recoded = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+        assert hamming(perceptual_hash(image), perceptual_hash(recoded)) <= 4
+        assert hamming(perceptual_hash(image), perceptual_hash(cv2.flip(image, 1))) > 10
+
+    def test_hit_and_miss(self, image, result):
+        cache = ResultCache(max_entries=8, max_mb=1, ttl_s=60, mode='exact')
+        key = cache.key(image)
+        assert cache.get(key) is None
+        cache.put(key, result)
+
+        cached = cache.get(cache.key(image.copy()))
+        assert cached == dict(result, cached=True)
+        assert 'cached' not in result
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses']) == (1, 1)
+        assert stats['hit_ratio'] == 0.5
+
+    def test_scopes_are_separate(self, image, result):
+        cache = ResultCache(max_entries=8, max_mb=1, ttl_s=60, mode='exact')
+        cache.put(cache.key(image), result, scope='batch')
+        assert cache.get(cache.key(image), scope='pipeline') is None
+        assert cache.get(cache.key(image), scope='batch') is not None
+
+    def test_near_duplicates_hit_in_perceptual_mode(self, image, result):
+        cache = ResultCache(max_entries=8, max_mb=1, ttl_s=60, mode='perceptual', max_distance=4)
+        cache.put(cache.key(image), result)
+        smaller = cv2.resize(image, (200, 150), interpolation=cv2.INTER_AREA)
+
+        assert cache.get(cache.key(smaller))['dominant_emotion'] == 'happy'
+        assert cache.get(cache.key(cv2.flip(image, 1))) is None
+        assert cache.stats()['near_hits'] + cache.stats()['hits'] == 1
+
+    def test_lru_eviction_by_entries(self, result):
+        cache = ResultCache(max_entries=2, max_mb=1, ttl_s=60, mode='exact')
+        cache.put(b'a', result)
+        cache.put(b'b', result)
+        cache.get(b'a')
+        cache.put(b'c', result)
+
+        assert cache.get(b'b') is None
+        assert cache.get(b'a') is not None
+        assert len(cache) == 2
+        assert cache.stats()['evictions'] == 1
+
+    def test_byte_cap(self, result):
+        cache = ResultCache(max_entries=1000, max_mb=0.001, ttl_s=60, mode='exact')
+        for i in range(20):
+            cache.put(bytes([i]), result)
+        stats = cache.stats()
+        assert stats['bytes'] <= stats['max_bytes']
+        assert 0 < stats['entries'] < 20
+
+    def test_ttl_expiry(self, result, monkeypatch):
+        import result_cache
+        now = [1000.0]
+        monkeypatch.setattr(result_cache.time, 'time', lambda: now[0])
+        cache = ResultCache(max_entries=8, max_mb=1, ttl_s=10, mode='exact')
+        cache.put(b'a', result)
+        now[0] += 11
+
+        assert cache.get(b'a') is None
+        assert cache.stats()['expired'] == 1
+
+    def test_errors_are_not_cached(self):
+        cache = ResultCache(max_entries=8, max_mb=1, ttl_s=60, mode='exact')
+        cache.put(b'a', {'success': False, 'error': 'Invalid image'})
+        assert len(cache) == 0
+
+    def test_replayed_and_smoothed_results_are_not_cached(self, result):
+        cache = ResultCache(max_entries=8, max_mb=1, ttl_s=60, mode='exact')
+        cache.put(b'a', dict(result, cached=True))
+        cache.put(b'b', dict(result, smoothed=True))
+        assert len(cache) == 0
+
+    def test_detect_batch_only_runs_misses(self, image, result):
+        cache = ResultCache(max_entries=8, max_mb=1, ttl_s=60, mode='exact')
+        calls = []
+        def detect_batch(frames):
+            calls.append(len(frames))
+            return [dict(result) for _ in frames]
+
+        other = image.copy()
+        other[0, 0] = 0
+        frames = [image, None, other]
+        keys = [cache.key(image), None, cache.key(other)]
+        cache.detect_batch(detect_batch, frames, keys)
+        second = cache.detect_batch(detect_batch, frames, keys)
+
+        assert calls == [3, 1]
+        assert second[0]['cached'] and second[2]['cached']
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            ResultCache(mode='fuzzy')
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
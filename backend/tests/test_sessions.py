@@ -0,0 +1,93 @@
+import pytest
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sessions import DetectionSession, SessionRegistry
+
+class TestDetectionSession:
+    def test_initial_state(self):
+        session = DetectionSession("abc", smoothing_frames=3, detection_interval=0.1)
+        assert session.session_id == "abc"
+        assert session.emotion_history.maxlen == 3
+        assert session.last_detection_time == 0
+        assert session.detection_interval == 0.1
+
+    def test_reset(self):
+        session = DetectionSession("abc")
+        session.emotion_history.append({'happy': 1.0})
+        session.last_detection_time = 123.0
+        session.reset()
+        assert len(session.emotion_history) == 0
+        assert session.last_detection_time == 0
+
+class TestSessionRegistry:
+    def test_get_creates_and_reuses(self):
+        registry = SessionRegistry(max_sessions=10)
+        first = registry.get("a")
+        assert registry.get("a") is first
+        assert len(registry) == 1
+        assert registry.stats()['created'] == 1
+
+    def test_lru_eviction(self):
+        registry = SessionRegistry(max_sessions=2)
+        registry.get("a")
+        registry.get("b")
+        registry.get("a")  # "b" is now least recently used
+        registry.get("c")
+
+        assert "a" in registry
+        assert "c" in registry
+        assert "b" not in registry
+        assert registry.stats()['evicted_lru'] == 1
+
+    def test_idle_eviction(self):
+        registry = SessionRegistry(max_sessions=10, idle_timeout=60)
+        registry.get("old").last_seen = time.time() - 120
+        registry.get("fresh")
+
+        assert registry.evict_idle() == 1
+        assert "old" not in registry
+        assert "fresh" in registry
+
+    def test_memory_cap(self):
+        # A tiny budget only fits a couple of sessions
+        registry = SessionRegistry(max_sessions=1000, max_memory_mb=0.005)
+        for i in range(20):
+            registry.get(f"s{i}")
+
+        assert len(registry) == registry.memory_session_limit
+        assert registry.stats()['evicted_memory'] > 0
+        assert f"s19" in registry
+
+    def test_release(self):
+        registry = SessionRegistry()
+        registry.get("a")
+        registry.release("a")
+        registry.release("missing")
+        assert "a" not in registry
+
+    def test_sessions_are_isolated(self):
+        registry = SessionRegistry()
+        registry.get("a").emotion_history.append({'happy': 1.0})
+        assert len(registry.get("b").emotion_history) == 0
+
+    def test_drop_caches_frees_frame_gates(self):
+        import numpy as np
+        from frame_gate import FrameGate, FrameGateStats
+
+        registry = SessionRegistry()
+        session = registry.get("a")
+        registry.get("b")
+        session.frame_gate = FrameGate(FrameGateStats())
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        session.frame_gate.check(frame, 0.0)
+        session.frame_gate.store({'success': True, 'faces': []}, 0.0)
+        assert session.frame_gate.approx_bytes() > 0
+
+        assert registry.drop_caches() == 1
+        assert session.frame_gate.approx_bytes() == 0
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
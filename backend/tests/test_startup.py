@@ -0,0 +1,64 @@
+import pytest
+import asyncio
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from startup import FAILED, READY, STARTING, StartupTracker
+
+class TestStartupTracker:
+    @pytest.fixture
+    def tracker(self):
+        return StartupTracker()
+
+    def test_phases_are_timed(self, tracker):
+        with tracker.phase('config'):
+            pass
+        tracker.record('imports', 0.25)
+
+        stats = tracker.stats()
+        assert stats['status'] == STARTING
+        assert list(stats['phases_ms']) == ['config', 'imports']
+        assert stats['phases_ms']['imports'] == 250
+        assert stats['elapsed_ms'] >= 0
+
+    def test_failed_phase_is_still_recorded(self, tracker):
+        with pytest.raises(ValueError):
+            with tracker.phase('broken'):
+                raise ValueError("boom")
+        assert 'broken' in tracker.phases
+
+    @pytest.mark.asyncio
+    async def test_run_phase_off_loop_and_ready(self, tracker):
+        tracker.begin()
+        waiter = asyncio.create_task(tracker.wait_ready())
+
+        result = await tracker.run_phase('models', lambda value: value * 2, 21)
+        assert result == 42
+        assert not waiter.done()
+
+        tracker.mark_ready()
+        assert await waiter is True
+        assert tracker.ready
+        assert tracker.stats()['status'] == READY
+        assert tracker.total_ms is not None
+
+    @pytest.mark.asyncio
+    async def test_failure_releases_waiters(self, tracker):
+        tracker.begin()
+        waiter = asyncio.create_task(tracker.wait_ready())
+        await asyncio.sleep(0)
+
+        tracker.mark_failed("model missing")
+        assert await waiter is False
+        assert tracker.stats()['status'] == FAILED
+        assert tracker.stats()['error'] == "model missing"
+
+    @pytest.mark.asyncio
+    async def test_finished_before_begin(self, tracker):
+        tracker.mark_ready()
+        tracker.begin()
+        assert await tracker.wait_ready() is True
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,204 @@
+import pytest
+import asyncio
+import json
+import sys
+import threading
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import ConnectionManager
+from pubsub import SQLitePubSub
+from state_backend import (
+    HISTORY_LIMIT, InProcessStateBackend, SQLiteStateBackend, SharedMusicState
+)
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload):
+        self.sent.append(payload)
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+class FakeGenerator:
+    def __init__(self):
+        self.state = {'current_emotion': 'neutral', 'volume': 0.6}
+
+    def get_current_state(self):
+        return dict(self.state)
+
+    def load_state(self, state):
+        self.state = dict(state)
+
+class TestStateBackend:
+    @pytest.fixture(params=["memory", "sqlite"])
+    def backend(self, request, tmp_path):
+        if request.param == "memory":
+            return InProcessStateBackend()
+        return SQLiteStateBackend(str(tmp_path / "state.db"))
+
+    def test_history_is_capped(self, backend):
+        for i in range(HISTORY_LIMIT + 5):
+            backend.append_history({'emotion': 'happy', 'index': i})
+
+        assert backend.history_count() == HISTORY_LIMIT
+        recent = backend.history(3)
+        assert [entry['index'] for entry in recent] == [HISTORY_LIMIT + 2, HISTORY_LIMIT + 3, HISTORY_LIMIT + 4]
+
+    def test_music_state_versions(self, backend):
+        assert backend.get_music_state() == (0, None)
+        backend.set_music_state({'volume': 0.5, 'params': {'tempo': 1.0}})
+        version = backend.set_music_state({'volume': 0.7, 'params': {'tempo': 1.1}})
+
+        assert version == 2
+        assert backend.music_version() == 2
+        assert backend.get_music_state() == (2, {'volume': 0.7, 'params': {'tempo': 1.1}})
+
+    def test_stale_workers_are_hidden(self, backend):
+        backend.report_worker("1", {'connections': 3})
+        assert backend.worker_stats() == {'1': {'connections': 3}}
+        assert backend.worker_stats(max_age=-1) == {}
+
+    def test_workers_share_sqlite_state(self, tmp_path):
+        path = str(tmp_path / "state.db")
+        first, second = SQLiteStateBackend(path), SQLiteStateBackend(path)
+
+        first.append_history({'emotion': 'sad'})
+        first.report_worker("1", {'connections': 1})
+        second.report_worker("2", {'connections': 2})
+
+        assert second.history(10) == [{'emotion': 'sad'}]
+        assert set(first.worker_stats()) == {'1', '2'}
+
+    @pytest.mark.asyncio
+    async def test_shared_music_state_follows_other_worker(self, tmp_path):
+        path = str(tmp_path / "state.db")
+        first_gen, second_gen = FakeGenerator(), FakeGenerator()
+        first = SharedMusicState(SQLiteStateBackend(path), lambda: first_gen)
+        second = SharedMusicState(SQLiteStateBackend(path), lambda: second_gen)
+
+        async with first.change():
+            first_gen.state['current_emotion'] = 'happy'
+        assert second.current()['current_emotion'] == 'happy'
+
+        # A change on the second worker starts from the first worker's state
+        async with second.change():
+            second_gen.state['volume'] = 0.2
+        assert first.current() == {'current_emotion': 'happy', 'volume': 0.2}
+        assert first.version() == second.version() == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_changes_do_not_lose_updates(self, tmp_path):
+        generator = FakeGenerator()
+        shared = SharedMusicState(SQLiteStateBackend(str(tmp_path / "state.db")), lambda: generator)
+
+        async def change(key, value):
+            async with shared.change():
+                state = generator.get_current_state()
+                await asyncio.sleep(0.01)
+                state[key] = value
+                generator.load_state(state)
+
+        await asyncio.gather(change('current_emotion', 'happy'), change('volume', 0.2))
+        assert shared.current() == {'current_emotion': 'happy', 'volume': 0.2}
+        assert shared.version() == 2
+
+    @pytest.mark.asyncio
+    async def test_unchanged_state_is_not_pushed(self, tmp_path):
+        generator = FakeGenerator()
+        shared = SharedMusicState(SQLiteStateBackend(str(tmp_path / "state.db")), lambda: generator)
+        async with shared.change():
+            generator.state['current_emotion'] = 'happy'
+        assert shared.version() == 1
+
+        # Same emotion again: nothing changed, so other workers have nothing to reload
+        for _ in range(3):
+            async with shared.change():
+                generator.state['current_emotion'] = 'happy'
+        assert shared.version() == 1
+
+    @pytest.mark.asyncio
+    async def test_sqlite_writes_run_off_the_event_loop(self, tmp_path):
+        backend = SQLiteStateBackend(str(tmp_path / "state.db"))
+        loop_thread = threading.get_ident()
+
+        assert await backend.call(threading.get_ident) != loop_thread
+        assert await InProcessStateBackend().call(threading.get_ident) == loop_thread
+
+class TestSQLitePubSub:
+    @pytest.mark.asyncio
+    async def test_relays_between_workers(self, tmp_path):
+        path = str(tmp_path / "state.db")
+        first, second = SQLitePubSub(path, poll_ms=5), SQLitePubSub(path, poll_ms=5)
+        await first.start()
+        await second.start()
+        received, echoed = [], []
+        second.subscribe("room:lobby", received.append)
+        first.subscribe("room:lobby", echoed.append)
+
+        first.publish("room:lobby", "hello")
+        first.publish("room:lobby", b"\x02\x01")
+        await asyncio.sleep(0.1)
+        await first.stop()
+        await second.stop()
+
+        assert received == ["hello", b"\x02\x01"]
+        # Local subscribers get each message once, never echoed back through the relay
+        assert echoed == ["hello", b"\x02\x01"]
+
+    @pytest.mark.asyncio
+    async def test_failed_exchange_keeps_messages(self, tmp_path):
+        path = str(tmp_path / "state.db")
+        first, second = SQLitePubSub(path, poll_ms=5), SQLitePubSub(path, poll_ms=5)
+        await first.start()
+        await second.start()
+        received = []
+        second.subscribe("room:lobby", received.append)
+
+        exchange, failures = first._exchange, [1]
+        def flaky_exchange(outgoing):
+            if outgoing and failures:
+                failures.pop()
+                raise RuntimeError("database is locked")
+            return exchange(outgoing)
+        first._exchange = flaky_exchange
+
+        first.publish("room:lobby", "one")
+        await asyncio.sleep(0.05)
+        first.publish("room:lobby", "two")
+        await asyncio.sleep(0.1)
+        await first.stop()
+        await second.stop()
+
+        assert received == ["one", "two"]
+        assert first.stats()['relay_failures'] == 1
+
+    @pytest.mark.asyncio
+    async def test_room_messages_reach_other_worker(self, tmp_path):
+        path = str(tmp_path / "state.db")
+        first = ConnectionManager(SQLitePubSub(path, poll_ms=5))
+        second = ConnectionManager(SQLitePubSub(path, poll_ms=5))
+        await first.pubsub.start()
+        await second.pubsub.start()
+        local, remote, elsewhere = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await first.connect(local, room="stage")
+        await second.connect(remote, room="stage")
+        await second.connect(elsewhere)
+
+        await first.publish("stage", {'type': 'emotion_update', 'data': {'dominant_emotion': 'happy'}})
+        await first.broadcast({'type': 'notice'})
+        await asyncio.sleep(0.1)
+        await first.pubsub.stop()
+        await second.pubsub.stop()
+
+        assert [json.loads(p)['type'] for p in local.sent] == ['emotion_update', 'notice']
+        assert [json.loads(p)['type'] for p in remote.sent] == ['emotion_update', 'notice']
+        assert [json.loads(p)['type'] for p in elsewhere.sent] == ['notice']
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,112 @@
+import pytest
+import asyncio
+import io
+import json
+import numpy as np
+import cv2
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from video_analysis import SampledVideoReader, VideoAnalyzer, VideoTooLarge, spool_to_disk
+
+def fake_detect_batch(frames):
+    return [
+        {
+            'success': True,
+            'emotions': {'happy': float(frame.mean() / 255), 'neutral': 1 - float(frame.mean() / 255)},
+            'dominant_emotion': 'happy',
+            'confidence': float(frame.mean() / 255),
+            'num_faces': 1,
+            'faces': []
+        }
+        for frame in frames
+    ]
+
+def collect(analyzer, path, **kwargs):
+    async def run():
+        return [line async for line in analyzer.stream(path, **kwargs)]
+    return asyncio.run(run())
+
+class TestVideoAnalysis:
+    @pytest.fixture
+    def video_path(self, tmp_path):
+        # 3 seconds at 10 fps; each frame's brightness encodes its index
+        path = str(tmp_path / "clip.avi")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+        assert writer.isOpened()
+        for i in range(30):
+            writer.write(np.full((48, 64, 3), i * 8, dtype=np.uint8))
+        writer.release()
+        return path
+
+    @pytest.fixture
+    def analyzer(self):
+        analyzer = VideoAnalyzer(fake_detect_batch, chunk_size=2)
+        yield analyzer
+        analyzer.close()
+
+    def test_reader_samples_at_rate(self, video_path):
+        reader = SampledVideoReader(video_path, sample_fps=2)
+        samples = []
+        while True:
+            chunk = reader.read_chunk(4)
+            if not chunk:
+                break
+            samples.extend(chunk)
+        reader.release()
+
+        assert [index for index, _, _ in samples] == [0, 5, 10, 15, 20, 25]
+        assert [t for _, t, _ in samples] == pytest.approx([0, 0.5, 1.0, 1.5, 2.0, 2.5])
+        assert reader.grabbed == 30
+        assert reader.decoded == 6
+
+    def test_spool_limits_size(self):
+        with pytest.raises(VideoTooLarge):
+            spool_to_disk(io.BytesIO(b"x" * 2048), max_bytes=1024)
+
+    def test_ndjson_timeline(self, analyzer, video_path):
+        with open(video_path, 'rb') as f:
+            path = spool_to_disk(f, max_bytes=10 * 1024 * 1024)
+        lines = [json.loads(line) for line in collect(analyzer, path, sample_fps=4)]
+
+        assert lines[0]['video']['fps'] == pytest.approx(10)
+        timeline = lines[1:-1]
+        assert [entry['frame'] for entry in timeline] == [0, 3, 5, 8, 10, 13, 15, 18, 20, 23, 25, 28]
+        # Frames reach the detector in order: brightness increases along the timeline
+        confidences = [entry['confidence'] for entry in timeline]
+        assert confidences == sorted(confidences)
+        assert lines[-1]['done'] and lines[-1]['samples'] == 12
+        # The spooled copy is removed once the stream finishes
+        assert not os.path.exists(path)
+
+    def test_sse_timeline(self, analyzer, video_path):
+        with open(video_path, 'rb') as f:
+            path = spool_to_disk(f, max_bytes=10 * 1024 * 1024)
+        events = collect(analyzer, path, sample_fps=1, fmt='sse')
+
+        assert events[0].startswith("event: meta\n")
+        assert events[1].startswith("id: 0\nevent: frame\ndata: ")
+        assert events[-1].startswith("event: done\n")
+        assert all(event.endswith("\n\n") for event in events)
+        assert len(events) == 5
+
+    def test_corrupt_video_reports_error(self, analyzer, tmp_path):
+        path = str(tmp_path / "broken.bin")
+        with open(path, 'wb') as f:
+            f.write(b"not a video")
+        lines = [json.loads(line) for line in collect(analyzer, path)]
+        assert lines == [{'error': 'Unsupported or corrupt video'}]
+        assert not os.path.exists(path)
+
+    def test_max_samples_truncates(self, analyzer, video_path, monkeypatch):
+        from config import settings
+        monkeypatch.setattr(settings, 'video_max_samples', 3)
+        with open(video_path, 'rb') as f:
+            path = spool_to_disk(f, max_bytes=10 * 1024 * 1024)
+        lines = [json.loads(line) for line in collect(analyzer, path, sample_fps=10)]
+        assert len(lines) == 5
+        assert lines[-1]['truncated'] is True
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,216 @@
+"""
+Emotion timeline for uploaded video files (/api/emotion/video)
+The upload is spooled to a temporary file in fixed-size blocks, then read with
+cv2.VideoCapture. Only frames at the sampling rate are retrieved (the rest are
+just grabbed), and sampled frames go through the detector's batch path in
+chunks while the next chunk is being decoded. Timeline entries are streamed as
+NDJSON or SSE as soon as their chunk is done, so memory stays flat regardless
+of the video's length.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import AsyncIterator, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import settings
+from streaming import ndjson_line, sse_event
+
+logger = logging.getLogger(__name__)
+
+SPOOL_BLOCK_SIZE = 1024 * 1024
+TIMELINE_FORMATS = ('ndjson', 'sse')
+
+
+class VideoTooLarge(ValueError):
+    """Raised when an upload exceeds video_max_upload_mb"""
+
+
+def spool_to_disk(source: BinaryIO, max_bytes: int) -> str:
+    """Copy an upload to a temporary file block by block and return its path"""
+    fd, path = tempfile.mkstemp(prefix="emotion-video-", suffix=".bin")
+    written = 0
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            while True:
+                block = source.read(SPOOL_BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > max_bytes:
+                    raise VideoTooLarge(f"Video exceeds {max_bytes // (1024 * 1024)} MB")
+                target.write(block)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+
+class SampledVideoReader:
+    """Reads frames from a video file at a fixed sampling rate"""
+
+    def __init__(self, path: str, sample_fps: float):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError("Unsupported or corrupt video")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.sample_interval = 1.0 / sample_fps
+        self.next_sample = 0.0
+        self.index = -1
+        self.decoded = 0
+        self.grabbed = 0
+
+    def info(self) -> Dict:
+        return {
+            'fps': self.fps,
+            'frames': self.frame_count,
+            'duration': self.frame_count / self.fps if self.fps > 0 else None,
+            'sample_fps': 1.0 / self.sample_interval
+        }
+
+    def _timestamp(self) -> float:
+        if self.fps > 0:
+            return self.index / self.fps
+        return self.capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+
+    def read_chunk(self, size: int) -> List[Tuple[int, float, np.ndarray]]:
+        """Return up to size sampled (frame index, seconds, frame) tuples"""
+        chunk = []
+        while len(chunk) < size:
+            if not self.capture.grab():
+                break
+            self.index += 1
+            self.grabbed += 1
+            timestamp = self._timestamp()
+            if timestamp + 1e-6 < self.next_sample:
+                continue
+            ok, frame = self.capture.retrieve()
+            if not ok:
+                continue
+            self.decoded += 1
+            # Advance by whole intervals so long gaps don't produce a burst of samples
+            while self.next_sample <= timestamp + 1e-6:
+                self.next_sample += self.sample_interval
+            chunk.append((self.index, timestamp, frame))
+        return chunk
+
+    def release(self):
+        self.capture.release()
+
+
+class VideoAnalyzer:
+    def __init__(self, detect_batch_fn: Callable[[List[Optional[np.ndarray]]], List[Dict]],
+                 inference_pool: Optional[Executor] = None, chunk_size: Optional[int] = None):
+        self.detect_batch_fn = detect_batch_fn
+        self.chunk_size = chunk_size or settings.batch_chunk_size
+        self.io_pool = ThreadPoolExecutor(max_workers=settings.batch_decode_workers, thread_name_prefix="video-io")
+        self._owns_inference_pool = inference_pool is None
+        self.inference_pool = inference_pool or ThreadPoolExecutor(max_workers=1, thread_name_prefix="video-inference")
+
+        self.videos = 0
+        self.samples = 0
+        self.decode_time = 0.0
+        self.inference_time = 0.0
+
+    async def spool(self, source: BinaryIO) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.io_pool, spool_to_disk, source, settings.video_max_upload_mb * 1024 * 1024
+        )
+
+    async def stream(self, path: str, sample_fps: Optional[float] = None, fmt: str = 'ndjson') -> AsyncIterator[str]:
+        """Stream the emotion timeline of a spooled video; the file is removed afterwards"""
+        loop = asyncio.get_running_loop()
+        sample_fps = sample_fps or settings.video_sample_fps
+        started = time.perf_counter()
+        reader = None
+        pending = None
+        samples = 0
+        try:
+            reader = await loop.run_in_executor(self.io_pool, SampledVideoReader, path, sample_fps)
+            self.videos += 1
+            yield self._format(fmt, 'meta', reader.info())
+
+            pending = loop.run_in_executor(
+                self.io_pool, reader.read_chunk, min(self.chunk_size, settings.video_max_samples)
+            )
+            while True:
+                decode_started = time.perf_counter()
+                chunk = await pending
+                self.decode_time += time.perf_counter() - decode_started
+                pending = None
+                if not chunk:
+                    break
+
+                remaining = settings.video_max_samples - samples - len(chunk)
+                if remaining > 0:
+                    # Decode the next chunk while this one is classified
+                    pending = loop.run_in_executor(
+                        self.io_pool, reader.read_chunk, min(self.chunk_size, remaining)
+                    )
+                inference_started = time.perf_counter()
+                results = await loop.run_in_executor(
+                    self.inference_pool, self.detect_batch_fn, [frame for _, _, frame in chunk]
+                )
+                self.inference_time += time.perf_counter() - inference_started
+
+                for (index, timestamp, _), result in zip(chunk, results):
+                    yield self._format(fmt, 'frame', {
+                        't': round(timestamp, 3),
+                        'frame': index,
+                        'success': result['success'],
+                        'emotions': result['emotions'],
+                        'dominant_emotion': result['dominant_emotion'],
+                        'confidence': result['confidence'],
+                        'num_faces': result.get('num_faces', 0),
+                        'faces': result.get('faces', [])
+                    }, event_id=index)
+                samples += len(chunk)
+                self.samples += len(chunk)
+                if pending is None:
+                    break
+
+            yield self._format(fmt, 'done', {
+                'done': True,
+                'samples': samples,
+                'frames_read': reader.grabbed,
+                'truncated': samples >= settings.video_max_samples,
+                'elapsed': time.perf_counter() - started
+            })
+        except ValueError as e:
+            yield self._format(fmt, 'error', {'error': str(e)})
+        finally:
+            if pending is not None:
+                await asyncio.gather(pending, return_exceptions=True)
+            if reader is not None:
+                reader.release()
+            os.unlink(path)
+
+    @staticmethod
+    def _format(fmt: str, event: str, data: Dict, event_id: Optional[int] = None) -> str:
+        if fmt == 'sse':
+            return sse_event(data, event=event, event_id=event_id)
+        if event == 'meta':
+            return ndjson_line({'video': data})
+        return ndjson_line(data)
+
+    def close(self):
+        self.io_pool.shutdown(wait=False)
+        if self._owns_inference_pool:
+            self.inference_pool.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        return {
+            'videos': self.videos,
+            'samples': self.samples,
+            'avg_decode_ms': 1000 * self.decode_time / self.samples if self.samples else 0.0,
+            'avg_inference_ms': 1000 * self.inference_time / self.samples if self.samples else 0.0
+        }
@@ -11,10 +11,31 @@ let emotionHistory = [];
 let audioContext = null;
 let analyser = null;
 let animationId = null;
+let binaryFrames = false;
+let frameSeq = 0;
+let lastRoundTripMs = null;
+let musicState = null;
+let musicVersion = 0;
+let captureFps = 15;
 
 // Configuration
 const WS_URL = window.APP_CONFIG?.WS_URL || 'ws://localhost:8000/ws';
 const API_URL = window.APP_CONFIG?.API_URL || 'http://localhost:8000';
+// Optional room (?room=name); emotion and music updates are scoped to it
+const ROOM = new URLSearchParams(window.location.search).get('room');
+// Highest capture rate; the server lowers it with 'rate' messages when it is busy
+const MAX_CAPTURE_FPS = 15;
+
+// Binary frame protocol (see backend/frame_protocol.py)
+const FRAME_HEADER_SIZE = 16;
+const MSG_FRAME = 1;
+const CODEC_JPEG = 1;
+
+// Compact binary results (see RESULT_HEADER in backend/frame_protocol.py)
+const EMOTION_IDS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral'];
+const RESULT_TYPES = { 2: 'emotion_result', 3: 'emotion_update' };
+const RESULT_HEADER_SIZE = 60;
+const FACE_RECORD_SIZE = 36;
 const EMOTION_COLORS = {
     happy: '#FFD700',
     sad: '#4169E1',
@@ -177,16 +198,27 @@ function setupEventListeners() {
 
 // WebSocket connection
 function connectWebSocket() {
-    ws = new WebSocket(WS_URL);
+    ws = new WebSocket(ROOM ? `${WS_URL}?room=${encodeURIComponent(ROOM)}` : WS_URL);
+    ws.binaryType = 'arraybuffer';
+    binaryFrames = false;
+    captureFps = MAX_CAPTURE_FPS;
+    musicState = null;
+    musicVersion = 0;
     
     ws.onopen = () => {
         console.log('WebSocket connected');
         showMessage('Connected to server', 'success');
+        // Ask for binary frames and results; servers without support keep using JSON
+        ws.send(JSON.stringify({ type: 'hello', protocol: 'binary', results: 'binary', max_fps: MAX_CAPTURE_FPS }));
     };
     
     ws.onmessage = (event) => {
-        const message = JSON.parse(event.data);
-        handleWebSocketMessage(message);
+        const message = event.data instanceof ArrayBuffer
+            ? decodeResultMessage(event.data)
+            : JSON.parse(event.data);
+        if (message) {
+            handleWebSocketMessage(message);
+        }
     };
     
     ws.onerror = (error) => {
@@ -194,8 +226,11 @@ function connectWebSocket() {
         showMessage('Connection error', 'error');
     };
     
-    ws.onclose = () => {
+    ws.onclose = (event) => {
         console.log('WebSocket disconnected');
+        if (event.code === 1013) {
+            showMessage('Server is busy, please try again shortly', 'error');
+        }
         if (isDetecting) {
             stopDetection();
         }
@@ -205,11 +240,21 @@ function connectWebSocket() {
 // Handle WebSocket messages
 function handleWebSocketMessage(message) {
     switch (message.type) {
+        case 'hello':
+            binaryFrames = message.protocol === 'binary';
+            break;
         case 'emotion_result':
+            if (message.client_ts !== undefined) {
+                lastRoundTripMs = Date.now() - message.client_ts;
+            }
             updateEmotionDisplay(message.data);
             break;
         case 'music_update':
-            updateMusicDisplay(message.data);
+            applyMusicUpdate(message);
+            break;
+        case 'rate':
+            // Target detection rate for this session (see backend/rate_controller.py)
+            captureFps = Math.max(1, Math.min(MAX_CAPTURE_FPS, message.fps));
             break;
         case 'emotion_update':
             updateCharts(message.data);
@@ -268,28 +313,97 @@ function captureFrames() {
     // Draw video frame
     ctx.drawImage(video, 0, 0);
     
-    // Convert to base64
-    const imageData = canvas.toDataURL('image/jpeg', 0.8);
-    
     // Send via WebSocket
     if (ws && ws.readyState === WebSocket.OPEN) {
-        ws.send(JSON.stringify({
-            type: 'frame',
-            data: imageData
-        }));
+        const seq = frameSeq++;
+        if (binaryFrames) {
+            canvas.toBlob(blob => {
+                if (blob) sendBinaryFrame(blob, seq);
+            }, 'image/jpeg', 0.8);
+        } else {
+            ws.send(JSON.stringify({
+                type: 'frame',
+                data: canvas.toDataURL('image/jpeg', 0.8),
+                seq: seq,
+                timestamp: Date.now()
+            }));
+        }
     }
     
     // Update FPS
     frameCount++;
     const now = Date.now();
     if (now - lastFrameTime >= 1000) {
-        document.getElementById('fps-counter').textContent = `${frameCount} FPS`;
+        const latency = lastRoundTripMs !== null ? ` · ${Math.round(lastRoundTripMs)} ms` : '';
+        document.getElementById('fps-counter').textContent = `${frameCount} FPS${latency}`;
         frameCount = 0;
         lastFrameTime = now;
     }
     
     // Schedule next frame
-    setTimeout(() => captureFrames(), 1000 / 15); // 15 FPS
+    setTimeout(() => captureFrames(), 1000 / captureFps);
+}
+
+// Decode a binary emotion_result / emotion_update into the JSON message shape
+function decodeResultMessage(buffer) {
+    const view = new DataView(buffer);
+    const type = RESULT_TYPES[view.getUint8(0)];
+    if (!type || buffer.byteLength < RESULT_HEADER_SIZE) return null;
+    
+    const flags = view.getUint8(1);
+    const readEmotions = (offset) => {
+        const emotions = {};
+        EMOTION_IDS.forEach((label, i) => {
+            emotions[label] = view.getFloat32(offset + 4 * i, true);
+        });
+        return emotions;
+    };
+    
+    const faces = [];
+    for (let i = 0; i < view.getUint8(3); i++) {
+        const offset = RESULT_HEADER_SIZE + i * FACE_RECORD_SIZE;
+        faces.push({
+            box: [0, 1, 2, 3].map(j => view.getInt16(offset + 2 * j, true)),
+            emotions: readEmotions(offset + 8)
+        });
+    }
+    
+    const emotions = readEmotions(32);
+    const dominant = EMOTION_IDS[view.getUint8(2)];
+    const message = {
+        type,
+        data: {
+            success: (flags & 1) !== 0,
+            cached: (flags & 2) !== 0,
+            emotions,
+            dominant_emotion: dominant,
+            confidence: emotions[dominant],
+            num_faces: view.getUint16(4, true),
+            faces,
+            timestamp: view.getFloat64(20, true),
+            processing_time: view.getFloat32(28, true) / 1000
+        }
+    };
+    if (flags & 4) message.seq = view.getUint32(8, true);
+    if (flags & 8) message.client_ts = view.getFloat64(12, true);
+    return message;
+}
+
+// Send a JPEG blob as a binary frame: fixed header followed by the raw bytes
+async function sendBinaryFrame(blob, seq) {
+    const body = await blob.arrayBuffer();
+    if (!ws || ws.readyState !== WebSocket.OPEN) return;
+    
+    const message = new Uint8Array(FRAME_HEADER_SIZE + body.byteLength);
+    const header = new DataView(message.buffer);
+    header.setUint8(0, MSG_FRAME);
+    header.setUint8(1, CODEC_JPEG);
+    header.setUint16(2, 0, true);
+    header.setUint32(4, seq >>> 0, true);
+    header.setFloat64(8, Date.now(), true);
+    message.set(new Uint8Array(body), FRAME_HEADER_SIZE);
+    
+    ws.send(message.buffer);
 }
 
 // Update emotion display
@@ -379,6 +493,36 @@ function updateCharts(data) {
     });
 }
 
+// Apply a full or delta music_update; resync if a delta doesn't follow our version
+function applyMusicUpdate(message) {
+    if (message.full || message.delta === undefined) {
+        musicState = message.data;
+    } else if (musicState && message.base === musicVersion) {
+        musicState = mergeDelta(musicState, message.delta);
+    } else {
+        sendControlMessage('get_music_state');
+        return;
+    }
+    
+    if (message.version !== undefined) {
+        musicVersion = message.version;
+    }
+    updateMusicDisplay(musicState);
+}
+
+function mergeDelta(state, delta) {
+    const merged = { ...state };
+    for (const [key, value] of Object.entries(delta)) {
+        const current = merged[key];
+        if (value && typeof value === 'object' && !Array.isArray(value) && current && typeof current === 'object') {
+            merged[key] = mergeDelta(current, value);
+        } else {
+            merged[key] = value;
+        }
+    }
+    return merged;
+}
+
 // Update music display
 function updateMusicDisplay(data) {
     document.getElementById('music-emotion').textContent = data.current_emotion;